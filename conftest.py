@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import pfr_scraper
+
+POSITIONS = ['QB', 'RB', 'WR', 'TE', 'WR-RB', 'DE-LB', 'CB', 'K']
+STATS = ['games_reg', 'pass_yds_reg', 'pass_td_reg', 'rush_yds_reg', 'rec_reg', 'rec_yds_reg', 'sacks_reg', 'pass_rating_reg', 'rush_yds_post']
+
+def random_player(rng, player_id):
+    """
+    :return: Stats row like the ones crawl_players saves, with most stats zero and a few missing
+    """
+    career_begin = int(rng.integers(1950, 2024))
+    row = {'player_id': player_id, 'name': f"Player {player_id}", 'position': str(rng.choice(POSITIONS)),
+           'career_begin': career_begin, 'career_end': min(2024, career_begin + int(rng.integers(0, 15))), 'active': bool(rng.random() < 0.2)}
+    for stat in STATS:
+        draw = rng.random()
+        if draw < 0.5:
+            row[stat] = 0
+        elif draw < 0.6:
+            row[stat] = None
+        elif stat == 'pass_rating_reg':
+            row[stat] = round(float(rng.uniform(40, 120)), 1)
+        else:
+            # Small integers so that some players tie
+            row[stat] = int(rng.integers(1, 40)) * 25
+    row['table_hash'] = f"{player_id:016x}"
+    return row
+
+def changed_players(rng, rows, new_ids):
+    """
+    :return: Rows of a later crawl: some players unchanged, some with new stats, some with a new position, era or active flag, plus new players
+    """
+    changed = []
+    for row in rows:
+        row = dict(row)
+        draw = rng.random()
+        if draw < 0.3:
+            for stat in rng.choice(STATS, size = 3, replace = False):
+                row[stat] = [0, None, int(rng.integers(1, 80)) * 25][int(rng.integers(0, 3))]
+        elif draw < 0.4:
+            row['position'] = str(rng.choice(POSITIONS))
+        elif draw < 0.45:
+            row['career_begin'] = int(rng.integers(1950, 2024))
+        elif draw < 0.5:
+            row['active'] = not row['active']
+        changed.append(row)
+    return changed + [random_player(rng, player_id) for player_id in new_ids]
+
+class CrawlRuns:
+    """
+    Saves rows to a stats CSV the way crawl_players does: each run compares its rows with the saved ones, appends the new and changed rows and writes a delta file.
+    """
+    def __init__(self, directory):
+        self.stats_path = str(directory / 'player_stats.csv')
+        self.deltas_dir = str(directory / 'deltas')
+        self.runs = 0
+
+    def run(self, rows):
+        saved = pfr_scraper.load_player_stats(self.stats_path) if self.runs > 0 else None
+        changes = pfr_scraper.ChangeLog(saved, self.deltas_dir, self.stats_path)
+        # Runs started within the same second would share a delta file
+        self.runs += 1
+        changes.delta_path = changes.delta_path.replace('.jsonl', f'-{self.runs:03d}.jsonl')
+        changes.manifest_path = changes.manifest_path.replace('.manifest.json', f'-{self.runs:03d}.manifest.json')
+        new_rows = []
+        for row in rows:
+            row = dict(row)
+            if changes.record(row):
+                new_rows.append(row)
+        if len(new_rows) > 0:
+            pfr_scraper.save_player_stats(new_rows, self.stats_path)
+        changes.finish()
+        return new_rows
+
+@pytest.fixture
+def crawl_runs(tmp_path):
+    """
+    :return: Tuple of (CrawlRuns, rows of a first crawl, rows of a second crawl)
+    """
+    rng = np.random.default_rng(7)
+    first = [random_player(rng, player_id) for player_id in range(1, 301)]
+    second = changed_players(rng, first, range(301, 341))
+    return CrawlRuns(tmp_path), first, second
+
+@pytest.fixture
+def updated_and_rebuilt(crawl_runs, index_class):
+    """
+    Builds a DeltaIndex subclass after a first crawl, updates it from the deltas of a second crawl, and rebuilds it from scratch. Test modules choose the class by defining an index_class fixture.
+
+    :return: Tuple of (updated index, rebuilt index, CrawlRuns)
+    """
+    runs, first, second = crawl_runs
+    runs.run(first)
+    index = index_class.build(runs.stats_path, runs.deltas_dir)
+    runs.run(second)
+    assert index.apply_deltas(runs.deltas_dir) > 0
+    return index, index_class.build(runs.stats_path, runs.deltas_dir), runs
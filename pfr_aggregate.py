@@ -0,0 +1,211 @@
+import os
+import glob
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from pfr_scraper import PLAYER_STATS_PATH, GAME_LOGS_DIR, GAME_LOG_PROGRESS_FILE, load_player_stats, read_game_log_progress
+
+AGGREGATES_DIR = 'data/aggregates'
+
+SEASON_TYPES = ('reg', 'post')
+
+# Stats that add up across seasons and season types
+COUNTING_STATS = ['games', 'games_started', 'pass_cmp', 'pass_att', 'pass_yds', 'pass_td', 'pass_int', 'pass_first_down', 'pass_sacked', 'pass_sacked_yds',
+                  'comebacks', 'gwd', 'rush_att', 'rush_yds', 'rush_td', 'rush_first_down', 'targets', 'rec', 'rec_yds', 'rec_td', 'rec_first_down', 'touches',
+                  'rush_receive_td', 'def_int', 'def_int_yds', 'def_int_td', 'pass_defended', 'fumbles_forced', 'fumbles', 'fumbles_rec', 'fumbles_rec_yds',
+                  'fumbles_rec_td', 'sacks', 'tackles_combined', 'tackles_solo', 'tackles_assists', 'tackles_loss', 'qb_hits', 'safety_md', 'punt_ret',
+                  'punt_ret_yds', 'punt_ret_td', 'kick_ret', 'kick_ret_yds', 'kick_ret_td']
+# Stats whose combined value is the larger of the two season types
+LONGEST_STATS = ['pass_long', 'rush_long', 'rec_long', 'def_int_long', 'punt_ret_long', 'kick_ret_long']
+
+# Recomputed stats checked against the scraped ones, and the largest difference explained by PFR's rounding
+RATE_TOLERANCES = {
+    'pass_cmp_pct': 0.051,
+    'pass_rating': 0.051,
+    'pass_adj_net_yds_per_att': 0.0051,
+    'yds_per_touch': 0.051,
+}
+SUM_CHECKS = {
+    'touches': ('rush_att', 'rec'),
+    'rush_receive_td': ('rush_td', 'rec_td'),
+}
+
+def stat_values(df, stat, suffix):
+    """
+    :return: The column {stat}_{suffix} as a float64 array, with missing values as 0
+    """
+    name = f'{stat}_{suffix}'
+    if name not in df:
+        return np.zeros(df.shape[0])
+    return np.nan_to_num(pd.to_numeric(df[name], errors = 'coerce').to_numpy(dtype = np.float64))
+
+def safe_divide(numerator, denominator):
+    return np.divide(numerator, denominator, out = np.full(np.shape(numerator), np.nan), where = denominator > 0)
+
+def passer_rating(cmp, att, yds, td, interceptions):
+    """
+    Computes NFL passer rating for arrays of passing totals. Each of the four components is capped between 0 and 2.375.
+
+    :return: Array of passer ratings, NaN where there were no attempts
+    """
+    components = np.stack([
+        (safe_divide(cmp, att) - 0.3) * 5,
+        (safe_divide(yds, att) - 3) * 0.25,
+        safe_divide(td, att) * 20,
+        2.375 - safe_divide(interceptions, att) * 25
+    ])
+    return np.clip(components, 0, 2.375).sum(axis = 0) / 6 * 100
+
+def rate_stats(stats):
+    """
+    Recomputes rate stats from counting stats.
+
+    :param stats: Dictionary from counting stat to its array of values
+    :return: Dictionary from rate stat to its array of values, NaN where the denominator is 0
+    """
+    dropbacks = stats['pass_att'] + stats['pass_sacked']
+    return {
+        'pass_cmp_pct': safe_divide(stats['pass_cmp'], stats['pass_att']) * 100,
+        'pass_rating': passer_rating(stats['pass_cmp'], stats['pass_att'], stats['pass_yds'], stats['pass_td'], stats['pass_int']),
+        'pass_adj_net_yds_per_att': safe_divide(stats['pass_yds'] - stats['pass_sacked_yds'] + 20 * stats['pass_td'] - 45 * stats['pass_int'], dropbacks),
+        'yds_per_touch': safe_divide(stats['rush_yds'] + stats['rec_yds'], stats['rush_att'] + stats['rec']),
+    }
+
+def counting_stats(df, suffix):
+    return {stat: stat_values(df, stat, suffix) for stat in COUNTING_STATS}
+
+def combined_totals(df):
+    """
+    Combines regular season and postseason stats: counting stats are added, longest plays take the larger value and rate stats are recomputed from the combined totals.
+
+    :param df: DataFrame from load_player_stats
+    :return: DataFrame with player_id and a {stat}_total column for every combined stat
+    """
+    reg = counting_stats(df, 'reg')
+    post = counting_stats(df, 'post')
+    total = {stat: reg[stat] + post[stat] for stat in COUNTING_STATS}
+    longest = {stat: np.maximum(stat_values(df, stat, 'reg'), stat_values(df, stat, 'post')) for stat in LONGEST_STATS}
+    result = {'player_id': df['player_id'].to_numpy()}
+    for stat, values in {**total, **longest, **rate_stats(total)}.items():
+        result[f'{stat}_total'] = values
+    return pd.DataFrame(result)
+
+def check_totals(df, game_log_totals = None):
+    """
+    Flags scraped stats that disagree with the same stats recomputed from other columns. Rate stats are compared with the value recomputed from the player's counting stats, skipping players with no attempts and rate stats the page left blank. Touches and total touchdowns are compared with their parts. With game_log_totals, counting stats are also compared with the sum of the player's games.
+
+    :param df: DataFrame from load_player_stats
+    :param game_log_totals: DataFrame from game_log_totals, or None
+    :return: DataFrame with one row per disagreement: player_id, column, scraped and recomputed
+    """
+    player_ids = df['player_id'].to_numpy()
+    flags = []
+
+    def flag(column, scraped, recomputed, mask):
+        positions = np.flatnonzero(mask)
+        if len(positions) > 0:
+            flags.append(pd.DataFrame({'player_id': player_ids[positions], 'column': column, 'scraped': scraped[positions], 'recomputed': recomputed[positions]}))
+
+    for suffix in SEASON_TYPES:
+        stats = counting_stats(df, suffix)
+        for stat, recomputed in rate_stats(stats).items():
+            scraped = stat_values(df, stat, suffix)
+            flag(f'{stat}_{suffix}', scraped, recomputed, ~np.isnan(recomputed) & (scraped != 0) & (np.abs(scraped - recomputed) > RATE_TOLERANCES[stat]))
+        for stat, parts in SUM_CHECKS.items():
+            recomputed = sum(stats[part] for part in parts)
+            flag(f'{stat}_{suffix}', stats[stat], recomputed, stats[stat] != recomputed)
+
+    if game_log_totals is not None:
+        logs = game_log_totals.set_index('player_id').reindex(player_ids)
+        complete = logs.index.isin(game_log_totals['player_id']) if len(game_log_totals) > 0 else np.zeros(len(player_ids), dtype = bool)
+        for column in logs.columns:
+            if column not in df:
+                continue
+            scraped = stat_values(df, *column.rsplit('_', 1))
+            recomputed = np.nan_to_num(logs[column].to_numpy(dtype = np.float64))
+            flag(column, scraped, recomputed, complete & (scraped != recomputed))
+
+    if len(flags) == 0:
+        return pd.DataFrame(columns = ['player_id', 'column', 'scraped', 'recomputed'])
+    return pd.concat(flags, ignore_index = True)
+
+def game_log_totals(df, directory = GAME_LOGS_DIR):
+    """
+    Adds up the saved game logs of every player whose game logs have been scraped for every season of their career.
+
+    :param df: DataFrame with player_id, career_begin and career_end
+    :param directory: Directory of the game log dataset
+    :return: DataFrame with player_id and a {stat}_{reg or post} column for every counting stat found in the game logs
+    """
+    done = read_game_log_progress(os.path.join(directory, GAME_LOG_PROGRESS_FILE))
+    seasons_done = pd.Series([player_id for player_id, _ in done]).value_counts()
+    career_seasons = pd.Series((df['career_end'] - df['career_begin'] + 1).to_numpy(), index = df['player_id'])
+    complete = career_seasons.index[seasons_done.reindex(career_seasons.index, fill_value = 0).to_numpy() >= career_seasons.to_numpy()]
+
+    games = [pd.read_json(path, lines = True) for path in sorted(glob.glob(os.path.join(directory, 'season=*.jsonl')))]
+    games = [season for season in games if len(season) > 0]
+    if len(games) == 0:
+        return pd.DataFrame(columns = ['player_id'])
+    games = pd.concat(games, ignore_index = True).drop_duplicates(['player_id', 'season', 'game_num'])
+    games = games[games['player_id'].isin(complete)]
+    stats = [stat for stat in COUNTING_STATS if stat in games.columns]
+    games[stats] = games[stats].apply(pd.to_numeric, errors = 'coerce')
+    totals = games.groupby(['player_id', 'season_type'])[stats].sum().unstack('season_type', fill_value = 0)
+    totals.columns = [f'{stat}_{season_type}' for stat, season_type in totals.columns]
+    return totals.reset_index()
+
+def position_group(position):
+    """
+    :return: The first of a player's hyphenated positions, e.g. QB for "QB-WR-RB"
+    """
+    return position.fillna('').astype(str).str.split('-', n = 1).str[0]
+
+def rollup(df, by = ('position_group', 'decade')):
+    """
+    Adds up combined totals over groups of players and recomputes rate stats from the group totals.
+
+    :param df: DataFrame from load_player_stats
+    :param by: Columns to group by. position_group and decade (of career_begin) are derived, any other column is used as is.
+    :return: DataFrame with the group columns, the number of players and a {stat}_total column for every counting and rate stat
+    """
+    keys = {
+        'position_group': lambda: position_group(df['position']),
+        'decade': lambda: df['career_begin'] // 10 * 10,
+    }
+    group_columns = [keys[column]() if column in keys else df[column] for column in by]
+    codes, uniques = zip(*(pd.factorize(column, sort = True) for column in group_columns))
+    group_ids, inverse = np.unique(np.ravel_multi_index(codes, [len(unique) for unique in uniques]), return_inverse = True)
+    group_codes = np.unravel_index(group_ids, [len(unique) for unique in uniques])
+
+    reg = counting_stats(df, 'reg')
+    post = counting_stats(df, 'post')
+    total = {stat: np.bincount(inverse, weights = reg[stat] + post[stat], minlength = len(group_ids)) for stat in COUNTING_STATS}
+    result = {column: np.asarray(unique)[code] for column, unique, code in zip(by, uniques, group_codes)}
+    result['players'] = np.bincount(inverse, minlength = len(group_ids))
+    for stat, values in {**total, **rate_stats(total)}.items():
+        result[f'{stat}_total'] = values
+    return pd.DataFrame(result)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Computes combined totals, group rollups and consistency checks over the scraped player stats.')
+    parser.add_argument('--stats', default = PLAYER_STATS_PATH, help = 'Path to the player stats CSV')
+    parser.add_argument('--output', default = AGGREGATES_DIR, help = 'Directory to write the results to')
+    parser.add_argument('--by', action = 'append', help = 'Comma-separated columns to roll up by, can be repeated (default position_group,decade)')
+    parser.add_argument('--game-logs', action = 'store_true', help = 'Also check counting stats against the sum of the saved game logs')
+    args = parser.parse_args()
+
+    df = load_player_stats(args.stats)
+    start = time.perf_counter()
+    totals = combined_totals(df)
+    rollups = {tuple(by.split(',')): rollup(df, by.split(',')) for by in (args.by or ['position_group,decade'])}
+    flags = check_totals(df, game_log_totals(df) if args.game_logs else None)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.output, exist_ok = True)
+    totals.to_csv(os.path.join(args.output, 'combined_totals.csv'), index = False)
+    for by, rolled_up in rollups.items():
+        rolled_up.to_csv(os.path.join(args.output, f"rollup_{'_'.join(by)}.csv"), index = False)
+    flags.to_csv(os.path.join(args.output, 'flags.csv'), index = False)
+    print(f"Aggregated {df.shape[0]} players in {elapsed:.3f}s. {flags.shape[0]} scraped stats disagree with recomputed ones.")
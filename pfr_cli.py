@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+# Only the standard library is imported at the top, so `status` starts quickly. Commands that need pandas, requests or
+# BeautifulSoup import pfr_scraper when they run.
+
+# Data directory of each site, as in the SiteProfiles in pfr_scraper.py, so status does not have to import it
+SITE_DATA_DIRS = {'pfr': 'data', 'bbr': 'data/bbr', 'bref': 'data/bref'}
+
+def site_names(text):
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SITE_DATA_DIRS]
+    if len(names) == 0 or len(unknown) > 0:
+        raise argparse.ArgumentTypeError(f"unknown site in {text!r}, choose from {', '.join(SITE_DATA_DIRS)}")
+    return list(dict.fromkeys(names))
+
+def crawl_status(data_dir):
+    """
+    Summarizes a site's crawl from its saved crawl queue and run manifests, without reading the player list or stats.
+
+    :param data_dir: Data directory of the site
+    :return: Dictionary with the number of players queued and scraped, the time of the last scrape, and the latest run
+    """
+    queue_path = os.path.join(data_dir, 'crawl_queue.json')
+    if not os.path.exists(queue_path):
+        return {'data_dir': data_dir, 'queued': None, 'scraped': 0, 'last_scraped': None, 'last_run': None}
+    with open(queue_path) as f:
+        state = json.load(f)
+    last_scraped = max(state['last_scraped'].values(), default = None)
+
+    last_run = None
+    deltas_dir = os.path.join(data_dir, 'deltas')
+    if os.path.isdir(deltas_dir):
+        runs = sorted(name[len('run-'):].split('.')[0] for name in os.listdir(deltas_dir) if name.startswith('run-'))
+        if len(runs) > 0:
+            manifest_path = os.path.join(deltas_dir, f'run-{runs[-1]}.manifest.json')
+            if os.path.exists(manifest_path):
+                with open(manifest_path) as f:
+                    last_run = json.load(f)
+            else:
+                # Deltas without a manifest belong to a run that is still going or was killed
+                last_run = {'run_id': runs[-1], 'finished': None}
+    return {'data_dir': data_dir, 'queued': len(state['queue']), 'scraped': len(state['last_scraped']), 'last_scraped': last_scraped, 'last_run': last_run}
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp is not None else 'never'
+
+def status(args):
+    now = time.time()
+    statuses = {name: crawl_status(SITE_DATA_DIRS[name]) for name in args.sites}
+    if args.json:
+        print(json.dumps(statuses))
+    else:
+        for name, state in statuses.items():
+            if state['queued'] is None:
+                print(f"{name}: no crawl state in {state['data_dir']}")
+                continue
+            print(f"{name}: {state['queued']} players queued, {state['scraped']} scraped, last scrape {format_time(state['last_scraped'])}")
+            run = state['last_run']
+            if run is None:
+                continue
+            if run['finished'] is None:
+                print(f"  run {run['run_id']}: running or killed")
+            else:
+                outcome = 'complete' if run['complete'] else f"stopped ({run['stop_reason']})"
+                counts = run['counts']
+                print(f"  run {run['run_id']}: {outcome} at {format_time(run['finished'])}, {counts['insert']} inserted, {counts['update']} updated, {counts['unchanged']} unchanged")
+    if args.max_age is not None:
+        stale = [name for name, state in statuses.items() if state['last_scraped'] is None or now - state['last_scraped'] > args.max_age]
+        if len(stale) > 0:
+            print(f"No scrape in the last {args.max_age:g}s: {', '.join(stale)}", file = sys.stderr)
+            return 1
+    return 0
+
+def build_list(args):
+    import pfr_scraper
+    failed = [name for name in args.sites if not pfr_scraper.build_player_list(pfr_scraper.SITES[name])]
+    return 1 if len(failed) > 0 else 0
+
+def crawl(args):
+    import pfr_scraper
+    pfr_scraper.main(args.crawl_args)
+    return 0
+
+def reparse(args):
+    import signal
+    import pfr_scraper
+    signal.signal(signal.SIGINT, pfr_scraper.request_stop)
+    signal.signal(signal.SIGTERM, pfr_scraper.request_stop)
+    pfr_scraper.reparse_archive(args.archive, pfr_scraper.SITES[args.site])
+    return 0
+
+def export(args):
+    import pfr_scraper
+    site = pfr_scraper.SITES[args.site]
+    if not os.path.exists(site.stats_path):
+        print(f"Nothing to export, {site.stats_path} does not exist. Run a crawl first.", file = sys.stderr)
+        return 2
+    try:
+        if args.partition_by:
+            import pfr_export
+            manifest = pfr_export.export_partitioned(args.output, site.stats_path, site.list_path, args.partition_by.split(','), args.format or 'csv', args.compression)
+            count = sum(partition['rows'] for partition in manifest['tables']['player_stats']['partitions'])
+        else:
+            count = pfr_scraper.export_player_stats(args.output, site.stats_path)
+    except (ValueError, OSError, ImportError) as e:
+        print(f"Export failed: {e}", file = sys.stderr)
+        return 2
+    print(f"Exported {count} players to {args.output}")
+    return 0
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(prog = 'pfr_cli.py', description = 'Builds, crawls, inspects and exports the scraped player data.')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    parser_build = commands.add_parser('build-list', help = 'Scrape the player list pages and save player_list.csv')
+    parser_build.add_argument('--sites', type = site_names, default = ['pfr'], help = f"Comma-separated sites: {', '.join(SITE_DATA_DIRS)} (default pfr)")
+    parser_build.set_defaults(run = build_list)
+
+    # Every argument after crawl goes to pfr_scraper.py, including --help
+    parser_crawl = commands.add_parser('crawl', add_help = False, help = 'Crawl player pages, taking the same arguments as pfr_scraper.py')
+    parser_crawl.set_defaults(run = crawl)
+
+    parser_status = commands.add_parser('status', help = 'Show crawl progress from the saved crawl state only')
+    parser_status.add_argument('--sites', type = site_names, default = ['pfr'], help = f"Comma-separated sites: {', '.join(SITE_DATA_DIRS)} (default pfr)")
+    parser_status.add_argument('--json', action = 'store_true', help = 'Print the status as JSON')
+    parser_status.add_argument('--max-age', type = float, metavar = 'SECONDS', help = 'Exit with code 1 if a site has not scraped a player in this many seconds')
+    parser_status.set_defaults(run = status)
+
+    parser_reparse = commands.add_parser('reparse', help = 'Parse the player pages in a recorded archive again and save any stats that changed')
+    parser_reparse.add_argument('archive', help = 'Archive directory written by --record')
+    parser_reparse.add_argument('--site', choices = list(SITE_DATA_DIRS), default = 'pfr', help = 'Site the archive was recorded from (default pfr)')
+    parser_reparse.set_defaults(run = reparse)
+
+    parser_export = commands.add_parser('export', help = 'Write the latest stats of every player to a .csv, .jsonl or .parquet file')
+    parser_export.add_argument('output', help = 'Path of the file to write')
+    parser_export.add_argument('--site', choices = list(SITE_DATA_DIRS), default = 'pfr', help = 'Site to export (default pfr)')
+    parser_export.add_argument('--partition-by', metavar = 'COLUMNS', help = 'Write the player list and stats to the output directory as a compressed dataset partitioned by these comma-separated columns, e.g. position_group,decade')
+    parser_export.add_argument('--format', choices = ['csv', 'jsonl', 'parquet'], help = 'File format of a partitioned export (default csv)')
+    parser_export.add_argument('--compression', help = 'Compression of each file of a partitioned export (default gzip, or snappy for parquet)')
+    parser_export.set_defaults(run = export)
+
+    args, crawl_args = parser.parse_known_args(argv)
+    if args.command == 'export' and (args.format or args.compression) and not args.partition_by:
+        parser.error('--format and --compression only apply with --partition-by')
+    if args.command == 'export' and not args.partition_by and os.path.splitext(args.output)[1].lower() not in ('.csv', '.jsonl', '.parquet'):
+        parser.error(f"unknown export format {os.path.splitext(args.output)[1]!r}, use .csv, .jsonl or .parquet")
+    if args.command == 'crawl':
+        args.crawl_args = crawl_args
+    elif len(crawl_args) > 0:
+        parser.error(f"unrecognized arguments: {' '.join(crawl_args)}")
+    return args
+
+if __name__ == '__main__':
+    args = parse_args()
+    sys.exit(args.run(args))
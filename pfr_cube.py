@@ -0,0 +1,228 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from pfr_scraper import PLAYER_STATS_PATH, DELTAS_DIR
+from pfr_aggregate import position_group
+from pfr_deltas import DeltaIndex, stat_columns, player_partition, to_float
+
+ROLLUP_CUBE_PATH = 'data/rollup_cube.pkl'
+
+DIMENSIONS = ('position_group', 'decade', 'active')
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value)
+
+class RollupCube(DeltaIndex):
+    """
+    Sums and counts of every numeric stats column for every combination of position group, decade (of career_begin) and active flag, so group-by reports read precomputed cells instead of adding up every player.
+
+    The cube is three arrays indexed by (position group, decade, active[, column]): the number of players, the sum of each column and the number of players with a value in each column, for means. Any grouping by a subset of the dimensions is a sum over the other axes. Each player's values and cell are kept too, so a changed player is taken out of their old cell and added to their new one without touching anyone else.
+
+    :param df: DataFrame from load_player_stats
+    :param delta_offsets: Dictionary from delta file name to the number of bytes of it already reflected in df
+    """
+    default_path = ROLLUP_CUBE_PATH
+
+    def __init__(self, df, delta_offsets = None):
+        super().__init__(delta_offsets)
+        self.columns = stat_columns(df)
+        self.column_positions = {column: position for position, column in enumerate(self.columns)}
+
+        groups = position_group(df['position']).to_numpy()
+        decades = (df['career_begin'] // 10 * 10).to_numpy(dtype = np.int64)
+        active = df['active'].map(to_bool).to_numpy(dtype = bool) if 'active' in df else np.zeros(df.shape[0], dtype = bool)
+        self.labels = {'position_group': sorted(set(groups)), 'decade': sorted(set(decades.tolist())), 'active': [False, True]}
+        self.codes = {dimension: {label: code for code, label in enumerate(labels)} for dimension, labels in self.labels.items()}
+        self.cells = {int(player_id): (group, int(decade), bool(is_active)) for player_id, group, decade, is_active in zip(df['player_id'], groups, decades, active)}
+
+        # Current value of every column for every player, by player_id, so a change can be taken out of the cube without the old row
+        size = int(df['player_id'].max()) + 1 if df.shape[0] > 0 else 1
+        player_ids = df['player_id'].to_numpy(dtype = np.int64)
+        self.values = np.full((size, len(self.columns)), np.nan)
+        self.values[player_ids] = df[self.columns].to_numpy(dtype = np.float64)
+
+        shape = tuple(len(labels) for labels in self.labels.values())
+        cell_ids = np.ravel_multi_index([np.array([self.codes['position_group'][group] for group in groups], dtype = np.int64),
+                                         np.array([self.codes['decade'][decade] for decade in decades.tolist()], dtype = np.int64),
+                                         active.astype(np.int64)], shape) if df.shape[0] > 0 else np.zeros(0, dtype = np.int64)
+        cell_count = int(np.prod(shape))
+        self.players = np.bincount(cell_ids, minlength = cell_count).reshape(shape)
+        self.sums = np.zeros(shape + (len(self.columns),))
+        self.counts = np.zeros(shape + (len(self.columns),), dtype = np.int64)
+        values = self.values[player_ids]
+        for position in range(len(self.columns)):
+            present = ~np.isnan(values[:, position])
+            self.sums[..., position] = np.bincount(cell_ids[present], weights = values[present, position], minlength = cell_count).reshape(shape)
+            self.counts[..., position] = np.bincount(cell_ids[present], minlength = cell_count).reshape(shape)
+
+    def code(self, dimension, label):
+        """
+        :return: Index of a label along a dimension, adding the label to the end of the cube if it is new
+        """
+        code = self.codes[dimension].get(label)
+        if code is None:
+            code = len(self.labels[dimension])
+            self.labels[dimension].append(label)
+            self.codes[dimension][label] = code
+            axis = DIMENSIONS.index(dimension)
+            for name in ('players', 'sums', 'counts'):
+                array = getattr(self, name)
+                padding = list(array.shape)
+                padding[axis] = 1
+                setattr(self, name, np.concatenate([array, np.zeros(padding, dtype = array.dtype)], axis = axis))
+        return code
+
+    def add(self, player_id, sign):
+        cell = tuple(self.code(dimension, label) for dimension, label in zip(DIMENSIONS, self.cells[player_id]))
+        values = self.values[player_id]
+        present = ~np.isnan(values)
+        self.players[cell] += sign
+        self.sums[cell] += sign * np.where(present, values, 0)
+        self.counts[cell] += sign * present
+
+    def set_player(self, player_id, changes):
+        """
+        Moves one player's contribution to the cube to their new values and cell.
+
+        :param player_id: The player's ID
+        :param changes: Dictionary from column to new value, including position, career_begin and active if they are new or changed. Other columns that are not in the cube are ignored.
+        """
+        old_cell = self.cells.get(player_id)
+        if old_cell is None and ('position' not in changes or 'career_begin' not in changes):
+            return
+        if old_cell is not None:
+            self.add(player_id, -1)
+        else:
+            old_cell = ('', 0, False)
+        group, decade, active = old_cell
+        if 'position' in changes:
+            group = player_partition(changes['position'], 0)[0]
+        if 'career_begin' in changes:
+            decade = int(changes['career_begin']) // 10 * 10
+        if 'active' in changes:
+            active = to_bool(changes['active'])
+        self.cells[player_id] = (group, decade, active)
+
+        if player_id >= len(self.values):
+            self.values = np.concatenate([self.values, np.full((player_id + 1 - len(self.values), len(self.columns)), np.nan)])
+        for column, value in changes.items():
+            position = self.column_positions.get(column)
+            if position is not None:
+                self.values[player_id, position] = to_float(value)
+        self.add(player_id, 1)
+
+    def query(self, columns = None, by = DIMENSIONS, where = None):
+        """
+        Reads sums, means and player counts for a grouping by any of the dimensions from the precomputed cells.
+
+        :param columns: Stats columns to report, or None for all of them
+        :param by: Dimensions to group by, any of position_group, decade and active
+        :param where: Dictionary from dimension to the label or list of labels to keep, e.g. {'active': True, 'decade': [1990, 2000]}
+        :return: DataFrame with the group columns, players, and {column}_sum and {column}_mean for every column. Means are over players with a value.
+        """
+        unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+        if len(unknown) > 0:
+            raise ValueError(f"unknown dimensions: {', '.join(unknown)}, choose from {', '.join(DIMENSIONS)}")
+        columns = list(columns) if columns is not None else self.columns
+        unknown = [column for column in columns if column not in self.column_positions]
+        if len(unknown) > 0:
+            raise KeyError(f"not numeric stats columns: {', '.join(unknown)}")
+        positions = [self.column_positions[column] for column in columns]
+        where = where or {}
+        selected = []
+        for dimension in DIMENSIONS:
+            wanted = where.get(dimension)
+            if wanted is None:
+                selected.append(np.arange(len(self.labels[dimension])))
+            else:
+                wanted = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+                selected.append(np.array([self.codes[dimension][label] for label in wanted if label in self.codes[dimension]], dtype = np.int64))
+        cells = np.ix_(*selected)
+        other_axes = tuple(axis for axis, dimension in enumerate(DIMENSIONS) if dimension not in by)
+        players = self.players[cells].sum(axis = other_axes)
+        sums = self.sums[cells][..., positions].sum(axis = other_axes)
+        counts = self.counts[cells][..., positions].sum(axis = other_axes)
+
+        kept = [axis for axis, dimension in enumerate(DIMENSIONS) if dimension in by]
+        grid = np.meshgrid(*[np.asarray(self.labels[DIMENSIONS[axis]], dtype = object)[selected[axis]] for axis in kept], indexing = 'ij')
+        nonempty = players > 0
+        result = {DIMENSIONS[axis]: labels[nonempty] for axis, labels in zip(kept, grid)}
+        result['players'] = players[nonempty] if len(kept) > 0 else np.atleast_1d(players)
+        sums = sums[nonempty] if len(kept) > 0 else sums[np.newaxis]
+        counts = counts[nonempty] if len(kept) > 0 else counts[np.newaxis]
+        means = np.divide(sums, counts, out = np.full(sums.shape, np.nan), where = counts > 0)
+        for position, column in enumerate(columns):
+            result[f'{column}_sum'] = sums[:, position]
+            result[f'{column}_mean'] = means[:, position]
+        df = pd.DataFrame(result)
+        return df.sort_values([DIMENSIONS[axis] for axis in kept]).reset_index(drop = True) if len(kept) > 0 else df
+
+def get_rollup_cube(path = ROLLUP_CUBE_PATH, stats_path = PLAYER_STATS_PATH, deltas_dir = DELTAS_DIR):
+    """
+    Loads the rollup cube on first use, building it if it is missing, and applies any new run deltas, saving the cube if they changed it.
+
+    :param path: Path of the saved cube
+    :param stats_path: Path to the player stats CSV
+    :param deltas_dir: Directory of the run delta files
+    :return: RollupCube
+    """
+    return RollupCube.get(path, stats_path, deltas_dir)
+
+def parse_where(conditions):
+    """
+    :param conditions: Strings such as decade=1990,2000 or active=true
+    :return: Dictionary for RollupCube.query
+    """
+    where = {}
+    for condition in conditions or []:
+        dimension, separator, labels = condition.partition('=')
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"unknown dimension {dimension!r} in --where {condition!r}, choose from {', '.join(DIMENSIONS)}")
+        if separator == '' or labels == '':
+            raise ValueError(f"--where {condition!r} has no labels, e.g. {dimension}=...")
+        labels = labels.split(',')
+        if dimension == 'decade' and not all(label.isdigit() for label in labels):
+            raise ValueError(f"decades in --where {condition!r} must be years such as 1990")
+        if dimension == 'active' and not all(label.lower() in ('true', 'false') for label in labels):
+            raise ValueError(f"active in --where {condition!r} must be true or false")
+        convert = {'decade': int, 'active': to_bool}.get(dimension, str)
+        where[dimension] = [convert(label) for label in labels]
+    return where
+
+def parse_by(text):
+    """
+    :param text: Comma-separated dimensions such as position_group,decade
+    :return: List of dimensions for RollupCube.query
+    """
+    by = [dimension for dimension in text.split(',') if dimension]
+    unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+    if len(unknown) > 0:
+        raise ValueError(f"unknown dimension in --by: {', '.join(unknown)}, choose from {', '.join(DIMENSIONS)}")
+    return by
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Reports sums and means of stats by position group, decade and active flag from the precomputed rollup cube.')
+    parser.add_argument('columns', nargs = '*', help = 'Numeric stats columns to report, e.g. pass_yds_reg (default all)')
+    parser.add_argument('--by', default = ','.join(DIMENSIONS), help = 'Comma-separated dimensions to group by (default position_group,decade,active)')
+    parser.add_argument('--where', action = 'append', help = 'Keep only these labels of a dimension, e.g. decade=1990,2000 or active=true. Can be repeated.')
+    parser.add_argument('--output', help = 'Write the report to this CSV instead of printing it')
+    parser.add_argument('--rebuild', action = 'store_true', help = 'Rebuild the cube from the stats CSV first')
+    args = parser.parse_args()
+    try:
+        by = parse_by(args.by)
+        where = parse_where(args.where)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.rebuild:
+        RollupCube.build().save()
+    try:
+        report = get_rollup_cube().query(args.columns or None, by, where)
+    except KeyError as e:
+        parser.error(e.args[0])
+    if args.output:
+        report.to_csv(args.output, index = False)
+    else:
+        print(report.to_string(index = False))
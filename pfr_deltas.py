@@ -0,0 +1,146 @@
+import os
+import json
+import pickle
+import numpy as np
+import pandas as pd
+
+from pfr_scraper import PLAYER_STATS_PATH, DELTAS_DIR, load_player_stats
+
+# Numeric columns that are not stats
+NON_STAT_COLUMNS = {'player_id', 'career_begin', 'career_end'}
+
+def stat_columns(df):
+    """
+    :return: The numeric stats columns of a DataFrame from load_player_stats
+    """
+    return [column for column in df.columns
+            if column not in NON_STAT_COLUMNS and pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+
+def player_partition(position, career_begin):
+    """
+    :return: The (position group, era) partition of a player: their first listed position and the decade their career began
+    """
+    group = str(position).split('-')[0] if isinstance(position, str) else ''
+    return (group, int(career_begin) // 10 * 10)
+
+def to_float(value):
+    try:
+        return float(value) if value is not None else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+def delta_files(deltas_dir):
+    if not os.path.isdir(deltas_dir):
+        return []
+    return sorted(name for name in os.listdir(deltas_dir) if name.startswith('run-') and name.endswith('.jsonl'))
+
+def new_delta_changes(deltas_dir, delta_offsets):
+    """
+    Reads the delta records written since the given offsets, advancing the offsets past every complete line read.
+
+    :param deltas_dir: Directory of the run delta files
+    :param delta_offsets: Dictionary from delta file name to the number of bytes of it already read, updated in place
+    :return: Generator of (player_id, dictionary from column to new value) pairs: the whole row for an insert, the changed columns for an update
+    """
+    for name in delta_files(deltas_dir):
+        path = os.path.join(deltas_dir, name)
+        offset = delta_offsets.get(name, 0)
+        if os.path.getsize(path) <= offset:
+            continue
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # A run still in progress may have a partly written last line
+        data = data[:data.rfind(b'\n') + 1]
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record['op'] == 'insert':
+                yield record['player_id'], record['new']
+            elif record['op'] == 'update':
+                yield record['player_id'], {column: new for column, (_, new) in record['changed'].items()}
+        delta_offsets[name] = offset + len(data)
+
+class DeltaIndex:
+    """
+    Base class of the structures precomputed from the stats CSV and kept up to date from the run delta files. A subclass takes the DataFrame from load_player_stats and the delta offsets in __init__ and applies one player's changes in set_player; this class builds, saves and loads it and feeds it the delta records written since it was built.
+
+    :param delta_offsets: Dictionary from delta file name to the number of bytes of it already reflected in the structure
+    """
+    # Path the structure is saved to unless another is given, set by each subclass
+    default_path = None
+
+    def __init__(self, delta_offsets = None):
+        self.delta_offsets = dict(delta_offsets or {})
+
+    @classmethod
+    def build(cls, stats_path = PLAYER_STATS_PATH, deltas_dir = DELTAS_DIR):
+        """
+        Builds the structure from the stats CSV.
+
+        :param stats_path: Path to the player stats CSV
+        :param deltas_dir: Directory of the run delta files. Their current sizes are recorded as already applied.
+        """
+        # Sizes are read before the CSV, so a delta written in between is applied again later rather than missed
+        offsets = {name: os.path.getsize(os.path.join(deltas_dir, name)) for name in delta_files(deltas_dir)}
+        return cls(load_player_stats(stats_path), offsets)
+
+    def save(self, path = None):
+        path = path or self.default_path
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.__dict__, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path = None):
+        index = cls.__new__(cls)
+        with open(path or cls.default_path, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+    def set_player(self, player_id, changes):
+        """
+        Applies one delta record.
+
+        :param player_id: The player's ID
+        :param changes: Dictionary from column to new value, including position and career_begin if they are new or changed
+        """
+        raise NotImplementedError
+
+    def apply_deltas(self, deltas_dir = DELTAS_DIR):
+        """
+        Applies the delta records written by crawl runs since the structure was built or last updated.
+
+        :param deltas_dir: Directory of the run delta files
+        :return: Number of records applied
+        """
+        applied = 0
+        for player_id, changes in new_delta_changes(deltas_dir, self.delta_offsets):
+            self.set_player(player_id, changes)
+            applied += 1
+        return applied
+
+    @classmethod
+    def get(cls, path = None, stats_path = PLAYER_STATS_PATH, deltas_dir = DELTAS_DIR):
+        """
+        Loads the structure on first use, building it if it is missing, and applies any new run deltas, saving it if they changed it. Later calls reuse the loaded structure.
+
+        :param path: Path of the saved structure, by default the subclass's default_path
+        :param stats_path: Path to the player stats CSV
+        :param deltas_dir: Directory of the run delta files
+        """
+        path = path or cls.default_path
+        index = loaded_indexes.get(cls)
+        if index is None:
+            if os.path.exists(path):
+                index = cls.load(path)
+            else:
+                index = cls.build(stats_path, deltas_dir)
+                index.save(path)
+            loaded_indexes[cls] = index
+        if index.apply_deltas(deltas_dir) > 0:
+            index.save(path)
+        return index
+
+# Structures loaded by DeltaIndex.get, by class
+loaded_indexes = {}
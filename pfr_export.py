@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from pfr_scraper import PLAYER_LIST_PATH, PLAYER_STATS_PATH, load_player_stats, to_json_value
+from pfr_aggregate import position_group
+
+PARTITIONED_EXPORT_DIR = 'data/partitioned'
+PARTITION_BY = ('position_group', 'decade')
+
+# Directory name used for a missing partition value, as Hive, Spark and pyarrow do
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# File extension and default compression of each format
+FORMATS = {
+    'csv': ('.csv', 'gzip'),
+    'jsonl': ('.jsonl', 'gzip'),
+    'parquet': ('.parquet', 'snappy'),
+}
+COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'zstd': '.zst', 'xz': '.xz', None: ''}
+
+def partition_columns(df, by):
+    """
+    :param df: DataFrame with position and career_begin
+    :param by: Partition columns. position_group and decade (of career_begin) are derived, any other column is used as is.
+    :return: Dictionary from partition column to its Series of values
+    """
+    keys = {
+        'position_group': lambda: position_group(df['position']).mask(lambda group: group == ''),
+        'decade': lambda: df['career_begin'] // 10 * 10,
+    }
+    return {column: keys[column]() if column in keys else df[column] for column in by}
+
+def partition_path(by, values):
+    return '/'.join(f"{column}={NULL_PARTITION if pd.isna(value) else value}" for column, value in zip(by, values))
+
+def column_statistics(groups):
+    """
+    :param groups: DataFrameGroupBy of a table by its partition columns
+    :return: Tuple of DataFrames with the smallest and largest non-missing value of every column in every partition, leaving out columns whose values cannot be compared
+    """
+    try:
+        return groups.min(), groups.max()
+    except TypeError:
+        # Some column mixes types, so find the columns that can be compared and aggregate those together
+        columns = []
+        for column in groups.obj.columns:
+            try:
+                groups[column].min()
+                columns.append(column)
+            except TypeError:
+                continue
+        return groups[columns].min(), groups[columns].max()
+
+def statistics_row(statistics, position):
+    return {column: to_json_value(value) for column, value in statistics.iloc[position].items() if not pd.isna(value)}
+
+def write_shard(df, path, file_format, compression):
+    if file_format == 'csv':
+        df.to_csv(path, index = False, compression = compression)
+    elif file_format == 'jsonl':
+        df.to_json(path, orient = 'records', lines = True, compression = compression)
+    else:
+        df.to_parquet(path, index = False, compression = compression)
+
+def read_shard(path, file_format, text_columns = ()):
+    """
+    :param text_columns: Columns to read as strings, since a partition whose hashes or names all look like numbers would otherwise read them as numbers
+    """
+    if file_format == 'csv':
+        return pd.read_csv(path, dtype = {column: str for column in text_columns})
+    if file_format == 'jsonl':
+        return pd.read_json(path, lines = True, dtype = {column: str for column in text_columns})
+    return pd.read_parquet(path)
+
+def write_partitioned_table(df, directory, by, file_format, compression, max_workers = 4):
+    """
+    Writes one table as a file per partition under directory, in Hive layout (position_group=QB/decade=1990/part-00000.csv.gz). Files are written in parallel, since compression releases the GIL.
+
+    :return: Manifest entry of the table: its column types and a list of partitions with their path, partition values, row count, size and min/max of every column
+    """
+    extension = FORMATS[file_format][0] + (COMPRESSION_EXTENSIONS.get(compression, '') if file_format != 'parquet' else '')
+    keys = partition_columns(df, by)
+    groups = df.groupby([keys[column] for column in by], dropna = False, sort = True)
+    minimums, maximums = column_statistics(groups)
+    shards = []
+    # Groups are iterated in the same order as the rows of the statistics
+    for position, (values, rows) in enumerate(groups):
+        values = values if isinstance(values, tuple) else (values,)
+        relative_path = f"{partition_path(by, values)}/part-00000{extension}"
+        os.makedirs(os.path.dirname(os.path.join(directory, relative_path)), exist_ok = True)
+        shards.append((position, values, rows, relative_path))
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        list(executor.map(lambda shard: write_shard(shard[2], os.path.join(directory, shard[3]), file_format, compression), shards))
+
+    partitions = []
+    for position, values, rows, relative_path in shards:
+        path = os.path.join(directory, relative_path)
+        partitions.append({
+            'path': relative_path,
+            'values': {column: None if pd.isna(value) else to_json_value(value) for column, value in zip(by, values)},
+            'rows': rows.shape[0],
+            'bytes': os.path.getsize(path),
+            'min': statistics_row(minimums, position),
+            'max': statistics_row(maximums, position),
+        })
+    return {'columns': {column: str(dtype) for column, dtype in df.dtypes.items()}, 'partitions': partitions}
+
+def export_partitioned(output = PARTITIONED_EXPORT_DIR, stats_path = PLAYER_STATS_PATH, list_path = PLAYER_LIST_PATH, by = PARTITION_BY, file_format = 'csv', compression = None, max_workers = 4):
+    """
+    Writes the player list and the latest stats of every player as a partitioned dataset that Spark, Dask, pyarrow or read_partitioned can prune and read in parallel. Each table is a directory of compressed files, one per partition, and manifest.json lists every file with its row count and the min and max of each column.
+    The dataset is written next to output and swapped in at the end, so readers never see half of it.
+
+    :param output: Directory to write the dataset to. Anything already there is replaced.
+    :param stats_path: Path to the stats CSV
+    :param list_path: Path to the player list CSV
+    :param by: Columns to partition by, see partition_columns
+    :param file_format: csv, jsonl or parquet (which needs pyarrow)
+    :param compression: Compression of each file, by default gzip for csv and jsonl and snappy for parquet
+    :param max_workers: Number of files to write at once
+    :return: The manifest
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format {file_format!r}, use {', '.join(FORMATS)}")
+    compression = compression or FORMATS[file_format][1]
+    if file_format == 'parquet':
+        # Fails before the stats are loaded rather than on the first partition
+        import pyarrow
+    tables = {'player_stats': load_player_stats(stats_path)}
+    if os.path.exists(list_path):
+        tables['player_list'] = pd.read_csv(list_path)
+
+    tmp_output = output.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_output, ignore_errors = True)
+    try:
+        manifest = {
+            'created': time.time(),
+            'format': file_format,
+            'compression': compression,
+            'partition_by': list(by),
+            'tables': {name: write_partitioned_table(df, os.path.join(tmp_output, name), by, file_format, compression, max_workers) for name, df in tables.items()},
+        }
+        with open(os.path.join(tmp_output, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent = 1)
+    except BaseException:
+        shutil.rmtree(tmp_output, ignore_errors = True)
+        raise
+
+    old_output = output.rstrip('/') + '.old'
+    if os.path.exists(output):
+        shutil.rmtree(old_output, ignore_errors = True)
+        os.replace(output, old_output)
+    os.replace(tmp_output, output)
+    shutil.rmtree(old_output, ignore_errors = True)
+    return manifest
+
+def read_manifest(directory = PARTITIONED_EXPORT_DIR):
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        return json.load(f)
+
+def partition_matches(partition, where):
+    """
+    :param where: Dictionary from column to an inclusive (low, high) range, either end None for no bound
+    :return: False if the partition's values or min/max statistics show that none of its rows can match
+    """
+    for column, (low, high) in where.items():
+        if column in partition['values']:
+            smallest = largest = partition['values'][column]
+            if smallest is None:
+                return False
+        elif column in partition['min']:
+            smallest, largest = partition['min'][column], partition['max'][column]
+        else:
+            # Every value of the column is missing in this partition
+            return False
+        if (low is not None and largest < low) or (high is not None and smallest > high):
+            return False
+    return True
+
+def read_partitioned(directory = PARTITIONED_EXPORT_DIR, table = 'player_stats', where = None, max_workers = 4):
+    """
+    Reads a table of a partitioned dataset, skipping partitions the manifest shows have no matching rows and reading the rest in parallel.
+
+    :param directory: Directory written by export_partitioned
+    :param table: player_stats or player_list
+    :param where: Dictionary from column (including partition columns such as position_group) to an inclusive (low, high) range, either end None for no bound, e.g. {'position_group': ('QB', 'QB'), 'decade': (1990, None)}
+    :param max_workers: Number of files to read at once
+    :return: DataFrame of the matching rows, with the partition columns added
+    """
+    manifest = read_manifest(directory)
+    entry = manifest['tables'][table]
+    where = where or {}
+    partitions = [partition for partition in entry['partitions'] if partition_matches(partition, where)]
+    text_columns = [column for column, dtype in entry['columns'].items() if dtype in ('object', 'str', 'string')]
+
+    def read(partition):
+        shard = read_shard(os.path.join(directory, table, partition['path']), manifest['format'], text_columns)
+        return pd.concat([shard, pd.DataFrame(partition['values'], index = shard.index)], axis = 1)
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        shards = list(executor.map(read, partitions))
+    columns = list(entry['columns']) + [column for column in manifest['partition_by'] if column not in entry['columns']]
+    if len(shards) == 0:
+        return pd.DataFrame(columns = columns)
+    df = pd.concat(shards, ignore_index = True)[columns]
+    for column, (low, high) in where.items():
+        if low is not None:
+            df = df[df[column] >= low]
+        if high is not None:
+            df = df[df[column] <= high]
+    return df.reset_index(drop = True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Writes the player list and stats as a partitioned, compressed dataset with a manifest of partition statistics.')
+    parser.add_argument('--output', default = PARTITIONED_EXPORT_DIR, help = 'Directory to write the dataset to')
+    parser.add_argument('--stats', default = PLAYER_STATS_PATH, help = 'Path to the player stats CSV')
+    parser.add_argument('--list', dest = 'list_path', default = PLAYER_LIST_PATH, help = 'Path to the player list CSV')
+    parser.add_argument('--by', default = ','.join(PARTITION_BY), help = 'Comma-separated columns to partition by (default position_group,decade)')
+    parser.add_argument('--format', choices = list(FORMATS), default = 'csv', help = 'File format (default csv)')
+    parser.add_argument('--compression', help = 'Compression of each file (default gzip, or snappy for parquet)')
+    args = parser.parse_args()
+    manifest = export_partitioned(args.output, args.stats, args.list_path, args.by.split(','), args.format, args.compression)
+    for name, entry in manifest['tables'].items():
+        print(f"Wrote {sum(partition['rows'] for partition in entry['partitions'])} {name} rows to {len(entry['partitions'])} partitions in {os.path.join(args.output, name)}.")
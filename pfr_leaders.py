@@ -0,0 +1,204 @@
+import heapq
+import argparse
+import numpy as np
+
+from pfr_scraper import PLAYER_STATS_PATH, DELTAS_DIR
+from pfr_deltas import DeltaIndex, stat_columns, player_partition, to_float
+
+LEADERBOARD_INDEX_PATH = 'data/leaderboard_index.pkl'
+
+def decade(text):
+    year = int(text)
+    if year % 10 != 0:
+        raise argparse.ArgumentTypeError(f"{text} is not a decade, e.g. use {year // 10 * 10}")
+    return year
+
+class LeaderboardIndex(DeltaIndex):
+    """
+    Sorted values of every numeric stats column, partitioned by position group and era, for top-N and percentile lookups without sorting the stats.
+
+    Each (column, partition) keeps its non-zero values in ascending order with the matching player_ids, plus the number of players at zero, since most players have zero of most stats. A query reads the end of each partition it covers, or bisects each one, and combines the results.
+
+    :param df: DataFrame from load_player_stats
+    :param delta_offsets: Dictionary from delta file name to the number of bytes of it already reflected in df
+    """
+    default_path = LEADERBOARD_INDEX_PATH
+
+    def __init__(self, df, delta_offsets = None):
+        super().__init__(delta_offsets)
+        self.columns = stat_columns(df)
+        self.partitions = {int(player_id): player_partition(position, career_begin)
+                           for player_id, position, career_begin in zip(df['player_id'], df['position'], df['career_begin'])}
+        # Current value of every column for every player, by player_id, so changes can be applied without the old row
+        size = int(df['player_id'].max()) + 1 if df.shape[0] > 0 else 1
+        player_ids = df['player_id'].to_numpy(dtype = np.int64)
+        self.values = {}
+        for column in self.columns:
+            self.values[column] = np.full(size, np.nan)
+            self.values[column][player_ids] = df[column].to_numpy(dtype = np.float64)
+
+        self.boards = {column: {} for column in self.columns}
+        partition_keys = sorted(set(self.partitions.values()))
+        key_codes = {key: code for code, key in enumerate(partition_keys)}
+        codes = np.array([key_codes[self.partitions[int(player_id)]] for player_id in player_ids], dtype = np.int64)
+        for column in self.columns:
+            values = self.values[column][player_ids]
+            zeros = np.bincount(codes[values == 0], minlength = len(partition_keys))
+            nonzero = ~np.isnan(values) & (values != 0)
+            # One sort by partition, then value, then player_id, split at the partition boundaries
+            order = np.lexsort((player_ids[nonzero], values[nonzero], codes[nonzero]))
+            sorted_codes = codes[nonzero][order]
+            sorted_values = values[nonzero][order]
+            sorted_ids = player_ids[nonzero][order]
+            bounds = np.searchsorted(sorted_codes, np.arange(len(partition_keys) + 1))
+            for code, key in enumerate(partition_keys):
+                start, end = bounds[code], bounds[code + 1]
+                self.boards[column][key] = [sorted_values[start:end].copy(), sorted_ids[start:end].astype(np.int32), int(zeros[code])]
+
+    def selected_partitions(self, column, position, era_from, era_to):
+        if column not in self.boards:
+            raise KeyError(f"{column} is not a numeric stats column")
+        # The index only knows each player's decade, so a year inside a decade cannot be answered exactly
+        for era in (era_from, era_to):
+            if era is not None and era % 10 != 0:
+                raise ValueError(f"Eras are decades, {era} is not one, e.g. use {era // 10 * 10}")
+        for (group, era), board in self.boards[column].items():
+            if position is not None and group != position.upper():
+                continue
+            if (era_from is not None and era < era_from) or (era_to is not None and era > era_to):
+                continue
+            yield board
+
+    def top(self, column, n = 10, position = None, era_from = None, era_to = None, ascending = False):
+        """
+        Finds the players with the highest (or lowest) non-zero values of a stat.
+
+        :param column: Numeric stats column, e.g. pass_yds_reg
+        :param n: Number of players to return
+        :param position: Only players whose first listed position is this, e.g. QB
+        :param era_from: Only players whose careers began in or after this decade, e.g. 1980. Years that are not decades raise ValueError.
+        :param era_to: Only players whose careers began in or before this decade
+        :param ascending: Return the lowest values instead
+        :return: List of (player_id, value) pairs, best first
+        """
+        candidates = []
+        for values, player_ids, _ in self.selected_partitions(column, position, era_from, era_to):
+            end = values[:n] if ascending else values[-n:]
+            ids = player_ids[:n] if ascending else player_ids[-n:]
+            candidates.extend(zip(ids.tolist(), end.tolist()))
+        pick = heapq.nsmallest if ascending else heapq.nlargest
+        return pick(n, candidates, key = lambda candidate: candidate[1])
+
+    def percentile(self, column, player_id = None, value = None, position = None, era_from = None, era_to = None):
+        """
+        Finds the percentile of a player's value, or of any value, among the players in the selected partitions. Ties count half.
+
+        :param column: Numeric stats column
+        :param player_id: The player's ID
+        :param value: Value to rank instead of a player's
+        :param position: Only compare against players whose first listed position is this
+        :param era_from: Only compare against players whose careers began in or after this decade
+        :param era_to: Only compare against players whose careers began in or before this decade
+        :return: Percentile between 0 and 100, or None if the player has no value or no players are selected
+        """
+        if value is None:
+            values = self.values.get(column)
+            if values is None or player_id is None or player_id >= len(values) or np.isnan(values[player_id]):
+                return None
+            value = values[player_id]
+        below = equal = total = 0
+        for values, _, zeros in self.selected_partitions(column, position, era_from, era_to):
+            left = np.searchsorted(values, value, side = 'left')
+            right = np.searchsorted(values, value, side = 'right')
+            below += left + (zeros if value > 0 else 0)
+            equal += right - left + (zeros if value == 0 else 0)
+            total += len(values) + zeros
+        if total == 0:
+            return None
+        return (below + equal / 2) / total * 100
+
+    def remove(self, column, player_id, partition):
+        value = self.values[column][player_id]
+        if np.isnan(value):
+            return
+        board = self.boards[column][partition]
+        if value == 0:
+            board[2] -= 1
+            return
+        values, player_ids, _ = board
+        start = np.searchsorted(values, value, side = 'left')
+        end = np.searchsorted(values, value, side = 'right')
+        pos = start + int(np.flatnonzero(player_ids[start:end] == player_id)[0])
+        board[0] = np.delete(values, pos)
+        board[1] = np.delete(player_ids, pos)
+
+    def insert(self, column, player_id, partition, value):
+        board = self.boards[column].setdefault(partition, [np.zeros(0), np.zeros(0, dtype = np.int32), 0])
+        if np.isnan(value):
+            return
+        if value == 0:
+            board[2] += 1
+            return
+        pos = np.searchsorted(board[0], value, side = 'right')
+        board[0] = np.insert(board[0], pos, value)
+        board[1] = np.insert(board[1], pos, player_id)
+
+    def set_player(self, player_id, changes):
+        """
+        Updates one player's values, moving only the entries that changed.
+
+        :param player_id: The player's ID
+        :param changes: Dictionary from column to new value, including position and career_begin if they are new or changed. Other columns that are not numeric stats columns are ignored.
+        """
+        position = changes.get('position')
+        career_begin = changes.get('career_begin')
+        old_partition = self.partitions.get(player_id)
+        if old_partition is None and (position is None or career_begin is None):
+            return
+        new_partition = player_partition(position if position is not None else old_partition[0], career_begin if career_begin is not None else old_partition[1])
+        moved = new_partition != old_partition
+        for column in self.columns:
+            if player_id >= len(self.values[column]):
+                self.values[column] = np.concatenate([self.values[column], np.full(player_id + 1 - len(self.values[column]), np.nan)])
+            if column not in changes and not moved:
+                continue
+            new_value = to_float(changes[column]) if column in changes else self.values[column][player_id]
+            if not moved and (new_value == self.values[column][player_id] or (np.isnan(new_value) and np.isnan(self.values[column][player_id]))):
+                continue
+            if old_partition is not None:
+                self.remove(column, player_id, old_partition)
+            self.insert(column, player_id, new_partition, new_value)
+            self.values[column][player_id] = new_value
+        self.partitions[player_id] = new_partition
+
+def get_leaderboard_index(path = LEADERBOARD_INDEX_PATH, stats_path = PLAYER_STATS_PATH, deltas_dir = DELTAS_DIR):
+    """
+    Loads the leaderboard index on first use, building it if it is missing, and applies any new run deltas, saving the index if they changed it.
+
+    :param path: Path of the saved index
+    :param stats_path: Path to the player stats CSV
+    :param deltas_dir: Directory of the run delta files
+    :return: LeaderboardIndex
+    """
+    return LeaderboardIndex.get(path, stats_path, deltas_dir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Looks up stat leaders and percentiles from the precomputed leaderboard index.')
+    parser.add_argument('column', help = 'Numeric stats column, e.g. pass_yds_reg')
+    parser.add_argument('--top', type = int, default = 10, help = 'Number of leaders to print')
+    parser.add_argument('--player', type = int, help = "Print this player's percentile instead of the leaders")
+    parser.add_argument('--position', help = 'Only players whose first listed position is this, e.g. QB')
+    parser.add_argument('--from', dest = 'era_from', type = decade, help = 'Only players whose careers began in or after this decade, e.g. 1980')
+    parser.add_argument('--to', dest = 'era_to', type = decade, help = 'Only players whose careers began in or before this decade, e.g. 1990')
+    parser.add_argument('--ascending', action = 'store_true', help = 'List the lowest non-zero values instead')
+    parser.add_argument('--rebuild', action = 'store_true', help = 'Rebuild the index from the stats CSV first')
+    args = parser.parse_args()
+    if args.rebuild:
+        LeaderboardIndex.build().save()
+    index = get_leaderboard_index()
+    if args.player is not None:
+        percentile = index.percentile(args.column, args.player, position = args.position, era_from = args.era_from, era_to = args.era_to)
+        print(f"{percentile:.1f}" if percentile is not None else "No value for this player.")
+    else:
+        for rank, (player_id, value) in enumerate(index.top(args.column, args.top, args.position, args.era_from, args.era_to, args.ascending), start = 1):
+            print(f"{rank:>3}. {player_id:>6}  {value:g}")
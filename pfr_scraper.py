@@ -1,11 +1,35 @@
 import re
 import os
+import sys
 import time
 import json
+import math
+import heapq
 import string
+import signal
+import argparse
+import random
+import cProfile
+import functools
+import contextlib
+import collections
+import tracemalloc
+import shutil
+import hashlib
+import zipfile
+import gzip
+import codecs
+import datetime
+import email.utils
+import xml.etree.ElementTree as ElementTree
+import threading
+import multiprocessing
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Comment
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+from html.parser import HTMLParser
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -20,60 +44,650 @@ HEADERS = {
 
 PLAYER_LIST_PATH = 'data/player_list.csv'
 PLAYER_STATS_PATH = 'data/player_stats.csv'
+PLAYER_TABLE_STATS_PATH = 'data/player_table_stats.csv'
+PLAYER_LIST_PARTS_DIR = 'data/player_list_parts'
+CRAWL_QUEUE_PATH = 'data/crawl_queue.json'
+DELTAS_DIR = 'data/deltas'
+GAME_LOGS_DIR = 'data/game_logs'
+GAME_LOG_PROGRESS_FILE = 'done.csv'
+
+GAME_LOG_URL = 'https://www.pro-football-reference.com{0}/gamelog/{1}/'
+# Game log table ids and the season type of their games
+GAME_LOG_TABLES = {'stats': 'reg', 'stats_playoffs': 'post'}
+
+
+GAMES_PLAYED_STATS = ['g', 'gs']
+PASSING_STATS = ['games', 'games_started', 'qb_rec', 'pass_cmp', 'pass_att', 'pass_cmp_pct', 'pass_yds', 'pass_td', 'pass_td_pct', 'pass_int', 'pass_int_pct',
+                 'pass_first_down', 'pass_success', 'pass_long', 'pass_yds_per_att', 'pass_adj_yds_per_att', 'pass_yds_per_cmp', 'pass_yds_per_g', 'pass_rating',
+                 'pass_sacked', 'pass_sacked_yds', 'pass_sacked_pct', 'pass_net_yds_per_att', 'pass_adj_net_yds_per_att', 'comebacks', 'gwd']
+RUSHING_AND_RECEIVING_STATS = ['games', 'games_started', 'rush_att', 'rush_yds', 'rush_td', 'rush_first_down', 'rush_success', 'rush_long', 'rush_yds_per_att',
+                               'rush_yds_per_g', 'rush_att_per_g', 'targets', 'rec', 'rec_yds', 'rec_yds_per_rec', 'rec_td', 'rec_first_down', 'rec_success',
+                               'rec_long', 'rec_per_g', 'rec_yds_per_g', 'catch_pct', 'rec_yds_per_tgt', 'touches', 'yds_per_touch', 'rush_receive_td']
+DEFENSE_STATS = ['games', 'games_started', 'def_int', 'def_int_yds', 'def_int_td', 'def_int_long', 'pass_defended', 'fumbles_forced', 'fumbles', 'fumbles_rec',
+                 'fumbles_rec_yds', 'fumbles_rec_td', 'sacks', 'tackles_combined', 'tackles_solo', 'tackles_assists', 'tackles_loss', 'qb_hits', 'safety_md']
+RETURNS_STATS = ['games', 'games_started', 'punt_ret', 'punt_ret_yds', 'punt_ret_td', 'punt_ret_long', 'punt_ret_yds_per_ret', 'kick_ret', 'kick_ret_yds',
+                 'kick_ret_td', 'kick_ret_long', 'kick_ret_yds_per_ret']
+
+# Tables read by parse_player_stats_page: the table ids it accepts and the data-stat cells it reads from the table's tfoot
+PLAYER_STATS_TABLES = {
+    'games_played': (('games_played',), GAMES_PLAYED_STATS),
+    'games_played_playoffs': (('games_played_playoffs',), GAMES_PLAYED_STATS),
+    'passing': (('passing',), PASSING_STATS),
+    'passing_post': (('passing_post',), PASSING_STATS),
+    'rushing_and_receiving': (('rushing_and_receiving', 'receiving_and_rushing'), RUSHING_AND_RECEIVING_STATS),
+    'rushing_and_receiving_post': (('rushing_and_receiving_post', 'receiving_and_rushing_post'), RUSHING_AND_RECEIVING_STATS),
+    'defense': (('defense',), DEFENSE_STATS),
+    'defense_post': (('defense_post',), DEFENSE_STATS),
+    'returns': (('returns',), RETURNS_STATS),
+    'returns_post': (('returns_post',), RETURNS_STATS),
+}
+
+# Retired players with fixed career totals checked before a crawl. Between them they cover every table in PLAYER_STATS_TABLES.
+# For each player: the tables their page must have, and ranges the parsed stats must fall in.
+CANARY_PLAYERS = {
+    '/players/B/BradTo00.htm': {  # Tom Brady
+        'tables': ['passing', 'passing_post', 'rushing_and_receiving'],
+        'checks': {'pass_yds_reg': (80000, 100000), 'pass_yds_post': (10000, 16000), 'games_reg': (300, 350), 'pass_rating_reg': (90, 105)}
+    },
+    '/players/P/PeteAd01.htm': {  # Adrian Peterson
+        'tables': ['rushing_and_receiving', 'rushing_and_receiving_post'],
+        'checks': {'rush_yds_reg': (14000, 16000), 'rec_reg': (250, 400), 'rush_yds_post': (100, 1500)}
+    },
+    '/players/W/WattJ.00.htm': {  # J.J. Watt
+        'tables': ['defense', 'defense_post'],
+        'checks': {'sacks_reg': (100, 130), 'tackles_combined_reg': (400, 800), 'games_reg': (130, 180)}
+    },
+    '/players/H/HestDe99.htm': {  # Devin Hester
+        'tables': ['returns', 'returns_post'],
+        'checks': {'punt_ret_td_reg': (10, 20), 'kick_ret_td_reg': (3, 10)}
+    },
+    '/players/K/KelcJa00.htm': {  # Jason Kelce
+        'tables': ['games_played', 'games_played_playoffs'],
+        'checks': {'games_reg': (150, 250), 'games_post': (10, 30)}
+    },
+}
 
 SCRAPING_RATE = 10 # pages per minute
 
-def scrape_page(url, max_retries = 10, backoff_factor = 10, headers = HEADERS, timeout = 5):
+# Bytes read from the connection at a time when streaming a page
+STREAM_CHUNK_SIZE = 16384
+# Ids of elements below every stats table on a player page. A streamed page is cut off at the first of them.
+STREAM_STOP_IDS = ('bottom_nav', 'footer')
+COMMENT_TABLE_ID_PATTERN = re.compile(r'<table[^>]*\bid="([^"]+)"')
+
+class LiveTransport:
     """
-    Scrapes a web page and retries on timeout.
+    Fetches pages from the network, retrying with exponential backoff. Each thread reuses its own session so connections are kept alive between pages.
 
-    :param url: URL of the web page to scrape
     :param max_retries: Maximum number of retry attempts
     :param backoff_factor: Backoff factor for retries. Algorithm for waiting between retries: {backoff factor} * (2 ** ({number of total retries} - 1))
+    """
+    def __init__(self, max_retries = 10, backoff_factor = 10):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            retry_strategy = Retry(
+                total = self.max_retries,
+                backoff_factor = self.backoff_factor,
+                status_forcelist = [429, 500, 502, 503, 504],
+                allowed_methods = ["GET"]
+            )
+            adapter = HTTPAdapter(max_retries = retry_strategy)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self.local.session = session
+        return self.local.session
+
+    # Transports that can stop reading a page part way through, see read_streamed
+    streams = True
+
+    def get(self, url, headers, timeout, scanner = None):
+        response = self.session().get(url, headers = headers, timeout = timeout, stream = scanner is not None)
+        return read_streamed(response, scanner) if scanner is not None else response
+
+    def close(self):
+        pass
+
+class PageScanner(HTMLParser):
+    """
+    Follows the HTML of a player page as it arrives and tells when everything the stats parser reads has gone by: div#meta and one of the ids of every stats table, or an element that comes after all the stats (STREAM_STOP_IDS).
+
+    A page does not say which stats tables it lacks until it ends, and most players lack some of them, so most pages are read up to STREAM_STOP_IDS and only what follows is skipped.
+
+    :param stats_tables: Dictionary from table name to (table ids, data-stats), as in SiteProfile
+    :param stop_ids: Ids of elements after which the page has no stats
+    """
+    def __init__(self, stats_tables, stop_ids = STREAM_STOP_IDS):
+        super().__init__(convert_charrefs = False)
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors = 'replace')
+        self.pending = [set(table_ids) for table_ids, _ in stats_tables.values()]
+        self.stop_ids = set(stop_ids)
+        self.open_tables = []
+        self.div_depth = 0
+        self.meta_depth = None
+        self.meta_done = False
+        self.stopped = False
+
+    @property
+    def done(self):
+        return self.stopped or (self.meta_done and len(self.pending) == 0)
+
+    def feed_bytes(self, chunk):
+        self.feed(self.decoder.decode(chunk))
+
+    def table_complete(self, table_id):
+        self.pending = [table_ids for table_ids in self.pending if table_id not in table_ids]
+
+    def handle_starttag(self, tag, attrs):
+        element_id = dict(attrs).get('id')
+        if element_id in self.stop_ids:
+            self.stopped = True
+        if tag == 'div':
+            self.div_depth += 1
+            if element_id == 'meta':
+                self.meta_depth = self.div_depth
+        elif tag == 'table':
+            self.open_tables.append(element_id)
+
+    def handle_endtag(self, tag):
+        if tag == 'div':
+            if self.meta_depth == self.div_depth:
+                self.meta_done = True
+                self.meta_depth = None
+            self.div_depth -= 1
+        elif tag == 'table' and len(self.open_tables) > 0:
+            self.table_complete(self.open_tables.pop())
+
+    def handle_comment(self, data):
+        # Sports-Reference sends some tables inside comments and shows them with JavaScript
+        for table_id in COMMENT_TABLE_ID_PATTERN.findall(data):
+            self.table_complete(table_id)
+
+def read_streamed(response, scanner, chunk_size = STREAM_CHUNK_SIZE):
+    """
+    Reads a streamed response a chunk at a time, feeding each chunk to the scanner as it arrives, and closes the connection as soon as the scanner has seen everything it needs. Error responses are read in full.
+
+    :param response: requests.Response from a request made with stream = True
+    :param scanner: PageScanner
+    :param chunk_size: Number of bytes to read at a time
+    :return: RecordedResponse with the bytes read, which end part way through the page if it was cut off. Its skipped_bytes is the number of bytes of the response left unread, as sent over the connection, or None if the page was cut off and the server gave no Content-Length.
+    """
+    if response.status_code >= 400:
+        return response
+    chunks = []
+    skipped_bytes = 0
+    try:
+        for chunk in response.iter_content(chunk_size):
+            chunks.append(chunk)
+            scanner.feed_bytes(chunk)
+            if scanner.done:
+                length = response.headers.get('Content-Length', '')
+                # tell() counts the bytes read from the connection, before any gzip decoding, like Content-Length
+                skipped_bytes = max(0, int(length) - response.raw.tell()) if length.isdigit() and hasattr(response.raw, 'tell') else None
+                break
+    finally:
+        # Closing a response that has not been read to the end drops its connection instead of returning it to the pool
+        response.close()
+    recorded = RecordedResponse(response.url, response.status_code, b''.join(chunks))
+    recorded.skipped_bytes = skipped_bytes
+    return recorded
+
+class RecordedResponse:
+    """
+    Minimal stand-in for requests.Response holding a page served from an archive.
+    """
+    def __init__(self, url, status_code, content):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response = self)
+
+def archive_entry_name(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+ARCHIVE_INDEX_FILE = 'index.jsonl'
+
+class RecordingTransport:
+    """
+    Passes requests through to another transport and saves every response to an archive directory that ReplayTransport can serve later: one gzipped file per page, named by archive_entry_name, and an index with a line for each page recorded.
+
+    Each page is written to a temporary file and renamed into place before its index line is appended and synced, so a run killed at any point leaves every page recorded before it readable. Recording a URL again replaces its file, and the later index line wins.
+
+    :param path: Path of the archive directory. Pages are added if it already exists.
+    :param inner: Transport that actually fetches the pages
+    """
+    def __init__(self, path, inner = None):
+        self.inner = inner or LiveTransport()
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok = True)
+        index_path = os.path.join(path, ARCHIVE_INDEX_FILE)
+        # A line cut short by a killed run is removed, so the next line starts on its own
+        if truncate_partial_line(index_path):
+            print(f"Removed partial line from the end of {index_path}")
+        self.index = open(index_path, 'a')
+
+    def get(self, url, headers, timeout):
+        response = self.inner.get(url, headers, timeout)
+        name = archive_entry_name(url)
+        page_path = os.path.join(self.path, name + '.gz')
+        tmp_path = f"{page_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(gzip.compress(response.content))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, page_path)
+        with self.lock:
+            self.index.write(json.dumps({'name': name, 'url': url, 'status': response.status_code, 'recorded': time.time()}) + '\n')
+            self.index.flush()
+            os.fsync(self.index.fileno())
+        return response
+
+    def close(self):
+        self.inner.close()
+        self.index.close()
+
+def read_archive_index(path):
+    """
+    :param path: Path of an archive directory written by RecordingTransport
+    :return: Dictionary from entry name to its index record. A line cut short by a killed run is ignored.
+    """
+    entries = {}
+    index_path = os.path.join(path, ARCHIVE_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[record['name']] = record
+    return entries
+
+class ReplayTransport:
+    """
+    Serves pages from an archive written by RecordingTransport instead of the network, optionally adding simulated latency. Zip archives recorded by earlier versions are read too.
+
+    :param path: Path of the archive directory, or of a zip archive
+    :param latency: Mean number of seconds to wait before serving each page
+    :param jitter: Maximum number of seconds added to or taken from the latency, chosen uniformly at random
+    """
+    def __init__(self, path, latency = 0, jitter = 0):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        if os.path.isdir(path):
+            self.archive = None
+            self.entries = read_archive_index(path)
+        else:
+            self.archive = zipfile.ZipFile(path, 'r')
+            # Later recordings of the same URL replace earlier ones
+            self.entries = {info.filename: info for info in self.archive.infolist()}
+
+    def get(self, url, headers, timeout):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        entry = self.entries.get(archive_entry_name(url))
+        if entry is None:
+            raise requests.exceptions.ConnectionError(f"{url} is not in the archive")
+        if self.archive is None:
+            with open(os.path.join(self.path, entry['name'] + '.gz'), 'rb') as f:
+                return RecordedResponse(url, entry['status'], gzip.decompress(f.read()))
+        with self.lock:
+            content = self.archive.read(entry)
+        return RecordedResponse(url, json.loads(entry.comment)['status'], content)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+transport = LiveTransport()
+
+def set_transport(new_transport):
+    """
+    Replaces the transport used by scrape_page, e.g. with a RecordingTransport or ReplayTransport.
+
+    :param new_transport: Object with get(url, headers, timeout) and close() methods
+    """
+    global transport
+    transport.close()
+    transport = new_transport
+
+def scrape_page(url, headers = HEADERS, timeout = 5, scanner = None, allow_statuses = ()):
+    """
+    Scrapes a web page through the current transport. The live transport retries on timeouts and error statuses.
+
+    :param url: URL of the web page to scrape
     :param headers: HTTP headers to include in the request
     :param timeout: Number of seconds to wait for the server to send data before giving up
+    :param scanner: PageScanner to stop reading the page once it has seen everything needed, or None to read the whole page. Transports that cannot stream, such as the recording and replay transports, read the whole page anyway.
+    :param allow_statuses: Error statuses that are a definite answer rather than a failure, e.g. (404,). Responses with them are returned.
     :return: The HTML content of the web page, or None if all retries fail
     """
-    retry_strategy = Retry(
-        total = max_retries,
-        backoff_factor = backoff_factor,
-        status_forcelist = [429, 500, 502, 503, 504],
-        allowed_methods = ["GET"]
-    )
-    
-    adapter = HTTPAdapter(max_retries = retry_strategy)
-    session = requests.Session()
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-    
     try:
-        response = session.get(url, headers = headers, timeout = timeout)
-        response.raise_for_status()
+        if scanner is not None and getattr(transport, 'streams', False):
+            response = transport.get(url, headers, timeout, scanner)
+        else:
+            response = transport.get(url, headers, timeout)
+        if response.status_code not in allow_statuses:
+            response.raise_for_status()
         return response
     except requests.exceptions.RequestException as e:
         print(f"Failed to scrape {url}: {e}")
         return None
         
-def scrape_player_lists(urls, max_pages_per_minute = SCRAPING_RATE):
+class RateLimiter:
+    """
+    Spaces out requests so that no more than a fixed number of pages per minute are fetched, across all threads sharing the limiter.
     """
-    Scrapes multiple web pages, pausing between each page to avoid exceeding the rate limit.
+    def __init__(self, max_pages_per_minute = SCRAPING_RATE):
+        self.lock = threading.Lock()
+        self.set_rate(max_pages_per_minute)
+        self.next_time = time.monotonic()
+
+    def set_rate(self, max_pages_per_minute):
+        """
+        :param max_pages_per_minute: Maximum number of pages to fetch per minute, or 0 for no limit
+        """
+        self.interval = 60 / max_pages_per_minute if max_pages_per_minute > 0 else 0
+
+    def reserve(self, not_before = 0):
+        """
+        Books the next free slot without waiting for it.
+
+        :param not_before: Earliest time.monotonic() the slot may start at
+        :return: time.monotonic() at which the caller may make its request
+        """
+        with self.lock:
+            start = max(self.next_time, time.monotonic(), not_before)
+            self.next_time = start + self.interval
+        return start
+
+    def wait(self):
+        """
+        Blocks until the caller is allowed to make its next request.
+        """
+        time.sleep(max(0, self.reserve() - time.monotonic()))
+
+rate_limiter = RateLimiter()
+
+EGRESS_COOLDOWN = 60 # seconds a route rests after a 429 from a host, doubled for each 429 in a row
+EGRESS_FAILURE_COOLDOWN = 10 # seconds a route rests after a connection failure or server error, doubled for each failure in a row
+EGRESS_MAX_COOLDOWN = 3600
+# Weight of the latest request in a route's health score, which ranges from 0 (every recent request failed) to 1
+EGRESS_HEALTH_WEIGHT = 0.2
+
+class SourceAddressAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that opens its connections, direct or to a proxy, from a given local address.
+    """
+    def __init__(self, source_address, **kwargs):
+        self.source_address = (source_address, 0)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['source_address'] = self.source_address
+        super().init_poolmanager(*args, **kwargs)
 
-    :param urls: List of URLs of the web pages to scrape
-    :param max_pages_per_minute: Maximum number of pages to scrape per minute
-    :return: List of HTML content of the web pages
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs['source_address'] = self.source_address
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+class EgressRoute:
     """
-    data = []
-    delay = 60 / max_pages_per_minute
-    for url in urls:
-        print(f"Scraping {url}")
-        response = scrape_page(url)
+    One way out to the sites: directly, through a proxy, or from a particular local address. Each route has its own rate limit per host, a health score and cooldowns.
+
+    :param name: Name of the route in logs
+    :param proxy: Proxy URL such as http://127.0.0.1:8080, or None to connect directly
+    :param source_address: Local IP address to connect from, or None for the default
+    :param rate: Maximum pages per minute through this route to each host, or 0 for no limit
+    """
+    def __init__(self, name, proxy = None, source_address = None, rate = SCRAPING_RATE):
+        self.name = name
+        self.proxies = {'http': proxy, 'https': proxy} if proxy else None
+        self.source_address = source_address
+        self.rate = rate
+        self.limiters = collections.defaultdict(lambda: RateLimiter(self.rate))
+        self.cooldown_until = collections.defaultdict(float)
+        self.rate_limited_in_a_row = collections.Counter()
+        self.down_until = 0
+        self.failures_in_a_row = 0
+        self.health = 1.0
+        self.counts = collections.Counter()
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            # Only connection errors are retried here; the pool moves 429s and server errors to another route
+            retry_strategy = Retry(total = 1, status = 0, backoff_factor = 1, respect_retry_after_header = False, raise_on_status = False, allowed_methods = ["GET"])
+            if self.source_address:
+                adapter = SourceAddressAdapter(self.source_address, max_retries = retry_strategy)
+            else:
+                adapter = HTTPAdapter(max_retries = retry_strategy)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            if self.proxies:
+                session.proxies.update(self.proxies)
+            self.local.session = session
+        return self.local.session
+
+    def available_at(self, host):
+        """
+        :return: time.monotonic() at which the route can next send a request to the host
+        """
+        return max(self.limiters[host].next_time, self.cooldown_until[host], self.down_until)
+
+class EgressPool:
+    """
+    Transport that spreads requests over several egress routes, so the total rate is the sum of the routes' rates. Each request goes to the healthiest route that is free to send to the host now, or else to the route that is free soonest. A 429 rests the route for that host; connection failures and server errors rest the route for every host and lower its health. Either way the request is tried again on another route.
+
+    :param routes: List of EgressRoute
+    :param max_attempts: Number of routes a request is tried on before giving up, by default one more than the number of routes
+    :param cooldown: Seconds a route rests after a 429 without a Retry-After header
+    :param failure_cooldown: Seconds a route rests after a connection failure or server error
+    :param host_rate: Maximum pages per minute to each host across every route, applied to the sites' own limiters, by default SCRAPING_RATE for each route. 0 for no limit.
+    :param budget: CrawlBudget charged for every attempt whose result is not returned, or None. The caller charges the response it gets back, or the failure if every attempt fails.
+    """
+    def __init__(self, routes, max_attempts = None, cooldown = EGRESS_COOLDOWN, failure_cooldown = EGRESS_FAILURE_COOLDOWN, host_rate = None, budget = None):
+        if len(routes) == 0:
+            raise ValueError("an egress pool needs at least one route")
+        self.routes = routes
+        self.max_attempts = max_attempts or len(routes) + 1
+        self.cooldown = cooldown
+        self.failure_cooldown = failure_cooldown
+        self.host_rate = host_rate if host_rate is not None else SCRAPING_RATE * len(routes)
+        self.budget = budget
+        self.lock = threading.Lock()
+
+    def acquire(self, host):
+        """
+        Picks a route for a request to the host and books its next slot.
+
+        :return: Tuple of (EgressRoute, time.monotonic() at which the request may be sent)
+        """
+        with self.lock:
+            now = time.monotonic()
+            available = {route: route.available_at(host) for route in self.routes}
+            ready = [route for route in self.routes if available[route] <= now]
+            if len(ready) > 0:
+                route = max(ready, key = lambda route: route.health)
+            else:
+                route = min(self.routes, key = lambda route: (available[route], -route.health))
+            start = route.limiters[host].reserve(max(route.cooldown_until[host], route.down_until))
+        return route, start
+
+    def record(self, route, host, outcome, retry_after = None):
+        """
+        Updates a route's health and cooldowns after a request.
+
+        :param outcome: 'ok', 'rate_limited' or 'failed'
+        :param retry_after: Seconds from the Retry-After header of a 429, if it had one
+        """
+        with self.lock:
+            route.counts[outcome] += 1
+            route.health += EGRESS_HEALTH_WEIGHT * ((1.0 if outcome == 'ok' else 0.0) - route.health)
+            now = time.monotonic()
+            if outcome == 'ok':
+                route.failures_in_a_row = 0
+                route.rate_limited_in_a_row[host] = 0
+            elif outcome == 'rate_limited':
+                route.rate_limited_in_a_row[host] += 1
+                delay = retry_after if retry_after is not None else self.cooldown * 2 ** (route.rate_limited_in_a_row[host] - 1)
+                route.cooldown_until[host] = now + min(delay, EGRESS_MAX_COOLDOWN)
+                print(f"Egress {route.name} was rate limited by {host}, resting it for {min(delay, EGRESS_MAX_COOLDOWN):.0f}s.")
+            else:
+                route.failures_in_a_row += 1
+                route.down_until = now + min(self.failure_cooldown * 2 ** (route.failures_in_a_row - 1), EGRESS_MAX_COOLDOWN)
+
+    streams = True
+
+    def discard(self, response):
+        """
+        Charges the budget for an attempt whose result is not returned to the caller, and closes its response so that a streamed connection goes back to the pool.
+
+        :param response: Response of the attempt, or None if it failed without one
+        """
+        if self.budget is not None:
+            self.budget.charge(response)
         if response is not None:
-            player_data = parse_player_list_page(response)
-            data.append(player_data)
-        else:
-            print("Failed to scrape page.")
-        time.sleep(delay)
-    return data
+            response.close()
+
+    def get(self, url, headers, timeout, scanner = None):
+        host = urlparse(url).netloc
+        # The last response received and the last connection failure since it. Each is discarded once a later attempt replaces it.
+        response = None
+        error = None
+        for attempt in range(self.max_attempts):
+            route, start = self.acquire(host)
+            time.sleep(max(0, start - time.monotonic()))
+            try:
+                fetched = route.session().get(url, headers = headers, timeout = timeout, stream = scanner is not None)
+            except requests.exceptions.RequestException as e:
+                print(f"Egress {route.name} failed to fetch {url}: {e}")
+                self.record(route, host, 'failed')
+                if error is not None:
+                    self.discard(None)
+                error = e
+                continue
+            if error is not None:
+                self.discard(None)
+                error = None
+            if response is not None:
+                self.discard(response)
+            response = fetched
+            if response.status_code == 429:
+                self.record(route, host, 'rate_limited', parse_retry_after(response.headers.get('Retry-After')))
+            elif response.status_code >= 500:
+                self.record(route, host, 'failed')
+            else:
+                self.record(route, host, 'ok')
+                break
+        if response is None:
+            raise error
+        if error is not None:
+            self.discard(None)
+        return read_streamed(response, scanner) if scanner is not None else response
+
+    def summary(self):
+        """
+        :return: One line per route with its request counts and health
+        """
+        return '\n'.join(f"Egress {route.name}: {route.counts['ok']} ok, {route.counts['rate_limited']} rate limited, {route.counts['failed']} failed, health {route.health:.2f}" for route in self.routes)
+
+    def close(self):
+        pass
+
+def parse_retry_after(value):
+    """
+    :param value: Retry-After header, either a number of seconds or an HTTP date
+    :return: Number of seconds to wait, or None if the header is missing or unreadable
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (email.utils.parsedate_to_datetime(value) - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+def load_egress_pool(path):
+    """
+    Reads an egress pool from a JSON config file such as
+    {"routes": [{"name": "direct"}, {"name": "proxy-1", "proxy": "http://127.0.0.1:8080", "rate": 10}, {"name": "eth1", "source_address": "192.168.1.20"}], "cooldown": 60, "host_rate": 30}
+
+    :param path: Path of the config file
+    :return: EgressPool
+    """
+    with open(path) as f:
+        config = json.load(f)
+    routes = [EgressRoute(route.get('name', f"route-{number}"), route.get('proxy'), route.get('source_address'), route.get('rate', SCRAPING_RATE))
+              for number, route in enumerate(config['routes'], 1)]
+    return EgressPool(routes, config.get('max_attempts'), config.get('cooldown', EGRESS_COOLDOWN), config.get('failure_cooldown', EGRESS_FAILURE_COOLDOWN), config.get('host_rate'))
+
+def scrape_player_list_letter(letter, site):
+    """
+    Scrapes and parses the player list page for one letter and saves it as a checkpoint file.
+
+    :param letter: Letter of the player list page to scrape
+    :param site: SiteProfile of the site to scrape
+    :return: True if the letter was saved, False otherwise
+    """
+    if stop_requested.is_set():
+        return False
+    site.limiter.wait()
+    url = site.player_list_url.format(letter)
+    print(f"Scraping {url}")
+    response = scrape_page(url)
+    if response is None:
+        print(f"Failed to scrape player list for {letter}.")
+        return False
+    try:
+        player_data = site.parse_player_list(response)
+    except ValueError as e:
+        print(f"Failed to parse player list for {letter}: {e}")
+        return False
+    write_csv_atomic(player_data, os.path.join(site.list_parts_dir, f'{letter}.csv'))
+    print(f"Saved {player_data.shape[0]} players for {letter}.")
+    return True
+
+def scrape_player_lists(site, max_workers = 4):
+    """
+    Scrapes the player list pages for every letter concurrently, sharing the site's rate limit. Each letter is parsed as soon as it arrives and saved to its own file, so letters that are already saved are skipped on the next run.
+
+    :param site: SiteProfile of the site to scrape
+    :param max_workers: Maximum number of pages to fetch at once
+    :return: List of letters that could not be scraped
+    """
+    os.makedirs(site.list_parts_dir, exist_ok=True)
+    todo = [letter for letter in site.letters if not os.path.exists(os.path.join(site.list_parts_dir, f'{letter}.csv'))]
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        results = executor.map(lambda letter: scrape_player_list_letter(letter, site), todo)
+        return [letter for letter, saved in zip(todo, results) if not saved]
+
+def check_skipped_entries(skipped):
+    """
+    Stops a player list page with entries that could not be parsed from being saved, so a layout change fails the list build instead of quietly leaving players out.
+
+    :param skipped: Text of the entries that did not match the expected layout
+    """
+    if len(skipped) > 0:
+        examples = '; '.join(re.sub(r"\s+", " ", text).strip() for text in skipped[:5])
+        raise ValueError(f"{len(skipped)} player list entries did not match the expected layout, e.g. {examples}")
+
+PLAYER_ENTRY_PATTERN = re.compile(r"\(([^)]*)\)\s*(\d+)-(\d+)\s*$")
 
 def parse_player_list_page(player_list_page):
     """"
@@ -82,38 +696,36 @@ def parse_player_list_page(player_list_page):
     :param player_list: Response object from scraping the player list page
     :return: DataFrame with player data
     """
-    soup = BeautifulSoup(player_list_page.content, 'html.parser')
-    player_list = soup.find('div', {'id': 'div_players'}).find_all('p')
+    soup = BeautifulSoup(player_list_page.content, 'html.parser', parse_only = SoupStrainer('div', {'id': 'div_players'}))
     
     data = []
-    for entry in player_list:
-        # Extract link and name
+    skipped = []
+    for entry in soup.find_all('p'):
         a_tag = entry.find('a')
-        link = a_tag['href']
-        name = a_tag.text
-
-        # Extract position
-        position = entry.text.split(')')[0].split('(')[-1]
-
-        # Extract career years
-        years_text = entry.text.split(')')[-1].strip()
-        career_begin, career_end = map(int, years_text.split('-'))
-
-        # Extract active status
-        active = bool(entry.find('b'))
-        data.append([link, name, position, career_begin, career_end, active])
+        # Position and career years, e.g. "Isaako Aaitui (NT) 2013-2013"
+        match = PLAYER_ENTRY_PATTERN.search(entry.get_text())
+        if a_tag is None or match is None:
+            skipped.append(entry.get_text())
+            continue
+        active = entry.find('b') is not None
+        data.append([a_tag['href'], a_tag.get_text(), match.group(1), int(match.group(2)), int(match.group(3)), active])
+    soup.decompose()
+    check_skipped_entries(skipped)
 
     df = pd.DataFrame(data, columns=['link', 'name', 'position', 'career_begin', 'career_end', 'active'])
     df['scraped'] = False
     return df
 
-def parse_player_stats_page(player_page):
+def parse_player_stats_page(player_page, soup = None):
     """
     Parses the player stats page and returns a DataFrame with player stats.
     
     :param player_page: Response object from scraping the player's individual page
+    :param soup: BeautifulSoup of the page if it has already been parsed, or None to parse it here
     """
-    soup = BeautifulSoup(player_page.content, 'html.parser')
+    parsed_here = soup is None
+    if parsed_here:
+        soup = BeautifulSoup(player_page.content, 'html.parser')
 
     meta_info = soup.find('div', {'id': 'meta'}).text
     clean_meta_info = re.sub(r"\s+", " ", meta_info)
@@ -128,21 +740,6 @@ def parse_player_stats_page(player_page):
         height = None
         weight = None
         
-    soup = BeautifulSoup(response.content, 'html.parser')
-
-    meta_info = soup.find('div', {'id': 'meta'}).text
-    clean_meta_info = re.sub(r"\s+", " ", meta_info)
-
-    # Search for height and weight in the meta info
-    pattern = r"(\d+-\d+), (\d+lb)"
-    match = re.search(pattern, clean_meta_info)
-    if match:
-        height = match.group(1)
-        weight = match.group(2)
-    else:
-        height = None
-        weight = None
-
     player_games_reg_g = 0
     player_games_started_reg_g = 0
 
@@ -1224,42 +1821,1760 @@ def parse_player_stats_page(player_page):
         'kick_ret_yds_per_ret_post':player_kick_ret_yds_per_ret_post,
     }
     
+    if parsed_here:
+        soup.decompose()
     return(player_stats)
 
 
-if __name__ == '__main__':
-    if os.path.exists(PLAYER_LIST_PATH) == False:    
-        urls = [PLAYER_LIST_URL.format(letter) for letter in string.ascii_uppercase]
-        all_data = scrape_player_lists(urls)
 
-        player_list_df = pd.concat(all_data, ignore_index=True)
-        player_list_df.insert(loc = 0, column = 'player_id', value = list(range(1, player_list_df.shape[0]+1)))
-        player_list_df.to_csv(PLAYER_LIST_PATH, index=False)
-    
-    player_list_df = pd.read_csv(PLAYER_LIST_PATH)
-    
-    for i in player_list_df['player_id']:
-        if player_list_df['scraped'][i-1] == False:    
-            player_url = BASE_URL.format(player_list_df['link'][i-1])
-            print('Scraping player #{0} - {1}'.format(i, player_list_df['name'][i-1]))
-            response = scrape_page(player_url)
-            if response is not None:
-                player_stats = parse_player_stats_page(response)
-                player_stats_dict = {'player_id':i, 
-                                     'name':player_list_df['name'][i-1], 
-                                     'position':player_list_df['position'][i-1],
-                                     'career_begin':player_list_df['career_begin'][i-1], 
-                                     'career_end':player_list_df['career_end'][i-1], 
-                                     'active':player_list_df['active'][i-1]}
-                player_stats_dict.update(player_stats)
-                player_stats_df = pd.DataFrame(player_stats_dict, index=[0])
-                
-                player_stats_df.to_csv(PLAYER_STATS_PATH, mode='a', header=not os.path.exists(PLAYER_STATS_PATH), index = False)
-                
-                player_list_df.loc[player_list_df['player_id'] == i, 'scraped'] = True
-                player_list_df.to_csv('player_list.csv', index=False)
-                print('Saved data for player. Progress: {0}/{1} ({2}%)'.format(i, player_list_df.shape[0], round(i/(player_list_df.shape[0])*100, 2)))
-                print()
+def find_table(soup, table_id):
+    """
+    Finds a table by id, including tables that Sports-Reference sites ship inside HTML comments and only show with JavaScript.
+
+    :param soup: BeautifulSoup of the whole page
+    :param table_id: Id of the table
+    :return: The table element, or None if it is not on the page
+    """
+    table = soup.find('table', {'id': table_id})
+    if table is not None:
+        return table
+    for comment in soup.find_all(string = lambda text: isinstance(text, Comment) and f'id="{table_id}"' in text):
+        table = BeautifulSoup(comment, 'html.parser').find('table', {'id': table_id})
+        if table is not None:
+            return table
+    return None
+
+def parse_totals_page(player_page, tables, soup = None):
+    """
+    Parses a player page from any Sports-Reference site, reading career totals from the first tfoot row of each table. Columns are named {data-stat}_{table name}, and stats that are missing from the page default to 0.
+
+    :param player_page: Response object from scraping the player's individual page
+    :param tables: Dictionary from table name to (table ids, data-stats), as in PLAYER_STATS_TABLES
+    :param soup: BeautifulSoup of the page if it has already been parsed, or None to parse it here
+    :return: Dictionary of player stats, with height and weight
+    """
+    parsed_here = soup is None
+    if parsed_here:
+        soup = BeautifulSoup(player_page.content, 'html.parser')
+
+    height = None
+    weight = None
+    meta = soup.find('div', {'id': 'meta'})
+    if meta is not None:
+        match = re.search(r"(\d+-\d+), (\d+lb)", re.sub(r"\s+", " ", meta.text))
+        if match:
+            height = match.group(1)
+            weight = match.group(2)
+
+    player_stats = {'height': height, 'weight': weight}
+    for name, (table_ids, stats) in tables.items():
+        row = None
+        for table_id in table_ids:
+            table = find_table(soup, table_id)
+            if table is not None and table.find('tfoot') is not None:
+                row = table.find('tfoot').find('tr')
+                break
+        for stat in stats:
+            cell = row.find(['td', 'th'], {'data-stat': stat}) if row is not None else None
+            value = parse_cell_value(cell.get_text()) if cell is not None else None
+            player_stats[f'{stat}_{name}'] = value if value is not None else 0
+    if parsed_here:
+        soup.decompose()
+    return player_stats
+
+def extract_stat_tables(soup, player_id):
+    """
+    Reads the career totals of every stats table on a player page in one pass over its tables, including tables shipped inside HTML comments. Every table with an id and data-stat cells in its tfoot is read, so kicking, punting, scoring, advanced and postseason tables are kept even though no column of the stats CSV uses them yet.
+
+    :param soup: BeautifulSoup of the whole page
+    :param player_id: The player's ID
+    :return: List of dictionaries with player_id, table_id, stat and value, one per non-empty cell of each table's first tfoot row
+    """
+    tables = soup.find_all('table')
+    comment_soups = [BeautifulSoup(comment, 'html.parser') for comment in soup.find_all(string = lambda text: isinstance(text, Comment) and '<table' in text)]
+    for comment_soup in comment_soups:
+        tables.extend(comment_soup.find_all('table'))
+
+    rows = []
+    seen = set()
+    for table in tables:
+        table_id = table.get('id')
+        tfoot = table.find('tfoot')
+        if table_id is None or table_id in seen or tfoot is None or tfoot.find('tr') is None:
+            continue
+        seen.add(table_id)
+        for cell in tfoot.find('tr').find_all(['th', 'td'], attrs = {'data-stat': True}):
+            value = parse_cell_value(cell.get_text())
+            if value is not None:
+                rows.append({'player_id': player_id, 'table_id': table_id, 'stat': cell['data-stat'], 'value': value})
+    for comment_soup in comment_soups:
+        comment_soup.decompose()
+    return rows
+
+def parse_player_table_page(player_list_page):
+    """
+    Parses a player list page laid out as a table with one row per player, as on basketball-reference.com. Active players' names are in bold.
+
+    :param player_list_page: Response object from scraping the player list page
+    :return: DataFrame with player data
+    """
+    soup = BeautifulSoup(player_list_page.content, 'html.parser', parse_only = SoupStrainer('table', {'id': 'players'}))
+
+    data = []
+    for tr in soup.find_all('tr'):
+        player = tr.find(['th', 'td'], {'data-stat': 'player'})
+        if player is None or player.find('a') is None:
+            continue
+        a_tag = player.find('a')
+        cells = {cell.get('data-stat'): cell.get_text().strip() for cell in tr.find_all('td')}
+        active = player.find(['strong', 'b']) is not None
+        data.append([a_tag['href'], a_tag.get_text(), cells.get('pos', ''), int(cells['year_min']), int(cells['year_max']), active])
+    soup.decompose()
+
+    df = pd.DataFrame(data, columns=['link', 'name', 'position', 'career_begin', 'career_end', 'active'])
+    df['scraped'] = False
+    return df
+
+YEARS_ENTRY_PATTERN = re.compile(r"\((\d+)-(\d+)\)\s*$")
+
+def parse_player_years_page(player_list_page):
+    """
+    Parses a player list page laid out as one paragraph per player with only career years, e.g. "Hank Aaron (1954-1976)", as on baseball-reference.com. Positions are left empty.
+
+    :param player_list_page: Response object from scraping the player list page
+    :return: DataFrame with player data
+    """
+    soup = BeautifulSoup(player_list_page.content, 'html.parser', parse_only = SoupStrainer('div', {'id': 'div_players_'}))
+
+    data = []
+    skipped = []
+    for entry in soup.find_all('p'):
+        a_tag = entry.find('a')
+        match = YEARS_ENTRY_PATTERN.search(entry.get_text())
+        if a_tag is None or match is None:
+            skipped.append(entry.get_text())
+            continue
+        active = entry.find('b') is not None
+        data.append([a_tag['href'], a_tag.get_text(), '', int(match.group(1)), int(match.group(2)), active])
+    soup.decompose()
+    check_skipped_entries(skipped)
+
+    df = pd.DataFrame(data, columns=['link', 'name', 'position', 'career_begin', 'career_end', 'active'])
+    df['scraped'] = False
+    return df
+
+class SiteProfile:
+    """
+    Everything that differs between Sports-Reference sites: URLs, the layout of the player list pages, the stats tables to read, where data is saved and the site's own rate limit. Rate limits are per host, so each site gets its own RateLimiter and several sites can be crawled at once.
+
+    :param name: Short name of the site, used on the command line
+    :param base_url: URL template that a player link from the player list is formatted into
+    :param player_list_url: URL template that a letter is formatted into to get a player list page
+    :param letters: Letters of the player list pages
+    :param parse_player_list: Function parsing a player list page into a DataFrame
+    :param parse_stats: Function parsing a player page into a dictionary of stats
+    :param stats_tables: Dictionary from table name to (table ids, data-stats) read by parse_stats
+    :param canary_players: Dictionary from player link to the tables and checks for check_player_page
+    :param data_dir: Directory to save the site's data in
+    :param limiter: RateLimiter for the site's host, or None to create one allowing SCRAPING_RATE pages per minute
+    :param sitemap_url: URL of the site's sitemap index, listing player pages with the dates they last changed, or None
+    :param recent_pages: URL templates that a season is formatted into to get pages linking to every player who played that season
+    :param current_season: Function returning the season in progress, or most recently finished, for recent_pages
+    """
+    def __init__(self, name, base_url, player_list_url, letters, parse_player_list, parse_stats, stats_tables, canary_players, data_dir, limiter = None,
+                 sitemap_url = None, recent_pages = (), current_season = None):
+        self.name = name
+        self.base_url = base_url
+        self.player_list_url = player_list_url
+        self.letters = letters
+        self.parse_player_list = parse_player_list
+        self.parse_stats = parse_stats
+        self.stats_tables = stats_tables
+        self.canary_players = canary_players
+        self.limiter = limiter or RateLimiter()
+        self.sitemap_url = sitemap_url
+        self.recent_pages = recent_pages
+        self.current_season = current_season
+        self.list_path = os.path.join(data_dir, 'player_list.csv')
+        self.stats_path = os.path.join(data_dir, 'player_stats.csv')
+        self.table_stats_path = os.path.join(data_dir, 'player_table_stats.csv')
+        self.list_parts_dir = os.path.join(data_dir, 'player_list_parts')
+        self.queue_path = os.path.join(data_dir, 'crawl_queue.json')
+        self.deltas_dir = os.path.join(data_dir, 'deltas')
+
+def season_starting_in(month, named_by_end = False):
+    """
+    :param month: Month the league's seasons start in, e.g. 9 for the NFL
+    :param named_by_end: True if seasons are named after the year they end in, as in the NBA
+    :return: Function returning the season in progress, or the last one if the league is between seasons
+    """
+    def current_season(today = None):
+        today = today or datetime.date.today()
+        start_year = today.year if today.month >= month else today.year - 1
+        return start_year + 1 if named_by_end else start_year
+    return current_season
+
+BASKETBALL_STATS = ['g', 'gs', 'mp', 'fg', 'fga', 'fg_pct', 'fg3', 'fg3a', 'fg3_pct', 'ft', 'fta', 'ft_pct', 'orb', 'drb', 'trb', 'ast', 'stl', 'blk', 'tov', 'pf', 'pts']
+BASKETBALL_TABLES = {
+    'reg': (('totals',), BASKETBALL_STATS),
+    'post': (('playoffs_totals',), BASKETBALL_STATS),
+}
+BATTING_STATS = ['G', 'PA', 'AB', 'R', 'H', '2B', '3B', 'HR', 'RBI', 'SB', 'CS', 'BB', 'SO', 'batting_avg', 'onbase_perc', 'slugging_perc', 'onbase_plus_slugging', 'TB']
+PITCHING_STATS = ['W', 'L', 'earned_run_avg', 'G', 'GS', 'CG', 'SHO', 'SV', 'IP', 'H', 'R', 'ER', 'HR', 'BB', 'SO', 'whip']
+BASEBALL_TABLES = {
+    'batting': (('batting_standard',), BATTING_STATS),
+    'pitching': (('pitching_standard',), PITCHING_STATS),
+}
+
+PFR = SiteProfile(
+    name = 'pfr',
+    base_url = BASE_URL,
+    player_list_url = PLAYER_LIST_URL,
+    letters = string.ascii_uppercase,
+    parse_player_list = parse_player_list_page,
+    parse_stats = parse_player_stats_page,
+    stats_tables = PLAYER_STATS_TABLES,
+    canary_players = CANARY_PLAYERS,
+    data_dir = 'data',
+    limiter = rate_limiter,
+    sitemap_url = 'https://www.pro-football-reference.com/sitemap.xml',
+    recent_pages = tuple(f'https://www.pro-football-reference.com/years/{{0}}/{page}.htm' for page in ('passing', 'rushing', 'receiving', 'defense', 'returns', 'kicking', 'punting')),
+    current_season = season_starting_in(9)
+)
+
+BASKETBALL_REFERENCE = SiteProfile(
+    name = 'bbr',
+    base_url = 'https://www.basketball-reference.com{0}',
+    player_list_url = 'https://www.basketball-reference.com/players/{0}/',
+    letters = string.ascii_lowercase,
+    parse_player_list = parse_player_table_page,
+    parse_stats = functools.partial(parse_totals_page, tables = BASKETBALL_TABLES),
+    stats_tables = BASKETBALL_TABLES,
+    canary_players = {
+        '/players/j/jordami01.html': {  # Michael Jordan
+            'tables': ['reg', 'post'],
+            'checks': {'pts_reg': (32000, 32500), 'pts_post': (5900, 6000)}
+        },
+    },
+    data_dir = 'data/bbr',
+    sitemap_url = 'https://www.basketball-reference.com/sitemap.xml',
+    recent_pages = ('https://www.basketball-reference.com/leagues/NBA_{0}_totals.html',),
+    current_season = season_starting_in(10, named_by_end = True)
+)
+
+BASEBALL_REFERENCE = SiteProfile(
+    name = 'bref',
+    base_url = 'https://www.baseball-reference.com{0}',
+    player_list_url = 'https://www.baseball-reference.com/players/{0}/',
+    letters = string.ascii_lowercase,
+    parse_player_list = parse_player_years_page,
+    parse_stats = functools.partial(parse_totals_page, tables = BASEBALL_TABLES),
+    stats_tables = BASEBALL_TABLES,
+    canary_players = {
+        '/players/a/aaronha01.shtml': {  # Hank Aaron
+            'tables': ['batting'],
+            'checks': {'HR_batting': (750, 760), 'H_batting': (3700, 3800)}
+        },
+        '/players/r/ryanno01.shtml': {  # Nolan Ryan
+            'tables': ['pitching'],
+            'checks': {'SO_pitching': (5700, 5720), 'W_pitching': (320, 330)}
+        },
+    },
+    data_dir = 'data/bref',
+    sitemap_url = 'https://www.baseball-reference.com/sitemap.xml',
+    recent_pages = ('https://www.baseball-reference.com/leagues/majors/{0}-standard-batting.shtml', 'https://www.baseball-reference.com/leagues/majors/{0}-standard-pitching.shtml'),
+    current_season = season_starting_in(3)
+)
+
+SITES = {site.name: site for site in (PFR, BASKETBALL_REFERENCE, BASEBALL_REFERENCE)}
+
+class TTLCache:
+    """
+    Thread-safe cache that keeps at most maxsize entries, evicting the least recently used, and drops entries older than ttl seconds.
+
+    :param maxsize: Maximum number of entries
+    :param ttl: Number of seconds an entry stays valid
+    """
+    def __init__(self, maxsize = 256, ttl = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: The cached value, or None if the key is missing or expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last = False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+player_stats_cache = TTLCache()
+player_stats_in_flight = {}
+player_stats_in_flight_lock = threading.Lock()
+
+player_links_cache = {}
+
+def player_links(path = PLAYER_LIST_PATH):
+    """
+    Reads the player links from the player list, reading the file again only when it has changed, so players added by a later build or discovery run can be looked up.
+
+    :param path: Path to the player list CSV
+    :return: Dictionary from player_id to PFR link
+    """
+    modified = os.stat(path).st_mtime_ns
+    cached = player_links_cache.get(path)
+    if cached is None or cached[0] != modified:
+        player_list_df = pd.read_csv(path, usecols = ['player_id', 'link'])
+        cached = (modified, dict(zip(player_list_df['player_id'].astype(int), player_list_df['link'])))
+        player_links_cache[path] = cached
+    return cached[1]
+
+def get_player_stats(link_or_id):
+    """
+    Scrapes and parses one player's page on demand. Results are kept in player_stats_cache, and concurrent calls for the same player share a single fetch, so repeated lookups do not spend rate limit budget.
+
+    :param link_or_id: The player's PFR link, e.g. /players/M/MahoPa00.htm, or player_id from the player list
+    :return: Dictionary of player stats as returned by parse_player_stats_page, or None if the page could not be scraped
+    :raises ValueError: If a player_id is not in the player list
+    """
+    if str(link_or_id).isdigit():
+        link = player_links().get(int(link_or_id))
+        if link is None:
+            raise ValueError(f"player_id {link_or_id} is not in the player list")
+    else:
+        link = link_or_id
+    player_stats = player_stats_cache.get(link)
+    if player_stats is not None:
+        return dict(player_stats)
+
+    with player_stats_in_flight_lock:
+        future = player_stats_in_flight.get(link)
+        owner = future is None
+        if owner:
+            # The owner of a fetch caches its result before giving up its Future, so a caller that missed the cache just before then finds it here
+            player_stats = player_stats_cache.get(link)
+            if player_stats is not None:
+                return dict(player_stats)
+            future = Future()
+            player_stats_in_flight[link] = future
+    if not owner:
+        player_stats = future.result()
+        return dict(player_stats) if player_stats is not None else None
+
+    try:
+        rate_limiter.wait()
+        response = scrape_page(BASE_URL.format(link))
+        player_stats = parse_player_stats_page(response) if response is not None else None
+        if player_stats is not None:
+            player_stats_cache.set(link, player_stats)
+        future.set_result(player_stats)
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with player_stats_in_flight_lock:
+            del player_stats_in_flight[link]
+    return dict(player_stats) if player_stats is not None else None
+
+def check_player_page(player_page, tables, checks, site = PFR):
+    """
+    Checks that a player's page still has the layout the site's stats parser expects and that it parses to plausible values.
+
+    :param player_page: Response object from scraping the player's individual page
+    :param tables: Names of tables in the site's stats_tables the page must have
+    :param checks: Dictionary from stats column to the (low, high) range its parsed value must fall in
+    :param site: SiteProfile of the site the page is from
+    :return: List of problems found, empty if the page looks right
+    """
+    problems = []
+    soup = BeautifulSoup(player_page.content, 'html.parser')
+    if soup.find('div', {'id': 'meta'}) is None:
+        problems.append("div#meta missing")
+    for name in tables:
+        table_ids, stats = site.stats_tables[name]
+        table = next((table for table in (find_table(soup, table_id) for table_id in table_ids) if table is not None), None)
+        if table is None:
+            problems.append(f"table {' or '.join(table_ids)} missing")
+            continue
+        tfoot = table.find('tfoot')
+        if tfoot is None:
+            problems.append(f"table {table['id']} has no tfoot")
+            continue
+        for stat in stats:
+            if tfoot.find(['td', 'th'], {'data-stat': stat}) is None:
+                problems.append(f"table {table['id']} has no data-stat {stat}")
+
+    try:
+        player_stats = site.parse_stats(player_page, soup = soup)
+    except Exception as e:
+        problems.append(f"parse failed: {e!r}")
+        return problems
+    finally:
+        soup.decompose()
+    for column, (low, high) in checks.items():
+        value = player_stats.get(column)
+        if not isinstance(value, (int, float)) or not low <= value <= high:
+            problems.append(f"{column} is {value!r}, expected {low} to {high}")
+    return problems
+
+def run_canary(site = PFR, canary_players = None):
+    """
+    Scrapes a few known players and checks their pages before a full crawl, so a change to the site's page layout is caught before days of crawling produce zeros.
+
+    :param site: SiteProfile whose canary_players to check
+    :param canary_players: Dictionary from player link to the tables and checks, or None for all of the site's canary_players
+    :return: True if every page passed
+    """
+    passed = True
+    for link, expected in (canary_players if canary_players is not None else site.canary_players).items():
+        site.limiter.wait()
+        response = scrape_page(site.base_url.format(link))
+        if response is None:
+            problems = ["page could not be scraped"]
+        else:
+            problems = check_player_page(response, expected['tables'], expected['checks'], site)
+        if len(problems) > 0:
+            passed = False
+            print(f"Canary check failed for {link}:")
+            for problem in problems:
+                print(f"  - {problem}")
+        else:
+            print(f"Canary check passed for {link}.")
+    return passed
+
+def player_priority(player, last_scraped = None, priority_ids = frozenset()):
+    """
+    Default priority function for the crawl scheduler. Players with lower values are scraped first.
+
+    Players on the explicit priority list come first, then active players, then players whose careers ended most recently, then players that have gone the longest since their last successful scrape.
+
+    :param player: Row of the player list DataFrame
+    :param last_scraped: Unix timestamp of the player's last successful scrape, or None if never scraped
+    :param priority_ids: Set of player_ids to scrape before everyone else
+    :return: Tuple used as the sort key
+    """
+    player_id = int(player['player_id'])
+    return (
+        player_id not in priority_ids,
+        not bool(player['active']),
+        -int(player['career_end']),
+        last_scraped or 0,
+        player_id
+    )
+
+MAX_SCRAPE_FAILURES = 3 # failed fetches after which a player is left for the next rebuild of the queue
+
+class CrawlQueue:
+    """
+    Persistent priority queue of player_ids waiting to be scraped.
+
+    The queue and the time of each player's last successful scrape are saved to a JSON file so an interrupted run resumes in priority order instead of starting over. A player whose fetch failed goes back in the queue behind every player that has failed fewer times.
+    """
+    def __init__(self, path = CRAWL_QUEUE_PATH):
+        self.path = path
+        self.heap = []
+        self.last_scraped = {}
+        self.failures = {}
+        # Players popped but not yet scraped or failed, with their priorities, so a save in between keeps them
+        self.popped = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.failures = {int(player_id): count for player_id, count in state.get('failures', {}).items()}
+            self.heap = [(self.failures.get(player_id, 0), tuple(priority), player_id) for priority, player_id in state['queue']]
+            heapq.heapify(self.heap)
+            self.last_scraped = {int(player_id): timestamp for player_id, timestamp in state['last_scraped'].items()}
+
+    def __len__(self):
+        return len(self.heap) + len(self.popped)
+
+    def push(self, player_id, priority):
+        heapq.heappush(self.heap, (self.failures.get(int(player_id), 0), tuple(priority), int(player_id)))
+
+    def pop(self):
+        _, priority, player_id = heapq.heappop(self.heap)
+        self.popped[player_id] = priority
+        return player_id
+
+    def queued_ids(self):
+        """
+        :return: Set of the player_ids waiting in the queue or popped but not yet scraped
+        """
+        return {player_id for _, _, player_id in self.heap} | self.popped.keys()
+
+    def clear(self):
+        self.heap = []
+        self.failures = {}
+        self.popped = {}
+
+    def mark_scraped(self, player_id, timestamp = None):
+        self.popped.pop(int(player_id), None)
+        self.failures.pop(int(player_id), None)
+        self.last_scraped[int(player_id)] = timestamp or time.time()
+
+    def mark_failed(self, player_id, max_failures = MAX_SCRAPE_FAILURES):
+        """
+        Puts a popped player whose page could not be fetched back in the queue, behind every player that has failed fewer times.
+
+        :param player_id: The player's ID
+        :param max_failures: Number of failures after which the player is dropped from the queue. It stays unscraped in the player list, so the next rebuild of the queue adds it again.
+        :return: True if the player was queued again
+        """
+        player_id = int(player_id)
+        priority = self.popped.pop(player_id)
+        self.failures[player_id] = self.failures.get(player_id, 0) + 1
+        if self.failures[player_id] >= max_failures:
+            del self.failures[player_id]
+            return False
+        self.push(player_id, priority)
+        return True
+
+    def save(self):
+        """
+        Writes the queue to disk, replacing the previous file atomically so a crash never leaves a truncated queue.
+        """
+        entries = [[list(priority), player_id] for _, priority, player_id in self.heap] + [[list(priority), player_id] for player_id, priority in self.popped.items()]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'queue': entries, 'last_scraped': self.last_scraped, 'failures': self.failures}, f)
+        os.replace(tmp_path, self.path)
+
+def read_priority_file(path, player_list_df):
+    """
+    Reads a file of players to scrape first, one player_id or PFR link per line.
+
+    :param path: Path to the priority file
+    :param player_list_df: DataFrame with the player list
+    :return: Set of player_ids
+    """
+    link_to_id = dict(zip(player_list_df['link'], player_list_df['player_id']))
+    priority_ids = set()
+    with open(path) as f:
+        for line in f:
+            entry = line.strip()
+            if entry == '' or entry.startswith('#'):
+                continue
+            if entry.isdigit():
+                priority_ids.add(int(entry))
+            elif entry in link_to_id:
+                priority_ids.add(int(link_to_id[entry]))
             else:
-                print("Failed to scrape page.")
-            time.sleep(60/SCRAPING_RATE)
\ No newline at end of file
+                print(f"Unknown player in priority file: {entry}")
+    return priority_ids
+
+def build_crawl_queue(queue, player_list_df, refresh = False, priority_ids = frozenset(), priority_fn = player_priority):
+    """
+    Fills the crawl queue with the players that still need to be scraped.
+
+    :param queue: CrawlQueue to fill. Any entries already in it are discarded.
+    :param player_list_df: DataFrame with the player list
+    :param refresh: If True, queue every player, including ones already scraped
+    :param priority_ids: Set of player_ids to scrape before everyone else
+    :param priority_fn: Function taking (player, last_scraped, priority_ids) and returning a sort key
+    """
+    queue.clear()
+    for _, player in player_list_df.iterrows():
+        if refresh or not player['scraped']:
+            last_scraped = queue.last_scraped.get(int(player['player_id']))
+            queue.push(player['player_id'], priority_fn(player, last_scraped, priority_ids))
+    queue.save()
+
+PLAYER_LINK_PATTERN = re.compile(r'href="(?:https?://[^/"]+)?(/players/[A-Za-z]/[^"/]+\.s?html?)"')
+
+def parse_lastmod(text):
+    """
+    :param text: W3C datetime from a sitemap, e.g. 2024-10-01 or 2024-10-01T12:00:00+00:00
+    :return: Unix timestamp, or None if the text is missing or not a date
+    """
+    if text is None:
+        return None
+    try:
+        parsed = datetime.datetime.fromisoformat(text.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo = datetime.timezone.utc)
+    return parsed.timestamp()
+
+def parse_sitemap(content):
+    """
+    Parses a sitemap or sitemap index, gzipped or not.
+
+    :param content: Bytes of the sitemap
+    :return: Tuple of (True if it is a sitemap index, list of (URL, lastmod timestamp or None) pairs)
+    """
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    root = ElementTree.fromstring(content)
+    entries = []
+    for entry in root:
+        fields = {child.tag.rsplit('}', 1)[-1]: child.text for child in entry}
+        if fields.get('loc'):
+            entries.append((fields['loc'].strip(), parse_lastmod(fields.get('lastmod'))))
+    return root.tag.endswith('sitemapindex'), entries
+
+def discover_changed_links(site, since = None, budget = None):
+    """
+    Finds player pages that may have changed, from a handful of requests instead of every player list page. Player pages come from the site's sitemaps, with the date each page last changed, and from the current season's pages, which link every player who has played this season.
+
+    :param site: SiteProfile of the site
+    :param since: Unix timestamp. Child sitemaps that last changed before it are not fetched. None fetches them all.
+    :param budget: CrawlBudget charged for every page fetched, or None
+    :return: Dictionary from player link to the time the page last changed, or None for players found on current season pages
+    """
+    budget = budget or CrawlBudget()
+
+    def fetch(url):
+        site.limiter.wait()
+        print(f"Discovering changes from {url}")
+        response = scrape_page(url)
+        budget.charge(response)
+        return response
+
+    changed = {}
+    sitemaps = [site.sitemap_url] if site.sitemap_url else []
+    while len(sitemaps) > 0:
+        response = fetch(sitemaps.pop())
+        if response is None:
+            print("Failed to fetch sitemap.")
+            continue
+        try:
+            is_index, entries = parse_sitemap(response.content)
+        except (ElementTree.ParseError, OSError) as e:
+            print(f"Failed to parse sitemap: {e}")
+            continue
+        for url, lastmod in entries:
+            if is_index:
+                if since is None or lastmod is None or lastmod >= since:
+                    sitemaps.append(url)
+            elif PLAYER_LINK_PATTERN.fullmatch(f'href="{urlparse(url).path}"'):
+                changed[urlparse(url).path] = lastmod
+
+    if site.current_season is not None:
+        for template in site.recent_pages:
+            response = fetch(template.format(site.current_season()))
+            if response is None:
+                print("Failed to fetch current season page.")
+                continue
+            # The links are read with a regular expression so tables inside HTML comments are included without parsing the page
+            for link in PLAYER_LINK_PATTERN.findall(response.content.decode(errors = 'replace')):
+                changed.setdefault(link, None)
+    return changed
+
+def add_discovered_players(player_list_df, links, site = PFR):
+    """
+    Adds players that are not in the player list yet, scraping only the player list pages of their letters.
+
+    :param player_list_df: DataFrame with the player list
+    :param links: Player links found by discover_changed_links
+    :param site: SiteProfile of the site
+    :return: The player list with new players appended and given the next player_ids
+    """
+    known = set(player_list_df['link'])
+    letters = sorted({link.split('/')[2] for link in links if link not in known and link.split('/')[2] in site.letters})
+    if len(letters) == 0:
+        return player_list_df
+    os.makedirs(site.list_parts_dir, exist_ok = True)
+    new_players = []
+    for letter in letters:
+        part_path = os.path.join(site.list_parts_dir, f'{letter}.csv')
+        if os.path.exists(part_path) or scrape_player_list_letter(letter, site):
+            letter_df = pd.read_csv(part_path)
+            new_players.append(letter_df[~letter_df['link'].isin(known)])
+            os.remove(part_path)
+    if len(new_players) == 0:
+        return player_list_df
+    new_players = pd.concat(new_players, ignore_index = True)
+    new_players.insert(loc = 0, column = 'player_id', value = list(range(int(player_list_df['player_id'].max()) + 1, int(player_list_df['player_id'].max()) + 1 + new_players.shape[0])))
+    print(f"Found {new_players.shape[0]} new players.")
+    player_list_df = pd.concat([player_list_df, new_players], ignore_index = True)
+    write_csv_atomic(player_list_df, site.list_path)
+    return player_list_df
+
+def build_discovery_queue(queue, player_list_df, changed, recent_since, priority_fn = player_priority):
+    """
+    Adds the players whose pages changed to the crawl queue: players whose sitemap date is after their last successful scrape, and players on current season pages not scraped since recent_since. Players never scraped are always queued.
+
+    :param queue: CrawlQueue to add to. Players already in it, such as the rest of an unfinished full crawl, keep their place.
+    :param player_list_df: DataFrame with the player list
+    :param changed: Dictionary from discover_changed_links
+    :param recent_since: Unix timestamp. Players found on current season pages are queued if last scraped before it.
+    :param priority_fn: Function taking (player, last_scraped, priority_ids) and returning a sort key
+    """
+    queued = queue.queued_ids()
+    never_scraped = ~player_list_df['player_id'].astype(int).isin(queue.last_scraped.keys()) | ~player_list_df['scraped'].astype(bool)
+    for _, player in player_list_df[player_list_df['link'].isin(changed.keys()) | never_scraped].iterrows():
+        player_id = int(player['player_id'])
+        if player_id in queued:
+            continue
+        last_scraped = queue.last_scraped.get(player_id)
+        lastmod = changed.get(player['link'])
+        if last_scraped is None or not player['scraped'] or last_scraped < (lastmod if lastmod is not None else recent_since):
+            queue.push(player_id, priority_fn(player, last_scraped, frozenset()))
+    queue.save()
+
+def discovery_since(queue, player_list_df):
+    """
+    :param queue: CrawlQueue with the time of each player's last successful scrape
+    :param player_list_df: DataFrame with the player list
+    :return: Unix timestamp of the least recent scrape of any player in the list, or None if some player has never been scraped
+    """
+    last_scraped = [queue.last_scraped.get(int(player_id)) for player_id in player_list_df['player_id']]
+    if len(last_scraped) == 0 or None in last_scraped:
+        return None
+    return min(last_scraped)
+
+def save_player_stats(rows, path = PLAYER_STATS_PATH):
+    """
+    Appends rows of player stats to the stats CSV in a single write. A player scraped again on a refresh gets a new row, and the last row for each player_id wins.
+
+    :param rows: List of dictionaries of player information and stats
+    :param path: Path to the stats CSV
+    """
+    player_stats_df = pd.DataFrame(rows)
+    with open(path, 'a', newline='') as f:
+        player_stats_df.to_csv(f, header=f.tell() == 0, index = False)
+        f.flush()
+        os.fsync(f.fileno())
+
+def truncate_partial_line(path):
+    """
+    Removes a last line that was cut short, i.e. anything after the file's last newline, as left in an append-only file by a run that was killed mid-write.
+
+    :param path: Path to a line-oriented file. Nothing is done if it does not exist.
+    :return: True if a partial line was removed
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return False
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return False
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+        f.truncate(size - len(tail) + tail.rfind(b'\n') + 1)
+    return True
+
+def repair_player_stats(path = PLAYER_STATS_PATH):
+    """
+    Truncates a half-written last row left in the stats CSV by a run that was killed mid-write.
+
+    :param path: Path to the stats CSV
+    """
+    if truncate_partial_line(path):
+        print(f"Removed partial row from the end of {path}")
+
+def write_csv_atomic(df, path):
+    """
+    Writes a DataFrame to CSV through a temporary file so readers never see a partially written file.
+
+    :param df: DataFrame to write
+    :param path: Path to the CSV
+    """
+    tmp_path = path + '.tmp'
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def load_player_stats(path = PLAYER_STATS_PATH):
+    """
+    Reads the stats CSV, keeping only the most recent row for each player.
+
+    :param path: Path to the stats CSV
+    :return: DataFrame with player stats
+    """
+    player_stats_df = pd.read_csv(path)
+    return player_stats_df.drop_duplicates('player_id', keep='last').reset_index(drop=True)
+
+def load_table_stats(path = PLAYER_TABLE_STATS_PATH):
+    """
+    Reads the long-format table stats CSV, keeping only the most recent value of each stat for each player.
+
+    :param path: Path to the table stats CSV
+    :return: DataFrame with player_id, table_id, stat and value
+    """
+    table_stats_df = pd.read_csv(path, dtype = {'value': str})
+    return table_stats_df.drop_duplicates(['player_id', 'table_id', 'stat'], keep='last').reset_index(drop=True)
+
+def table_stats_columns(table_stats_df, table_ids):
+    """
+    Turns long-format table stats into one row per player with a {stat}_{table_id} column for every stat of the given tables, so new stats columns can be added from pages that were already scraped.
+
+    :param table_stats_df: DataFrame from load_table_stats
+    :param table_ids: Ids of the tables to include, e.g. ['kicking', 'punting']
+    :return: DataFrame indexed by player_id. Columns whose values are all numbers are converted to numbers.
+    """
+    selected = table_stats_df[table_stats_df['table_id'].isin(table_ids)]
+    wide = selected.pivot(index = 'player_id', columns = ['table_id', 'stat'], values = 'value')
+    wide.columns = [f'{stat}_{table_id}' for table_id, stat in wide.columns]
+    for column in wide.columns:
+        numbers = pd.to_numeric(wide[column], errors = 'coerce')
+        if numbers.notna().sum() == wide[column].notna().sum():
+            wide[column] = numbers
+    return wide
+
+def export_player_stats(output, stats_path = PLAYER_STATS_PATH):
+    """
+    Writes the most recent row of every player to a single file, in the format given by its extension: .csv, .jsonl or .parquet (which needs pyarrow).
+
+    :param output: Path of the file to write
+    :param stats_path: Path to the stats CSV
+    :return: Number of players written
+    """
+    extension = os.path.splitext(output)[1].lower()
+    if extension not in ('.csv', '.jsonl', '.parquet'):
+        raise ValueError(f"Unknown export format {extension!r}, use .csv, .jsonl or .parquet")
+    if extension == '.parquet':
+        # Fails before the stats are loaded rather than after
+        import pyarrow
+    player_stats_df = load_player_stats(stats_path)
+    if extension == '.csv':
+        write_csv_atomic(player_stats_df, output)
+    elif extension == '.jsonl':
+        player_stats_df.to_json(output, orient = 'records', lines = True)
+    else:
+        player_stats_df.to_parquet(output, index = False)
+    return player_stats_df.shape[0]
+
+def build_player_list(site = PFR):
+    """
+    Scrapes the player list pages for every letter and saves the combined player list once all letters are done.
+
+    :param site: SiteProfile of the site to scrape
+    :return: True if the player list was saved, False if some letters are still missing
+    """
+    failed = scrape_player_lists(site)
+    if len(failed) > 0:
+        print(f"Player list incomplete, missing letters: {', '.join(failed)}. Run again to retry them.")
+        return False
+
+    all_data = [pd.read_csv(os.path.join(site.list_parts_dir, f'{letter}.csv')) for letter in site.letters]
+    player_list_df = pd.concat(all_data, ignore_index=True)
+    player_list_df.insert(loc = 0, column = 'player_id', value = list(range(1, player_list_df.shape[0]+1)))
+    write_csv_atomic(player_list_df, site.list_path)
+    shutil.rmtree(site.list_parts_dir)
+    return True
+
+def parse_duration(text):
+    """
+    Parses a duration such as '90', '45m' or '8h' into seconds.
+
+    :param text: Number followed by an optional unit: s, m, h or d
+    :return: Number of seconds
+    """
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1].lower() in units:
+        return float(text[:-1]) * units[text[-1].lower()]
+    return float(text)
+
+def parse_size(text):
+    """
+    Parses a size such as '1000', '500K' or '2G' into bytes.
+
+    :param text: Number followed by an optional unit: K, M or G
+    :return: Number of bytes
+    """
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+    if text[-1].lower() in units:
+        return int(float(text[:-1]) * units[text[-1].lower()])
+    return int(text)
+
+class CrawlBudget:
+    """
+    Limits a run by wall time, number of pages fetched and bytes downloaded. Any limit left as None is unlimited.
+    """
+    def __init__(self, max_duration = None, max_pages = None, max_bytes = None):
+        self.max_duration = max_duration
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.start = time.monotonic()
+        self.pages = 0
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def charge(self, response):
+        with self.lock:
+            self.pages += 1
+            if response is not None:
+                self.bytes += len(response.content)
+
+    def exhausted(self):
+        """
+        :return: Description of the limit that has been reached, or None if the run can continue
+        """
+        if self.max_duration is not None and time.monotonic() - self.start >= self.max_duration:
+            return f"time limit of {self.max_duration:g}s reached"
+        if self.max_pages is not None and self.pages >= self.max_pages:
+            return f"page limit of {self.max_pages} reached"
+        if self.max_bytes is not None and self.bytes >= self.max_bytes:
+            return f"byte limit of {self.max_bytes} reached"
+        return None
+
+stop_requested = threading.Event()
+
+def request_stop(signum, frame):
+    """
+    Signal handler for SIGINT and SIGTERM. Only sets a flag, so the fetch and write in progress finish before the crawl stops.
+    """
+    if stop_requested.is_set():
+        raise KeyboardInterrupt
+    print(f"Received {signal.Signals(signum).name}, stopping after the current player. Send again to stop immediately.")
+    stop_requested.set()
+
+def checkpoint(player_list_df, queue, rows, changes = None, site = PFR, table_rows = None):
+    """
+    Saves crawl progress: buffered table stats and stats rows are appended first, then their delta records, then the player list and queue are replaced atomically.
+
+    :param player_list_df: DataFrame with the player list
+    :param queue: CrawlQueue of player_ids to scrape
+    :param rows: List of buffered stats rows. Emptied once written.
+    :param changes: ChangeLog holding buffered delta records, or None
+    :param site: SiteProfile whose files to write
+    :param table_rows: List of buffered rows from extract_stat_tables, or None. Emptied once written.
+    """
+    if table_rows:
+        save_player_stats(table_rows, site.table_stats_path)
+        table_rows.clear()
+    if len(rows) > 0:
+        save_player_stats(rows, site.stats_path)
+        rows.clear()
+    if changes is not None:
+        changes.flush()
+    write_csv_atomic(player_list_df, site.list_path)
+    queue.save()
+
+def normalize_stat_value(value):
+    """
+    Converts a stat value to a canonical string, so a value freshly parsed from a page and the same value read back from the CSV compare equal.
+
+    :param value: Value of one column of a stats row
+    :return: String form of the value, with integral floats written as ints and missing values as ''
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def to_json_value(value):
+    """
+    :param value: Value of one column of a stats row, possibly a NumPy scalar or NaN
+    :return: Equivalent value that json.dumps accepts
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+def stats_row_hash(row):
+    """
+    Hashes the content of a stats row, ignoring any existing row_hash column.
+
+    :param row: Dictionary of player information and stats
+    :return: 16 character hex digest
+    """
+    content = '\x1f'.join(f"{column}={normalize_stat_value(row[column])}" for column in sorted(row) if column != 'row_hash')
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+def table_rows_hash(table_rows):
+    """
+    Hashes the stat tables read from a player's page, so a scrape can tell whether they changed without reading player_table_stats.csv.
+
+    :param table_rows: List of rows from extract_stat_tables
+    :return: 16 character hex digest
+    """
+    content = '\x1f'.join(sorted(f"{row['table_id']}/{row['stat']}={normalize_stat_value(row['value'])}" for row in table_rows))
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+def add_row_hashes(path = PLAYER_STATS_PATH):
+    """
+    Adds the table_hash and row_hash columns to a stats CSV written before rows carried them. Rows without a table_hash count as changed the next time their player is scraped, so their stat tables are saved then.
+
+    :param path: Path to the stats CSV
+    """
+    if not os.path.exists(path):
+        return
+    with open(path) as f:
+        header = f.readline().strip().split(',')
+    if 'row_hash' in header and 'table_hash' in header:
+        return
+    print(f"Adding row hashes to {path}")
+    # row_hash goes last, as in the rows crawl_players writes
+    player_stats_df = pd.read_csv(path).drop(columns = 'row_hash', errors = 'ignore')
+    if 'table_hash' not in player_stats_df.columns:
+        player_stats_df = pd.concat([player_stats_df, pd.DataFrame({'table_hash': None}, index = player_stats_df.index)], axis = 1)
+    row_hashes = [stats_row_hash(row) for row in player_stats_df.to_dict('records')]
+    player_stats_df = pd.concat([player_stats_df, pd.DataFrame({'row_hash': row_hashes}, index = player_stats_df.index)], axis = 1)
+    write_csv_atomic(player_stats_df, path)
+
+class ChangeLog:
+    """
+    Compares each scraped stats row with the row already saved for the player and records the run's changes.
+
+    Changes are written to a delta file, data/deltas/run-<run_id>.jsonl, with one JSON object per scraped player: op 'insert' with the new row, op 'update' with the old and new value of each changed column, or op 'unchanged'. A manifest, run-<run_id>.manifest.json, is written when the run ends. Unchanged rows are not written to the stats CSV again.
+
+    :param previous_df: DataFrame from load_player_stats with the rows already saved, or None
+    :param directory: Directory to write delta files and manifests to
+    :param stats_path: Path of the stats CSV the deltas apply to
+    """
+    def __init__(self, previous_df = None, directory = DELTAS_DIR, stats_path = PLAYER_STATS_PATH):
+        self.run_id = time.strftime('%Y%m%dT%H%M%S')
+        self.started = time.time()
+        self.directory = directory
+        self.stats_path = stats_path
+        self.delta_path = os.path.join(directory, f'run-{self.run_id}.jsonl')
+        self.manifest_path = os.path.join(directory, f'run-{self.run_id}.manifest.json')
+        if previous_df is None or previous_df.shape[0] == 0:
+            self.previous_df = None
+            self.hashes = {}
+        else:
+            self.previous_df = previous_df.set_index('player_id')
+            self.hashes = {int(player_id): row_hash for player_id, row_hash in zip(previous_df['player_id'], previous_df['row_hash'])}
+        # Rows saved during this run, which replace the ones in previous_df
+        self.saved = {}
+        self.pending = []
+        self.counts = {'insert': 0, 'update': 0, 'unchanged': 0}
+
+    def tables_changed(self, row):
+        """
+        Call before record.
+
+        :param row: Dictionary of player information and stats, with table_hash set
+        :return: True if the player's stat tables differ from the ones saved last, going by table_hash
+        """
+        player_id = int(row['player_id'])
+        old = self.saved.get(player_id)
+        if old is None:
+            if player_id not in self.hashes or 'table_hash' not in self.previous_df.columns:
+                return True
+            old = self.previous_df.loc[player_id]
+        return normalize_stat_value(old.get('table_hash')) != row['table_hash']
+
+    def record(self, row):
+        """
+        Sets the row's row_hash and records how it differs from the saved row.
+
+        :param row: Dictionary of player information and stats
+        :return: True if the row is new or changed and should be saved
+        """
+        row['row_hash'] = stats_row_hash(row)
+        player_id = int(row['player_id'])
+        old_hash = self.hashes.get(player_id)
+        if old_hash is None:
+            op = 'insert'
+            record = {'op': op, 'player_id': player_id, 'new': {column: to_json_value(value) for column, value in row.items()}}
+        elif old_hash == row['row_hash']:
+            op = 'unchanged'
+            record = {'op': op, 'player_id': player_id}
+        else:
+            op = 'update'
+            old = self.saved.get(player_id)
+            if old is None:
+                old = self.previous_df.loc[player_id].to_dict()
+            changed = {column: [to_json_value(old.get(column)), to_json_value(value)] for column, value in row.items()
+                       if column != 'player_id' and normalize_stat_value(old.get(column)) != normalize_stat_value(value)}
+            record = {'op': op, 'player_id': player_id, 'changed': changed}
+        self.counts[op] += 1
+        self.pending.append(record)
+        if op != 'unchanged':
+            self.hashes[player_id] = row['row_hash']
+            self.saved[player_id] = dict(row)
+        return op != 'unchanged'
+
+    def flush(self):
+        """
+        Appends the buffered delta records to the delta file.
+        """
+        if len(self.pending) == 0:
+            return
+        os.makedirs(self.directory, exist_ok = True)
+        with open(self.delta_path, 'a') as f:
+            for record in self.pending:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending.clear()
+
+    def finish(self, stop_reason = None):
+        """
+        Flushes remaining delta records and writes the run manifest.
+
+        :param stop_reason: Why the run stopped before the queue was empty, or None if it finished
+        """
+        self.flush()
+        manifest = {
+            'run_id': self.run_id,
+            'started': self.started,
+            'finished': time.time(),
+            'complete': stop_reason is None,
+            'stop_reason': stop_reason,
+            'stats_path': self.stats_path,
+            'delta_path': os.path.basename(self.delta_path) if os.path.exists(self.delta_path) else None,
+            'counts': self.counts
+        }
+        os.makedirs(self.directory, exist_ok = True)
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent = 2)
+        os.replace(tmp_path, self.manifest_path)
+        print('Run {0}: {1} inserted, {2} updated, {3} unchanged.'.format(self.run_id, self.counts['insert'], self.counts['update'], self.counts['unchanged']))
+
+class StageProfiler:
+    """
+    Times each stage of the crawl (fetch, parse, write) for every page. For a random sample of pages it also collects cProfile call statistics, tracemalloc peak memory and sampled call stacks, aggregated per stage across the run.
+
+    :param sample_rate: Fraction of pages to profile in detail, from 0 to 1
+    :param stack_interval: Seconds between call stack samples while a profiled stage runs
+    """
+    def __init__(self, sample_rate = 1.0, stack_interval = 0.005):
+        self.sample_rate = sample_rate
+        self.stack_interval = stack_interval
+        self.stats = {}
+        self.profiles = {}
+        self.stacks = {}
+        self.current = None
+        self.sampler = None
+
+    def sample(self):
+        """
+        :return: True if the next page should be profiled in detail
+        """
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @contextlib.contextmanager
+    def stage(self, name, sampled = False):
+        """
+        Context manager wrapping one stage of one page.
+
+        :param name: Name of the stage
+        :param sampled: If True, profile this stage in detail
+        """
+        stats = self.stats.setdefault(name, {'calls': 0, 'seconds': 0.0, 'sampled': 0, 'total_peak_bytes': 0, 'max_peak_bytes': 0})
+        if sampled:
+            self.start_sampler()
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            tracemalloc.start()
+            self.current = (name, threading.get_ident())
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats['seconds'] += time.perf_counter() - start
+            stats['calls'] += 1
+            if sampled:
+                profile.disable()
+                self.current = None
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                stats['sampled'] += 1
+                stats['total_peak_bytes'] += peak
+                stats['max_peak_bytes'] = max(stats['max_peak_bytes'], peak)
+
+    def start_sampler(self):
+        if self.sampler is None:
+            self.sampler = threading.Thread(target = self.sample_stacks, daemon = True)
+            self.sampler.start()
+
+    def sample_stacks(self):
+        while True:
+            time.sleep(self.stack_interval)
+            current = self.current
+            if current is None:
+                continue
+            name, thread_id = current
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            counts = self.stacks.setdefault(name, {})
+            key = ';'.join(reversed(stack))
+            counts[key] = counts.get(key, 0) + 1
+
+    def report(self):
+        """
+        :return: Table of time and memory per stage as a string
+        """
+        lines = [f"{'stage':<8}{'calls':>8}{'total s':>10}{'mean ms':>10}{'sampled':>9}{'mean peak KB':>14}{'max peak KB':>13}"]
+        for name, stats in self.stats.items():
+            mean_ms = stats['seconds'] / stats['calls'] * 1000 if stats['calls'] else 0
+            mean_peak = stats['total_peak_bytes'] / stats['sampled'] / 1024 if stats['sampled'] else 0
+            lines.append(f"{name:<8}{stats['calls']:>8}{stats['seconds']:>10.1f}{mean_ms:>10.1f}{stats['sampled']:>9}{mean_peak:>14.0f}{stats['max_peak_bytes'] / 1024:>13.0f}")
+        return '\n'.join(lines)
+
+    def dump(self, directory):
+        """
+        Writes <stage>.pstats files for pstats or snakeviz, <stage>.collapsed files for flamegraph.pl or speedscope, and a summary.txt table.
+
+        :param directory: Directory to write the profile files to
+        """
+        os.makedirs(directory, exist_ok = True)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(directory, f'{name}.pstats'))
+        for name, counts in self.stacks.items():
+            with open(os.path.join(directory, f'{name}.collapsed'), 'w') as f:
+                for stack, count in sorted(counts.items()):
+                    f.write(f"{stack} {count}\n")
+        with open(os.path.join(directory, 'summary.txt'), 'w') as f:
+            f.write(self.report() + '\n')
+
+def parse_player_page(site, content, player_id):
+    """
+    Parses a player page exactly once, reads the site's stats and every stat table from the same tree, and then tears the tree down so its memory is freed straight away rather than when the garbage collector finds the cycles.
+
+    :param site: SiteProfile the page is from
+    :param content: Bytes of the page
+    :param player_id: The player's ID
+    :return: Tuple of (dictionary of player stats, list of rows from extract_stat_tables)
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    try:
+        player_stats = site.parse_stats(RecordedResponse(None, 200, content), soup = soup)
+        table_rows = extract_stat_tables(soup, player_id)
+    finally:
+        soup.decompose()
+    return player_stats, table_rows
+
+def current_rss():
+    """
+    :return: Resident set size of this process in bytes, or its peak where the current size is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+def parse_worker_main(connection, site_name):
+    """
+    Runs in a ParseWorker process, parsing pages sent over the connection until it is closed.
+    """
+    site = SITES[site_name]
+    while True:
+        try:
+            content, player_id = connection.recv()
+        except EOFError:
+            break
+        try:
+            result = ('ok', parse_player_page(site, content, player_id))
+        except Exception as e:
+            result = ('error', f"{type(e).__name__}: {e}")
+        connection.send((result, current_rss()))
+
+class ParseWorker:
+    """
+    Parses player pages in a separate process that is replaced after a number of pages or once its memory grows past a ceiling, so memory leaked or fragmented by parsing is returned to the OS and peak memory stays flat over a long run.
+
+    :param site: SiteProfile the pages are from
+    :param max_pages: Number of pages after which the worker is replaced, or None for no limit
+    :param max_rss: Resident set size in bytes past which the worker is replaced, or None for no limit
+    """
+    def __init__(self, site, max_pages = 1000, max_rss = None):
+        self.site = site
+        self.max_pages = max_pages
+        self.max_rss = max_rss
+        self.context = multiprocessing.get_context('spawn')
+        self.process = None
+        self.connection = None
+        self.pages = 0
+        self.restarts = 0
+
+    def start(self):
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(target = parse_worker_main, args = (child_connection, self.site.name), daemon = True)
+        self.process.start()
+        child_connection.close()
+        self.pages = 0
+
+    def close(self):
+        if self.process is not None:
+            self.connection.close()
+            self.process.join(5)
+            if self.process.is_alive():
+                self.process.kill()
+            self.process = None
+
+    def parse(self, content, player_id):
+        """
+        Parses a page in the worker process, starting or replacing the process as needed.
+
+        :return: Same as parse_player_page
+        """
+        # If the worker dies, e.g. killed by the OS for running out of memory, the page is tried once more in a fresh one
+        for attempt in range(2):
+            if self.process is None:
+                self.start()
+            try:
+                self.connection.send((content, player_id))
+                (status, value), rss = self.connection.recv()
+                break
+            except (EOFError, OSError):
+                self.close()
+                self.restarts += 1
+        else:
+            raise RuntimeError(f"parse worker exited while parsing player #{player_id}")
+        self.pages += 1
+        if (self.max_pages is not None and self.pages >= self.max_pages) or (self.max_rss is not None and rss > self.max_rss):
+            print(f"Recycling parse worker after {self.pages} pages ({rss} bytes resident).")
+            self.close()
+            self.restarts += 1
+        if status == 'error':
+            raise RuntimeError(value)
+        return value
+
+def crawl_players(player_list_df, queue, budget = None, flush_every = 1, profiler = None, changes = None, site = PFR, parser = None, stream = False):
+    """
+    Scrapes players in priority order until the queue is empty, the budget runs out or a stop is requested.
+
+    :param player_list_df: DataFrame with the player list, indexed by position so that row i-1 is player_id i
+    :param queue: CrawlQueue of player_ids to scrape
+    :param budget: CrawlBudget limiting the run, or None for no limit
+    :param flush_every: Number of scraped players to buffer before writing them out
+    :param profiler: StageProfiler collecting per-stage timings, or None to only time stages
+    :param changes: ChangeLog recording inserted, updated and unchanged rows, or None to compare against nothing
+    :param site: SiteProfile of the site to scrape
+    :param parser: ParseWorker to parse pages in, or None to parse them in this process
+    :param stream: Stop downloading each player page once div#meta and the stats tables have gone by, see PageScanner
+    """
+    budget = budget or CrawlBudget()
+    profiler = profiler or StageProfiler(sample_rate = 0)
+    changes = changes or ChangeLog()
+    rows = []
+    table_rows = []
+    unsaved = 0
+    cut_off_pages = 0
+    skipped_bytes = 0
+    stop_reason = None
+    while len(queue) > 0:
+        if stop_requested.is_set():
+            stop_reason = "stop requested"
+            break
+        stop_reason = budget.exhausted()
+        if stop_reason is not None:
+            break
+
+        i = queue.pop()
+        site.limiter.wait()
+        player_url = site.base_url.format(player_list_df['link'][i-1])
+        print('Scraping {0} player #{1} - {2}'.format(site.name, i, player_list_df['name'][i-1]))
+        sampled = profiler.sample()
+        with profiler.stage('fetch', sampled):
+            response = scrape_page(player_url, scanner = PageScanner(site.stats_tables) if stream else None)
+        budget.charge(response)
+        if getattr(response, 'skipped_bytes', 0) != 0:
+            if cut_off_pages == 0:
+                print("Warning: --stream cut a page off before its end. Any tables after the cut-off are missing from player_table_stats.csv for the players whose pages were cut off.")
+            cut_off_pages += 1
+            skipped_bytes += response.skipped_bytes or 0
+        if response is not None:
+            with profiler.stage('parse', sampled):
+                if parser is not None:
+                    player_stats, player_table_rows = parser.parse(response.content, i)
+                else:
+                    player_stats, player_table_rows = parse_player_page(site, response.content, i)
+            player_stats_dict = {'player_id':i, 
+                                 'name':player_list_df['name'][i-1], 
+                                 'position':player_list_df['position'][i-1],
+                                 'career_begin':player_list_df['career_begin'][i-1], 
+                                 'career_end':player_list_df['career_end'][i-1], 
+                                 'active':player_list_df['active'][i-1]}
+            player_stats_dict.update(player_stats)
+            player_stats_dict['table_hash'] = table_rows_hash(player_table_rows)
+            if changes.tables_changed(player_stats_dict):
+                table_rows.extend(player_table_rows)
+            if changes.record(player_stats_dict):
+                rows.append(player_stats_dict)
+            
+            player_list_df.loc[player_list_df['player_id'] == i, 'scraped'] = True
+            queue.mark_scraped(i)
+            unsaved += 1
+            if unsaved >= flush_every:
+                with profiler.stage('write', sampled):
+                    checkpoint(player_list_df, queue, rows, changes, site, table_rows)
+                unsaved = 0
+            done = player_list_df.shape[0] - len(queue)
+            print('Scraped player. Progress: {0}/{1} ({2}%)'.format(done, player_list_df.shape[0], round(done/(player_list_df.shape[0])*100, 2)))
+            print()
+        elif queue.mark_failed(i):
+            print(f"Failed to scrape page. Player #{i} will be tried again after the rest of the queue.")
+        else:
+            print(f"Failed to scrape page. Giving up on player #{i} after {MAX_SCRAPE_FAILURES} tries until the queue is rebuilt.")
+
+    if stop_reason is not None:
+        print(f"Stopping: {stop_reason}.")
+    if stream:
+        print(f"Streaming cut {cut_off_pages} pages short, leaving {skipped_bytes} bytes unread.")
+    checkpoint(player_list_df, queue, rows, changes, site, table_rows)
+    changes.finish(stop_reason)
+    elapsed = time.monotonic() - budget.start
+    print('Saved {0} progress. {1} players left in queue. Fetched {2} pages ({3} bytes) in {4:.1f}s ({5:.2f} pages/s).'.format(site.name, len(queue), budget.pages, budget.bytes, elapsed, budget.pages / elapsed if elapsed > 0 else 0))
+
+def game_log_url(link, season):
+    """
+    :param link: Link to the player's PFR page from the player list, e.g. /players/M/MahoPa00.htm
+    :param season: Season year
+    :return: URL of the player's game log page for that season
+    """
+    return GAME_LOG_URL.format(link[:-len('.htm')], season)
+
+def parse_cell_value(text):
+    """
+    Converts the text of a table cell to an int or float where possible.
+
+    :param text: Text of the table cell
+    :return: int, float, the stripped string, or None if the cell is empty
+    """
+    text = text.strip()
+    if text == '':
+        return None
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def parse_game_log_page(game_log_page):
+    """
+    Parses the game rows from a player's game log page, reading only the game log tables.
+
+    :param game_log_page: Response object from scraping the game log page
+    :return: List of dictionaries, one per game, keyed by data-stat plus season_type ('reg' or 'post')
+    """
+    strainer = SoupStrainer('table', {'id': lambda table_id: table_id in GAME_LOG_TABLES})
+    soup = BeautifulSoup(game_log_page.content, 'html.parser', parse_only = strainer)
+
+    games = []
+    for table in soup.find_all('table'):
+        season_type = GAME_LOG_TABLES[table['id']]
+        tbody = table.find('tbody')
+        if tbody is None:
+            continue
+        for tr in tbody.find_all('tr', recursive = False):
+            # Repeated header rows inside the table body
+            if 'thead' in tr.get('class', []):
+                continue
+            game = {'season_type': season_type}
+            for cell in tr.find_all(['th', 'td'], recursive = False):
+                stat = cell.get('data-stat')
+                if stat:
+                    game[stat] = parse_cell_value(cell.get_text())
+            games.append(game)
+    soup.decompose()
+    return games
+
+def read_game_log_progress(path):
+    """
+    :param path: Path of the game log progress file
+    :return: Set of (player_id, season) pairs whose game logs have been saved
+    """
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                parts = line.strip().split(',')
+                if len(parts) == 2:
+                    done.add((int(parts[0]), int(parts[1])))
+    return done
+
+def player_seasons(player_list_df, done = frozenset()):
+    """
+    Lists the player-seasons to scrape game logs for, from each player's career_begin and career_end.
+
+    :param player_list_df: DataFrame with the player list
+    :param done: Set of (player_id, season) pairs to skip
+    :return: Generator of (player_id, link, season) tuples
+    """
+    for player_id, link, career_begin, career_end in zip(player_list_df['player_id'], player_list_df['link'], player_list_df['career_begin'], player_list_df['career_end']):
+        for season in range(int(career_begin), int(career_end) + 1):
+            if (int(player_id), season) not in done:
+                yield int(player_id), link, season
+
+def save_game_logs(player_id, season, games, directory = GAME_LOGS_DIR):
+    """
+    Appends a player-season's games to the JSON lines file for that season, then records the player-season as done. A crash between the two writes can leave duplicate games, which readers drop on (player_id, season, season_type, game_num).
+
+    :param player_id: The player's ID
+    :param season: Season year
+    :param games: List of game dictionaries from parse_game_log_page
+    :param directory: Directory of the game log dataset
+    """
+    if len(games) > 0:
+        with open(os.path.join(directory, f'season={season}.jsonl'), 'a') as f:
+            for game_num, game in enumerate(games, start = 1):
+                f.write(json.dumps({'player_id': player_id, 'season': season, 'game_num': game_num, **game}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    with open(os.path.join(directory, GAME_LOG_PROGRESS_FILE), 'a') as f:
+        f.write(f"{player_id},{season}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def crawl_game_logs(player_list_df, budget = None, profiler = None, directory = GAME_LOGS_DIR):
+    """
+    Scrapes the game log page of every player-season, appending the games to a dataset partitioned by season. Player-seasons already saved are skipped, so the crawl resumes where it stopped.
+
+    :param player_list_df: DataFrame with the player list
+    :param budget: CrawlBudget limiting the run, or None for no limit
+    :param profiler: StageProfiler collecting per-stage timings, or None to only time stages
+    :param directory: Directory of the game log dataset
+    """
+    budget = budget or CrawlBudget()
+    profiler = profiler or StageProfiler(sample_rate = 0)
+    os.makedirs(directory, exist_ok = True)
+    done = read_game_log_progress(os.path.join(directory, GAME_LOG_PROGRESS_FILE))
+    saved = 0
+    for player_id, link, season in player_seasons(player_list_df, done):
+        if stop_requested.is_set():
+            print("Stop requested.")
+            break
+        reason = budget.exhausted()
+        if reason is not None:
+            print(f"Stopping: {reason}.")
+            break
+
+        rate_limiter.wait()
+        print(f'Scraping game log for player #{player_id}, {season}')
+        sampled = profiler.sample()
+        with profiler.stage('fetch', sampled):
+            response = scrape_page(game_log_url(link, season), allow_statuses = (404,))
+        budget.charge(response)
+        if response is None:
+            # Timeouts, server errors and exhausted retries are tried again on the next run
+            print("Failed to scrape page.")
+            continue
+        with profiler.stage('parse', sampled):
+            # Seasons a player sat out have no game log page, so they are saved as done with no games
+            games = parse_game_log_page(response) if response.status_code != 404 else []
+        with profiler.stage('write', sampled):
+            save_game_logs(player_id, season, games, directory)
+        saved += 1
+        print(f'Saved {len(games)} games.')
+
+    elapsed = time.monotonic() - budget.start
+    print('Saved {0} player-seasons. Fetched {1} pages ({2} bytes) in {3:.1f}s.'.format(saved, budget.pages, budget.bytes, elapsed))
+
+def reparse_archive(path, site = PFR):
+    """
+    Parses the player pages saved in an archive written by --record again, without fetching anything, and saves the stats the same way a crawl does. Only rows that changed are written, each with a delta record. Used after a parser change, or to fill player_table_stats.csv for players scraped before it existed.
+
+    :param path: Path of the archive
+    :param site: SiteProfile whose player list and stats the pages belong to
+    """
+    player_list_df = pd.read_csv(site.list_path)
+    set_transport(ReplayTransport(path))
+    site.limiter.set_rate(0)
+    repair_player_stats(site.stats_path)
+    repair_player_stats(site.table_stats_path)
+    # A throwaway queue, so the saved crawl queue is left as it was
+    queue = CrawlQueue(os.path.join(os.path.dirname(site.queue_path) or '.', 'reparse_queue.json'))
+    queue.clear()
+    for player_id, link in zip(player_list_df['player_id'], player_list_df['link']):
+        if archive_entry_name(site.base_url.format(link)) in transport.entries:
+            queue.push(player_id, (int(player_id),))
+    print(f"Reparsing {len(queue)} recorded {site.name} players.")
+    add_row_hashes(site.stats_path)
+    changes = ChangeLog(load_player_stats(site.stats_path) if os.path.exists(site.stats_path) else None, site.deltas_dir, site.stats_path)
+    try:
+        crawl_players(player_list_df, queue, changes = changes, site = site)
+    finally:
+        os.remove(queue.path)
+        transport.close()
+
+def run_site(site, args, budget, profiler = None):
+    """
+    Builds the player list if needed, checks the canary players and crawls one site.
+
+    :param site: SiteProfile of the site to crawl
+    :param args: Parsed command line arguments
+    :param budget: CrawlBudget limiting the run, shared by every site crawled at once
+    :param profiler: StageProfiler collecting per-stage timings, or None
+    :return: Exit code, 0 on success, 1 if the player list is incomplete and 2 if the canary check failed
+    """
+    if os.path.exists(site.list_path) == False:
+        if not build_player_list(site):
+            return 1
+
+    player_list_df = pd.read_csv(site.list_path)
+    repair_player_stats(site.stats_path)
+    repair_player_stats(site.table_stats_path)
+
+    if args.canary or not args.skip_canary:
+        canary_players = site.canary_players
+        if args.replay:
+            # A replayed run can only check the canary pages that were recorded
+            canary_players = {link: expected for link, expected in canary_players.items() if archive_entry_name(site.base_url.format(link)) in transport.entries}
+            if len(canary_players) == 0:
+                print(f"No {site.name} canary players in {args.replay}, skipping the page layout check.")
+        if len(canary_players) > 0 and not run_canary(site, canary_players):
+            print(f"Page layout check failed for {site.name}, not crawling. Fix the parser or run with --skip-canary.")
+            return 2
+        if args.canary:
+            return 0
+
+    if args.game_logs:
+        crawl_game_logs(player_list_df, budget, profiler)
+        return 0
+    queue = CrawlQueue(site.queue_path)
+    if args.discover:
+        # Sitemaps unchanged since the least recently scraped player cannot list a page that changed after its player was scraped
+        changed = discover_changed_links(site, discovery_since(queue, player_list_df), budget)
+        player_list_df = add_discovered_players(player_list_df, changed.keys(), site)
+        build_discovery_queue(queue, player_list_df, changed, time.time() - args.discover_age)
+        print(f"Discovered {len(changed)} recently changed {site.name} players, {len(queue)} in the queue.")
+    elif len(queue) == 0 or args.refresh or args.rebuild_queue or site.name in args.priority_files:
+        priority_ids = read_priority_file(args.priority_files[site.name], player_list_df) if site.name in args.priority_files else frozenset()
+        build_crawl_queue(queue, player_list_df, refresh = args.refresh, priority_ids = priority_ids)
+    add_row_hashes(site.stats_path)
+    changes = ChangeLog(load_player_stats(site.stats_path) if os.path.exists(site.stats_path) else None, site.deltas_dir, site.stats_path)
+    parser = ParseWorker(site, args.recycle_after, args.max_parser_rss) if args.recycle_after or args.max_parser_rss else None
+    try:
+        crawl_players(player_list_df, queue, budget, flush_every = args.flush_every, profiler = profiler, changes = changes, site = site, parser = parser, stream = args.stream)
+    finally:
+        if parser is not None:
+            parser.close()
+    return 0
+
+def parse_sites(text):
+    names = [name.strip() for name in text.split(',') if name.strip()]
+    unknown = [name for name in names if name not in SITES]
+    if len(names) == 0 or len(unknown) > 0:
+        raise argparse.ArgumentTypeError(f"unknown site in {text!r}, choose from {', '.join(SITES)}")
+    return [SITES[name] for name in dict.fromkeys(names)]
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = 'Scrapes career statistics for every player on pro-football-reference.com and other Sports-Reference sites.')
+    parser.add_argument('--sites', type = parse_sites, default = [PFR], help = f"Comma-separated sites to crawl at once, each with its own rate limit: {', '.join(SITES)} (default pfr)")
+    parser.add_argument('--refresh', action = 'store_true', help = 'Scrape every player again, including ones already scraped')
+    parser.add_argument('--discover', action = 'store_true', help = "Scrape only players whose pages changed, found from the site's sitemaps and current season pages")
+    parser.add_argument('--discover-age', type = parse_duration, default = 86400, help = 'With --discover, rescrape players on current season pages last scraped longer ago than this (default 1d)')
+    parser.add_argument('--priority-file', action = 'append', default = [], metavar = '[SITE=]FILE', help = "File of player_ids or player links to scrape first, one per line. player_ids and links differ between sites, so with several --sites give one per site, e.g. pfr=pfr.txt. Can be repeated.")
+    parser.add_argument('--rebuild-queue', action = 'store_true', help = 'Discard the saved crawl queue and rebuild it from the player list')
+    parser.add_argument('--canary', action = 'store_true', help = 'Only check a few known players for page layout changes, then exit')
+    parser.add_argument('--skip-canary', action = 'store_true', help = 'Start crawling without checking known players for page layout changes first')
+    parser.add_argument('--game-logs', action = 'store_true', help = 'Scrape per-game stats from every player-season game log page instead of career stats (pfr only)')
+    parser.add_argument('--max-duration', type = parse_duration, help = 'Stop scheduling new pages after this long, e.g. 45m or 8h')
+    parser.add_argument('--max-pages', type = int, help = 'Stop after fetching this many pages')
+    parser.add_argument('--max-bytes', type = parse_size, help = 'Stop after downloading this many bytes, e.g. 500M')
+    parser.add_argument('--flush-every', type = int, default = 1, help = 'Number of players to buffer before saving progress')
+    parser.add_argument('--stream', action = 'store_true', help = 'Stop downloading each player page once the player information and stats tables have gone by, which on most pages is at the navigation below them')
+    parser.add_argument('--recycle-after', type = int, help = 'Parse pages in a separate worker process, replaced after this many pages')
+    parser.add_argument('--max-parser-rss', type = parse_size, help = 'Parse pages in a separate worker process, replaced once its memory passes this size, e.g. 300M')
+    parser.add_argument('--rate', type = float, help = f'Maximum pages per minute for each site, 0 for no limit (default {SCRAPING_RATE}, the egress config\'s host_rate with --egress, or no limit with --replay)')
+    parser.add_argument('--egress', metavar = 'CONFIG', help = 'Spread requests over the proxies or local addresses in this JSON file, each with its own rate limit')
+    parser.add_argument('--record', metavar = 'ARCHIVE', help = 'Save every fetched page to this archive directory')
+    parser.add_argument('--replay', metavar = 'ARCHIVE', help = 'Serve pages from this archive directory, or a zip archive from an earlier version, instead of the network')
+    parser.add_argument('--replay-latency', type = float, default = 0, help = 'Seconds of simulated latency per replayed page')
+    parser.add_argument('--replay-jitter', type = float, default = 0, help = 'Maximum seconds of random jitter added to the replay latency')
+    parser.add_argument('--profile', metavar = 'DIR', help = 'Profile the fetch, parse and write stages and save the results to this directory')
+    parser.add_argument('--profile-sample', type = float, default = 1.0, help = 'Fraction of pages to profile in detail with --profile (default 1.0)')
+    args = parser.parse_args(argv)
+    if args.game_logs and args.sites != [PFR]:
+        parser.error('--game-logs only works with --sites pfr')
+    if args.profile and len(args.sites) > 1:
+        parser.error('--profile only works with a single site')
+    if args.egress and args.replay:
+        parser.error('--egress and --replay cannot be used together')
+    args.priority_files = {}
+    for entry in args.priority_file:
+        name, separator, path = entry.partition('=')
+        if separator and name in SITES:
+            if SITES[name] not in args.sites:
+                parser.error(f'--priority-file {entry} is for {name}, which is not in --sites')
+        elif len(args.sites) == 1:
+            name, path = args.sites[0].name, entry
+        else:
+            parser.error(f'--priority-file {entry} does not say which site it is for, use SITE=FILE with several --sites')
+        if name in args.priority_files:
+            parser.error(f'more than one --priority-file for {name}')
+        args.priority_files[name] = path
+    if args.record and os.path.exists(args.record) and not os.path.isdir(args.record):
+        parser.error(f'--record needs a directory, {args.record} is a file')
+    return args
+
+def main(argv = None):
+    """
+    Runs a crawl with the command line arguments described in parse_args.
+
+    :param argv: Command line arguments, or None to use sys.argv
+    """
+    args = parse_args(argv)
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    budget = CrawlBudget(args.max_duration, args.max_pages, args.max_bytes)
+    pool = None
+    if args.replay:
+        set_transport(ReplayTransport(args.replay, args.replay_latency, args.replay_jitter))
+    elif args.egress:
+        pool = load_egress_pool(args.egress)
+        pool.budget = budget
+        set_transport(RecordingTransport(args.record, pool) if args.record else pool)
+    elif args.record:
+        set_transport(RecordingTransport(args.record))
+    for site in args.sites:
+        if args.rate is not None:
+            site.limiter.set_rate(args.rate)
+        elif args.replay:
+            site.limiter.set_rate(0)
+        elif pool is not None:
+            # The routes' own limits spread the requests, and the site limiter still caps the total each host sees
+            site.limiter.set_rate(pool.host_rate)
+
+    profiler = StageProfiler(args.profile_sample) if args.profile else None
+    try:
+        if len(args.sites) == 1:
+            exit_code = run_site(args.sites[0], args, budget, profiler)
+        else:
+            # Each site is on its own host with its own rate limit, so they are crawled side by side
+            exit_codes = {}
+            threads = [threading.Thread(target = lambda site: exit_codes.update({site.name: run_site(site, args, budget)}), args = (site,), name = site.name) for site in args.sites]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                # Join with a timeout so the main thread keeps handling signals
+                while thread.is_alive():
+                    thread.join(1)
+            exit_code = max(exit_codes.get(site.name, 1) for site in args.sites)
+        if pool is not None:
+            print(pool.summary())
+        if exit_code != 0:
+            raise SystemExit(exit_code)
+    finally:
+        transport.close()
+        # Saved even when the run fails or is interrupted, since those are often the runs worth profiling
+        if profiler is not None:
+            profiler.dump(args.profile)
+            print(profiler.report())
+
+if __name__ == '__main__':
+    main()
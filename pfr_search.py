@@ -0,0 +1,250 @@
+import os
+import csv
+import heapq
+import pickle
+import bisect
+import argparse
+import unicodedata
+import numpy as np
+
+# As in pfr_scraper.py, which is not imported so that searching does not wait for pandas and BeautifulSoup to load
+PLAYER_LIST_PATH = 'data/player_list.csv'
+NAME_INDEX_PATH = 'data/name_index.pkl'
+# Saved indexes of another version are rebuilt
+NAME_INDEX_VERSION = 2
+
+# Match types, best first
+EXACT, NAME_PREFIX, TOKEN_PREFIX, FUZZY = range(4)
+
+# Queries up to this length are only matched as prefixes, since they are too short to match fuzzily
+SHORT_PREFIX_LENGTH = 3
+
+def normalize_name(name):
+    """
+    Normalizes a name for searching: accents removed, lowercase, punctuation dropped and whitespace collapsed.
+
+    :param name: Player name or search query
+    :return: Normalized name, e.g. "D'Andre Swift" becomes "dandre swift"
+    """
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    name = ''.join(c if c.isalnum() or c.isspace() else '' for c in name)
+    return ' '.join(name.split())
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """
+    Search index over player names supporting type-ahead prefix lookups and fuzzy matching.
+
+    Prefix lookups use a sorted list of keys searched with bisect, which acts as a compact prefix trie: every player has one key for their full normalized name and one for each later token, so "will" finds "Mike Williams". Fuzzy lookups use an inverted index of name trigrams. The players matching a prefix or sharing trigrams with a query are NumPy arrays, so filters and ranking are applied to all of them at once instead of one player at a time.
+
+    :param players: List of dictionaries with player_id, link, name, position, career_begin, career_end and active
+    :param source_mtime: Modification time of the player list the index was built from
+    """
+    def __init__(self, players, source_mtime = None):
+        self.version = NAME_INDEX_VERSION
+        self.players = players
+        self.source_mtime = source_mtime
+        self.active = np.array([player['active'] for player in players], dtype = bool)
+        self.career_begin = np.array([player['career_begin'] for player in players], dtype = np.int32)
+        self.career_end = np.array([player['career_end'] for player in players], dtype = np.int32)
+        # Order used to break ties, as a number per player: active players, then most recent careers
+        _, self.rank = np.unique(np.stack([~self.active, -self.career_end], axis = 1), axis = 0, return_inverse = True)
+        self.rank = self.rank.reshape(-1).astype(np.int64)
+        self.rank_count = int(self.rank.max()) + 1 if len(players) > 0 else 1
+        position_players = {}
+        for pos, player in enumerate(players):
+            for position in player['position'].split('-'):
+                position_players.setdefault(position.upper(), []).append(pos)
+        self.position_players = {position: np.array(positions, dtype = np.int32) for position, positions in position_players.items()}
+
+        self.names = [normalize_name(player['name']) for player in players]
+        entries = []
+        trigram_index = {}
+        for pos, name in enumerate(self.names):
+            tokens = name.split(' ')
+            entries.append((name, pos))
+            for i in range(1, len(tokens)):
+                entries.append((' '.join(tokens[i:]), pos))
+            for trigram in trigrams(name):
+                trigram_index.setdefault(trigram, []).append(pos)
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.key_players = np.array([pos for _, pos in entries], dtype = np.int32)
+        self.key_is_name = np.array([key == self.names[pos] for key, pos in entries], dtype = bool)
+        self.max_keys = max((len(name.split(' ')) for name in self.names), default = 1)
+        self.trigram_index = {trigram: np.array(positions, dtype = np.int32) for trigram, positions in trigram_index.items()}
+        self.trigram_counts = np.array([len(trigrams(name)) for name in self.names], dtype = np.int32)
+
+    @classmethod
+    def build(cls, path = PLAYER_LIST_PATH):
+        """
+        Builds the index from the player list CSV.
+
+        :param path: Path to the player list CSV
+        :return: NameIndex
+        """
+        players = []
+        with open(path, newline = '') as f:
+            for row in csv.DictReader(f):
+                players.append({
+                    'player_id': int(row['player_id']),
+                    'link': row['link'],
+                    'name': row['name'],
+                    'position': row['position'],
+                    'career_begin': int(row['career_begin']),
+                    'career_end': int(row['career_end']),
+                    'active': row['active'] == 'True'
+                })
+        return cls(players, os.path.getmtime(path))
+
+    def save(self, path = NAME_INDEX_PATH):
+        # The attributes are pickled rather than the object, so the file loads whether it was written by this module or by running it as a script
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self.__dict__, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path = NAME_INDEX_PATH):
+        index = cls.__new__(cls)
+        with open(path, 'rb') as f:
+            index.__dict__.update(pickle.load(f))
+        return index
+
+    def filter_mask(self, position = None, active = None, career_from = None, career_to = None):
+        """
+        :return: Boolean array telling which players pass the filters, or None if there are no filters
+        """
+        if (position, active, career_from, career_to) == (None, None, None, None):
+            return None
+        allowed = np.ones(len(self.players), dtype = bool)
+        if position is not None:
+            allowed[:] = False
+            allowed[self.position_players.get(position.upper(), np.zeros(0, dtype = np.int32))] = True
+        if active is not None:
+            allowed &= self.active == active
+        if career_from is not None:
+            allowed &= self.career_end >= career_from
+        if career_to is not None:
+            allowed &= self.career_begin <= career_to
+        return allowed
+
+    def search(self, query, limit = 10, position = None, active = None, career_from = None, career_to = None):
+        """
+        Finds players whose names match the query, best matches first: exact names, then names starting with the query, then names with a later word starting with the query, then fuzzy matches. Ties go to active players and then to the most recent careers.
+
+        :param query: Full or partial player name
+        :param limit: Maximum number of players to return
+        :param position: Only players who have played this position, e.g. WR
+        :param active: Only active (True) or retired (False) players
+        :param career_from: Only players whose careers ended in or after this year
+        :param career_to: Only players whose careers began in or before this year
+        :return: List of player dictionaries, each with a 'match' score where lower is better
+        """
+        query = normalize_name(query)
+        if query == '':
+            return []
+        allowed = self.filter_mask(position, active, career_from, career_to)
+        top = self.prefix_matches(query, limit, allowed)
+        if len(top) < limit and len(query) > SHORT_PREFIX_LENGTH:
+            found = {pos for pos, _ in top}
+            fuzzy = self.fuzzy_matches(query, allowed)
+            top += heapq.nsmallest(limit - len(top), ((pos, match) for pos, match in fuzzy if pos not in found), key = self.sort_key)
+        return [dict(self.players[pos], match = round(match, 3)) for pos, match in top]
+
+    def sort_key(self, item):
+        pos, match = item
+        return (match, self.rank[pos])
+
+    def prefix_matches(self, query, limit, allowed = None):
+        """
+        :param allowed: Boolean array from filter_mask, or None
+        :return: Up to limit (position, match type) pairs for names with the query as a prefix of the name or of a later word, best first
+        """
+        start = bisect.bisect_left(self.keys, query)
+        end = bisect.bisect_left(self.keys, query + '\uffff')
+        exact_end = bisect.bisect_right(self.keys, query)
+        players = self.key_players[start:end]
+        key_positions = np.arange(start, end)
+        matches = np.where(self.key_is_name[start:end], NAME_PREFIX, TOKEN_PREFIX)
+        matches[:exact_end - start][self.key_is_name[start:exact_end]] = EXACT
+        if allowed is not None:
+            keep = allowed[players]
+            players = players[keep]
+            key_positions = key_positions[keep]
+            matches = matches[keep]
+        # Match type, then tie-break rank, then alphabetical order of the matching key, as one number
+        scores = (matches * self.rank_count + self.rank[players]) * len(self.keys) + key_positions
+        # A player has at most max_keys keys, so the best limit * max_keys keys include the best limit players
+        candidates = limit * self.max_keys
+        if len(scores) > candidates:
+            chosen = np.argpartition(scores, candidates)[:candidates]
+            players = players[chosen]
+            scores = scores[chosen]
+        order = np.argsort(scores)
+        best = {}
+        for pos, score in zip(players[order].tolist(), scores[order].tolist()):
+            if pos not in best:
+                best[pos] = score // (self.rank_count * len(self.keys))
+                if len(best) == limit:
+                    break
+        return list(best.items())
+
+    def fuzzy_matches(self, query, allowed = None):
+        """
+        :param allowed: Boolean array from filter_mask, or None
+        :return: List of (position, score) pairs for names sharing at least half their trigrams with the query, scored between FUZZY and FUZZY + 0.5
+        """
+        query_trigrams = trigrams(query)
+        postings = [self.trigram_index[trigram] for trigram in query_trigrams if trigram in self.trigram_index]
+        if len(postings) == 0:
+            return []
+        common = np.bincount(np.concatenate(postings), minlength = len(self.players))
+        # A similarity of 0.5 needs at least a third of the query's trigrams in common
+        candidates = np.flatnonzero(common >= len(query_trigrams) / 3)
+        similarity = 2 * common[candidates] / (len(query_trigrams) + self.trigram_counts[candidates])
+        keep = similarity >= 0.5
+        if allowed is not None:
+            keep &= allowed[candidates]
+        return list(zip(candidates[keep].tolist(), (FUZZY + 1 - similarity[keep]).tolist()))
+
+name_index = None
+
+def get_name_index(path = NAME_INDEX_PATH, list_path = PLAYER_LIST_PATH):
+    """
+    Loads the name index on first use, rebuilding and saving it if it is missing or older than the player list.
+
+    :param path: Path of the saved index
+    :param list_path: Path to the player list CSV
+    :return: NameIndex
+    """
+    global name_index
+    if name_index is None:
+        if os.path.exists(path):
+            name_index = NameIndex.load(path)
+        if name_index is None or getattr(name_index, 'version', None) != NAME_INDEX_VERSION or name_index.source_mtime != os.path.getmtime(list_path):
+            name_index = NameIndex.build(list_path)
+            name_index.save(path)
+    return name_index
+
+def search_players(query, **kwargs):
+    """
+    Searches player names with the lazily loaded index. See NameIndex.search for the arguments.
+    """
+    return get_name_index().search(query, **kwargs)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Searches player names.')
+    parser.add_argument('query', help = 'Full or partial player name')
+    parser.add_argument('--limit', type = int, default = 10, help = 'Maximum number of players to return')
+    parser.add_argument('--position', help = 'Only players who have played this position')
+    parser.add_argument('--active', action = 'store_true', default = None, help = 'Only active players')
+    parser.add_argument('--from', dest = 'career_from', type = int, help = 'Only players whose careers ended in or after this year')
+    parser.add_argument('--to', dest = 'career_to', type = int, help = 'Only players whose careers began in or before this year')
+    args = parser.parse_args()
+    for player in search_players(args.query, limit = args.limit, position = args.position, active = args.active, career_from = args.career_from, career_to = args.career_to):
+        print('{player_id:>6}  {name:<30} {position:<10} {career_begin}-{career_end}  {link}'.format(**player))
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+import numpy as np
+import pandas as pd
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pfr_scraper import PLAYER_LIST_PATH, PLAYER_STATS_PATH, load_player_stats, to_json_value
+
+class PlayerStore:
+    """
+    Read-only, indexed in-memory copy of the player list joined with the player stats.
+
+    :param list_path: Path to the player list CSV
+    :param stats_path: Path to the player stats CSV
+    :param cache_size: Number of query results to keep in the LRU cache
+    """
+    def __init__(self, list_path = PLAYER_LIST_PATH, stats_path = PLAYER_STATS_PATH, cache_size = 1024):
+        self.list_path = list_path
+        self.stats_path = stats_path
+        self.mtimes = self.file_mtimes()
+        self.loaded_at = time.time()
+
+        player_list_df = pd.read_csv(list_path)
+        if os.path.exists(stats_path):
+            player_stats_df = load_player_stats(stats_path)
+            stats_columns = ['player_id'] + [column for column in player_stats_df.columns if column not in player_list_df.columns]
+            player_list_df = player_list_df.merge(player_stats_df[stats_columns], on = 'player_id', how = 'left')
+        self.df = player_list_df.reset_index(drop = True)
+        self.columns = list(self.df.columns)
+
+        # Indexes from each lookup key to row positions in self.df
+        self.by_id = {int(player_id): pos for pos, player_id in enumerate(self.df['player_id'])}
+        self.by_link = {link: pos for pos, link in enumerate(self.df['link'])}
+        self.by_name = {}
+        for pos, name in enumerate(self.df['name']):
+            self.by_name.setdefault(str(name).lower(), []).append(pos)
+        self.by_position = {}
+        for pos, position in enumerate(self.df['position']):
+            for single_position in str(position).split('-'):
+                self.by_position.setdefault(single_position.upper(), []).append(pos)
+        self.career_begin = self.df['career_begin'].to_numpy()
+        self.career_end = self.df['career_end'].to_numpy()
+        self.active = self.df['active'].to_numpy(dtype = bool)
+
+        self.query = functools.lru_cache(maxsize = cache_size)(self.run_query)
+
+    def file_mtimes(self):
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in (self.list_path, self.stats_path))
+
+    def is_stale(self):
+        """
+        :return: True if either CSV has changed since the store was loaded
+        """
+        return self.file_mtimes() != self.mtimes
+
+    def record(self, pos):
+        return {column: to_json_value(value) for column, value in zip(self.columns, self.df.iloc[pos].tolist())}
+
+    def run_query(self, player_id = None, link = None, name = None, position = None, career_from = None, career_to = None, active = None, limit = 100):
+        """
+        Finds players matching every given filter. Call through self.query, which caches the results.
+
+        :param player_id: The player's ID
+        :param link: The player's PFR link, e.g. /players/M/MahoPa00.htm
+        :param name: The player's full name, case insensitive
+        :param position: A single position, e.g. QB, matched against each part of hyphenated positions
+        :param career_from: Only players whose careers ended in or after this year
+        :param career_to: Only players whose careers began in or before this year
+        :param active: Only active (True) or retired (False) players
+        :param limit: Maximum number of players to return
+        :return: JSON-encoded list of player records as bytes
+        """
+        mask = np.ones(self.df.shape[0], dtype = bool)
+        lookups = (
+            (self.by_id, player_id),
+            (self.by_link, link),
+            (self.by_name, name.lower() if name is not None else None),
+            (self.by_position, position.upper() if position is not None else None)
+        )
+        for index, key in lookups:
+            if key is not None:
+                matches = np.zeros(self.df.shape[0], dtype = bool)
+                matches[index.get(key, [])] = True
+                mask &= matches
+        if career_from is not None:
+            mask &= self.career_end >= career_from
+        if career_to is not None:
+            mask &= self.career_begin <= career_to
+        if active is not None:
+            mask &= self.active == active
+        positions = np.flatnonzero(mask)[:limit]
+        return json.dumps([self.record(pos) for pos in positions]).encode()
+
+class PlayerStoreHolder:
+    """
+    Holds the current PlayerStore and swaps in a freshly loaded one when the CSVs change on disk.
+
+    :param reload_interval: Seconds between checks for new data
+    :param store_args: Arguments passed to PlayerStore
+    """
+    def __init__(self, reload_interval = 5, **store_args):
+        self.store_args = store_args
+        self.store = PlayerStore(**store_args)
+        self.reload_interval = reload_interval
+        self.thread = threading.Thread(target = self.watch, daemon = True)
+        self.thread.start()
+
+    def watch(self):
+        while True:
+            time.sleep(self.reload_interval)
+            if not self.store.is_stale():
+                continue
+            try:
+                store = PlayerStore(**self.store_args)
+            except Exception as e:
+                # The crawl may be mid-write; try again on the next check
+                print(f"Failed to reload data: {e}")
+                continue
+            self.store = store
+            print(f"Reloaded {store.df.shape[0]} players.")
+
+def parse_bool(text):
+    return text.lower() in ('1', 'true', 'yes')
+
+# Query string parameters and how to convert them
+QUERY_PARAMS = {
+    'player_id': int,
+    'link': str,
+    'name': str,
+    'position': str,
+    'from': int,
+    'to': int,
+    'active': parse_bool,
+    'limit': int
+}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    Answers GET /players?<filters>, GET /players/<player_id> and GET /health.
+    """
+    holder = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        store = self.holder.store
+        parts = [part for part in url.path.split('/') if part]
+        try:
+            if parts == ['health']:
+                body = json.dumps({'players': store.df.shape[0], 'loaded_at': store.loaded_at, 'cache': store.query.cache_info()._asdict()}).encode()
+            elif len(parts) == 2 and parts[0] == 'players':
+                body = store.query(player_id = int(parts[1]))
+                if body == b'[]':
+                    return self.send_json(404, b'{"error": "player not found"}')
+                body = body[1:-1]
+            elif parts == ['players']:
+                params = {key: QUERY_PARAMS[key](values[-1]) for key, values in parse_qs(url.query).items() if key in QUERY_PARAMS}
+                params['career_from'] = params.pop('from', None)
+                params['career_to'] = params.pop('to', None)
+                body = store.query(**params)
+            else:
+                return self.send_json(404, b'{"error": "not found"}')
+        except ValueError as e:
+            return self.send_json(400, json.dumps({'error': str(e)}).encode())
+        self.send_json(200, body)
+
+    def send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host = '127.0.0.1', port = 8000, reload_interval = 5, cache_size = 1024):
+    """
+    Runs the query service until interrupted.
+
+    :param host: Address to listen on
+    :param port: Port to listen on
+    :param reload_interval: Seconds between checks for new data
+    :param cache_size: Number of query results to keep in the LRU cache
+    """
+    QueryHandler.holder = PlayerStoreHolder(reload_interval, cache_size = cache_size)
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f"Serving {QueryHandler.holder.store.df.shape[0]} players on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Serves read-only queries over the scraped player list and stats.')
+    parser.add_argument('--host', default = '127.0.0.1', help = 'Address to listen on')
+    parser.add_argument('--port', type = int, default = 8000, help = 'Port to listen on')
+    parser.add_argument('--reload-interval', type = float, default = 5, help = 'Seconds between checks for new data')
+    parser.add_argument('--cache-size', type = int, default = 1024, help = 'Number of query results to cache')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.reload_interval, args.cache_size)
@@ -0,0 +1,194 @@
+import argparse
+import numpy as np
+
+from pfr_scraper import PLAYER_STATS_PATH, DELTAS_DIR, PASSING_STATS, RUSHING_AND_RECEIVING_STATS, DEFENSE_STATS, RETURNS_STATS
+from pfr_deltas import DeltaIndex, stat_columns, player_partition, to_float
+
+SIMILARITY_INDEX_PATH = 'data/similarity_index.pkl'
+
+# Stats of each kind, without the _reg and _post suffixes. Games played count towards every kind and keep a weight of 1.
+STAT_KINDS = {
+    'passing': set(PASSING_STATS) - {'games', 'games_started'},
+    'rushing': {stat for stat in RUSHING_AND_RECEIVING_STATS if stat.startswith('rush_') and stat != 'rush_receive_td'},
+    'receiving': {stat for stat in RUSHING_AND_RECEIVING_STATS if not stat.startswith('rush_')} - {'games', 'games_started'},
+    'defense': set(DEFENSE_STATS) - {'games', 'games_started'},
+    'returns': set(RETURNS_STATS) - {'games', 'games_started'},
+}
+# How much each kind of stat counts when comparing players of a position group. Kinds not listed have a weight of 1.
+POSITION_WEIGHTS = {
+    'QB': {'passing': 3.0, 'rushing': 1.5},
+    'RB': {'rushing': 3.0, 'receiving': 1.5, 'returns': 1.5},
+    'FB': {'rushing': 2.0, 'receiving': 2.0},
+    'WR': {'receiving': 3.0, 'returns': 1.5},
+    'TE': {'receiving': 3.0},
+    'DE': {'defense': 3.0}, 'DT': {'defense': 3.0}, 'NT': {'defense': 3.0}, 'DL': {'defense': 3.0},
+    'LB': {'defense': 3.0}, 'OLB': {'defense': 3.0}, 'ILB': {'defense': 3.0}, 'MLB': {'defense': 3.0},
+    'CB': {'defense': 3.0, 'returns': 1.5}, 'DB': {'defense': 3.0, 'returns': 1.5},
+    'S': {'defense': 3.0, 'returns': 1.5}, 'FS': {'defense': 3.0, 'returns': 1.5}, 'SS': {'defense': 3.0, 'returns': 1.5},
+    'KR': {'returns': 3.0}, 'PR': {'returns': 3.0},
+}
+
+def stat_kind(column):
+    stem = column.rsplit('_', 1)[0] if column.endswith(('_reg', '_post')) else column
+    for kind, stats in STAT_KINDS.items():
+        if stem in stats:
+            return kind
+    return None
+
+class SimilarityIndex(DeltaIndex):
+    """
+    Normalized, position-weighted career stat vectors of every player, for finding the players whose careers most resemble a given player's.
+
+    Each numeric stats column is put on a log scale (most stats are counts with a long tail) and standardized, then scaled by the weight of the stat's kind for the player's position group, so a quarterback is compared mostly on passing. The vectors are kept as one contiguous float32 matrix with their squared norms, so a batch of queries is one matrix product. The scaling is fixed when the index is built; updated and new players are scaled the same way until the next rebuild.
+
+    :param df: DataFrame from load_player_stats
+    :param delta_offsets: Dictionary from delta file name to the number of bytes of it already reflected in df
+    """
+    default_path = SIMILARITY_INDEX_PATH
+
+    def __init__(self, df, delta_offsets = None):
+        super().__init__(delta_offsets)
+        self.columns = stat_columns(df)
+        self.column_positions = {column: position for position, column in enumerate(self.columns)}
+        kinds = [stat_kind(column) for column in self.columns]
+        self.weights = {group: np.array([weights.get(kind, 1.0) for kind in kinds], dtype = np.float32) for group, weights in POSITION_WEIGHTS.items()}
+        self.default_weights = np.ones(len(self.columns), dtype = np.float32)
+
+        count = df.shape[0]
+        self.player_ids = df['player_id'].to_numpy(dtype = np.int64).copy()
+        self.rows = {int(player_id): row for row, player_id in enumerate(self.player_ids)}
+        self.groups = [player_partition(position, career_begin)[0] for position, career_begin in zip(df['position'], df['career_begin'])]
+        self.raw = np.nan_to_num(df[self.columns].to_numpy(dtype = np.float32)) if count > 0 else np.zeros((0, len(self.columns)), dtype = np.float32)
+        scaled = self.scale(self.raw)
+        self.mean = scaled.mean(axis = 0) if count > 0 else np.zeros(len(self.columns), dtype = np.float32)
+        std = scaled.std(axis = 0) if count > 0 else np.ones(len(self.columns), dtype = np.float32)
+        self.std = np.where(std > 0, std, 1).astype(np.float32)
+        self.vectors = np.ascontiguousarray((scaled - self.mean) / self.std * self.row_weights(self.groups), dtype = np.float32)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.count = count
+
+    @staticmethod
+    def scale(values):
+        return np.sign(values) * np.log1p(np.abs(values))
+
+    def row_weights(self, groups):
+        return np.stack([self.weights.get(group, self.default_weights) for group in groups]) if len(groups) > 0 else np.zeros((0, len(self.columns)), dtype = np.float32)
+
+    def save(self, path = SIMILARITY_INDEX_PATH):
+        self.compact()
+        super().save(path)
+
+    def compact(self):
+        """
+        Drops the spare capacity left by adding players.
+        """
+        for name in ('player_ids', 'raw', 'vectors', 'norms'):
+            setattr(self, name, np.ascontiguousarray(getattr(self, name)[:self.count]))
+
+    def add_row(self, player_id, group):
+        if self.count == len(self.player_ids):
+            # Grow by half so that adding players one at a time is amortized constant time
+            capacity = max(16, self.count + self.count // 2)
+            for name in ('player_ids', 'raw', 'vectors', 'norms'):
+                array = getattr(self, name)
+                grown = np.zeros((capacity,) + array.shape[1:], dtype = array.dtype)
+                grown[:self.count] = array[:self.count]
+                setattr(self, name, grown)
+        row = self.count
+        self.player_ids[row] = player_id
+        self.raw[row] = 0
+        self.rows[player_id] = row
+        self.groups.append(group)
+        self.count += 1
+        return row
+
+    def set_player(self, player_id, changes):
+        """
+        Updates one player's vector, or adds the player if they are new.
+
+        :param player_id: The player's ID
+        :param changes: Dictionary from column to new value, including position and career_begin if they are new or changed. Other columns that are not in the index are ignored.
+        """
+        position = changes.get('position')
+        career_begin = changes.get('career_begin')
+        row = self.rows.get(player_id)
+        if row is None:
+            if position is None or career_begin is None:
+                return
+            row = self.add_row(player_id, player_partition(position, career_begin)[0])
+        elif position is not None:
+            self.groups[row] = player_partition(position, career_begin if career_begin is not None else 0)[0]
+        for column, value in changes.items():
+            position_in_vector = self.column_positions.get(column)
+            if position_in_vector is not None:
+                value = to_float(value)
+                self.raw[row, position_in_vector] = 0 if np.isnan(value) else value
+        self.vectors[row] = (self.scale(self.raw[row]) - self.mean) / self.std * self.weights.get(self.groups[row], self.default_weights)
+        self.norms[row] = self.vectors[row] @ self.vectors[row]
+
+    def similar(self, player_ids, k = 10, same_position = False):
+        """
+        Finds the k players nearest to each of the given players by Euclidean distance between their vectors. All the queries are answered with one matrix product over the whole index.
+
+        :param player_ids: The players to find similar players for
+        :param k: Number of similar players to return for each player
+        :param same_position: Only return players in the same position group as the player, which also narrows the search to that group
+        :return: List with a list of (player_id, distance) pairs, nearest first, for each player, or None for players not in the index
+        """
+        rows = [self.rows.get(player_id) for player_id in player_ids]
+        query_rows = np.array([row for row in rows if row is not None], dtype = np.int64)
+        vectors = self.vectors[:self.count]
+        norms = self.norms[:self.count]
+        groups = np.array(self.groups) if same_position else None
+        results = {}
+        # Queries are answered in batches so the distance matrix stays small
+        for start in range(0, len(query_rows), 256):
+            batch = query_rows[start:start + 256]
+            if same_position:
+                distances = np.full((len(batch), self.count), np.inf, dtype = np.float32)
+                for group in set(groups[batch]):
+                    members = np.flatnonzero(groups == group)
+                    in_group = np.flatnonzero(groups[batch] == group)
+                    distances[np.ix_(in_group, members)] = norms[batch[in_group], None] + norms[members] - 2 * vectors[batch[in_group]] @ vectors[members].T
+            else:
+                distances = norms[batch, None] + norms - 2 * vectors[batch] @ vectors.T
+            distances[np.arange(len(batch)), batch] = np.inf
+            n = min(k, self.count - 1)
+            if n <= 0:
+                for row in batch:
+                    results[int(row)] = []
+                continue
+            nearest = np.argpartition(distances, n - 1, axis = 1)[:, :n]
+            for query, row in enumerate(batch):
+                order = nearest[query][np.argsort(distances[query, nearest[query]])]
+                results[int(row)] = [(int(self.player_ids[other]), float(np.sqrt(max(distances[query, other], 0)))) for other in order if np.isfinite(distances[query, other])]
+        return [results[row] if row is not None else None for row in rows]
+
+def get_similarity_index(path = SIMILARITY_INDEX_PATH, stats_path = PLAYER_STATS_PATH, deltas_dir = DELTAS_DIR):
+    """
+    Loads the similarity index on first use, building it if it is missing, and applies any new run deltas, saving the index if they changed it.
+
+    :param path: Path of the saved index
+    :param stats_path: Path to the player stats CSV
+    :param deltas_dir: Directory of the run delta files
+    :return: SimilarityIndex
+    """
+    return SimilarityIndex.get(path, stats_path, deltas_dir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Finds the players whose career stats most resemble a given player.')
+    parser.add_argument('player_ids', nargs = '+', type = int, help = 'Players to find similar players for')
+    parser.add_argument('-k', type = int, default = 10, help = 'Number of similar players to print for each player')
+    parser.add_argument('--same-position', action = 'store_true', help = "Only players in the same position group as the player")
+    parser.add_argument('--rebuild', action = 'store_true', help = 'Rebuild the index from the stats CSV first, which also refreshes the scaling')
+    args = parser.parse_args()
+    if args.rebuild:
+        SimilarityIndex.build().save()
+    index = get_similarity_index()
+    for player_id, similar in zip(args.player_ids, index.similar(args.player_ids, args.k, args.same_position)):
+        print(f"Player {player_id}:")
+        if similar is None:
+            print("  Not in the index.")
+            continue
+        for rank, (other_id, distance) in enumerate(similar, start = 1):
+            print(f"  {rank:>3}. {other_id:>6}  {distance:.3f}")
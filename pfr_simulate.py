@@ -0,0 +1,222 @@
+import heapq
+import random
+import argparse
+import itertools
+import collections
+import numpy as np
+import pandas as pd
+from urllib3.util.retry import Retry
+
+from pfr_scraper import PLAYER_LIST_PATH, SCRAPING_RATE, MAX_SCRAPE_FAILURES, LiveTransport, player_priority, parse_duration
+
+ORDERS = ('priority', 'list', 'random')
+
+class ServerModel:
+    """
+    Synthetic stand-in for a Sports-Reference server. Response times are log-normal, a fraction of requests fail, and a client that sends more than a threshold number of requests within a sliding window is answered with 429 for a while.
+
+    :param latency: Median seconds from sending a request to receiving the whole page
+    :param latency_sigma: Spread of the log-normal response time distribution
+    :param failure_rate: Fraction of requests answered with a server error
+    :param limit: Number of requests allowed within window seconds, or 0 for no limit
+    :param window: Length of the sliding window in seconds
+    :param ban: Seconds every request is answered with 429 after the limit is exceeded
+    :param retry_after: Whether 429 responses carry a Retry-After header with the rest of the ban
+    :param seed: Seed of the random number generator
+    """
+    def __init__(self, latency = 0.8, latency_sigma = 0.5, failure_rate = 0.01, limit = 20, window = 60, ban = 3600, retry_after = True, seed = 0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.limit = limit
+        self.window = window
+        self.ban = ban
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.recent = collections.deque()
+        self.banned_until = 0
+
+    def request(self, now):
+        """
+        Answers a request sent at virtual time now.
+
+        :return: Tuple of (status code, seconds until the response has arrived, Retry-After seconds or None)
+        """
+        latency = self.latency * self.random.lognormvariate(0, self.latency_sigma) if self.latency > 0 else 0
+        self.recent.append(now)
+        while self.recent[0] <= now - self.window:
+            self.recent.popleft()
+        if self.limit > 0 and len(self.recent) > self.limit and self.banned_until <= now:
+            self.banned_until = now + self.ban
+        if self.banned_until > now:
+            # Rate limited responses are short, so they come back quickly
+            return 429, min(latency, 0.1), (self.banned_until - now) if self.retry_after else None
+        if self.random.random() < self.failure_rate:
+            return 500, latency, None
+        return 200, latency, None
+
+def crawl_order(player_list_df, order = 'priority', seed = 0):
+    """
+    :param player_list_df: DataFrame with the player list
+    :param order: priority (the crawl queue's default order), list (by player_id) or random
+    :param seed: Seed for the random order
+    :return: Array of player_ids in the order they are scraped
+    """
+    if order == 'priority':
+        return np.array([player_id for _, player_id in sorted((player_priority(player), int(player['player_id'])) for _, player in player_list_df.iterrows())], dtype = np.int64)
+    player_ids = np.sort(player_list_df['player_id'].to_numpy(dtype = np.int64))
+    if order == 'random':
+        np.random.default_rng(seed).shuffle(player_ids)
+    elif order != 'list':
+        raise ValueError(f"Unknown crawl order {order!r}, use {', '.join(ORDERS)}")
+    return player_ids
+
+def retry_delay(errors, retry_after, backoff_factor):
+    """
+    :param errors: Number of failed attempts in a row so far
+    :param retry_after: Retry-After seconds of the last response, or None
+    :return: Seconds urllib3's Retry waits before the next attempt
+    """
+    if retry_after is not None:
+        return retry_after
+    if errors <= 1:
+        return 0
+    return min(Retry.DEFAULT_BACKOFF_MAX, backoff_factor * 2 ** (errors - 1))
+
+def simulate_crawl(player_ids, server, rate = SCRAPING_RATE, concurrency = 1, max_retries = 10, backoff_factor = 10, timeout = 5, parse_time = 0.05, max_duration = None,
+                   max_failures = MAX_SCRAPE_FAILURES):
+    """
+    Replays a crawl of the given players against a server model on a virtual clock. Like the real crawler, each worker waits for the shared rate limiter before each player, while retries happen inside the request and do not wait for it. A player whose retries run out goes back in the queue behind every player that has failed fewer times, as CrawlQueue.mark_failed does, until it has failed max_failures times.
+
+    :param player_ids: Array of player_ids in crawl order
+    :param server: ServerModel answering the requests
+    :param rate: Pages per minute allowed by the rate limiter, or 0 for no limit
+    :param concurrency: Number of players fetched at once
+    :param max_retries: Retries per page before giving up on the player, as in LiveTransport
+    :param backoff_factor: Backoff factor of the retries, as in LiveTransport
+    :param timeout: Seconds after which a slow response counts as a failed attempt
+    :param parse_time: Seconds spent parsing and saving each page
+    :param max_duration: Virtual seconds after which no new players are started, or None
+    :param max_failures: Number of times a player's retries may run out before it is given up, as in CrawlQueue.mark_failed
+    :return: Tuple of (dictionary of totals, array of the virtual time each player's stats were saved, NaN for players not scraped)
+    """
+    interval = 60 / rate if rate > 0 else 0
+    next_slot = 0.0
+    finished = np.full(len(player_ids), np.nan)
+    totals = collections.Counter()
+    events = []
+    sequence = itertools.count()
+    # Players waiting to be fetched, as (failures so far, position in crawl order), so failed players go behind those that have failed less
+    queue = [(0, player) for player in range(len(player_ids))]
+    failures = np.zeros(len(player_ids), dtype = np.int64)
+
+    def start_next(worker, now):
+        nonlocal next_slot
+        if len(queue) == 0 or (max_duration is not None and now >= max_duration):
+            return
+        slot = max(next_slot, now)
+        next_slot = slot + interval
+        totals['rate_limiter_wait'] += slot - now
+        heapq.heappush(events, (slot, next(sequence), worker, heapq.heappop(queue)[1], 0))
+
+    for worker in range(concurrency):
+        start_next(worker, 0.0)
+    end = 0.0
+    while len(events) > 0:
+        now, _, worker, player, errors = heapq.heappop(events)
+        status, latency, retry_after = server.request(now)
+        totals['requests'] += 1
+        if latency > timeout:
+            status, latency, retry_after = None, timeout, None
+        done = now + latency
+        end = max(end, done)
+        if status == 200:
+            finished[player] = done + parse_time
+            end = max(end, done + parse_time)
+            totals['pages'] += 1
+            start_next(worker, done + parse_time)
+            continue
+        totals['rate_limited' if status == 429 else 'errors'] += 1
+        errors += 1
+        if errors > max_retries:
+            failures[player] += 1
+            if failures[player] < max_failures:
+                totals['requeued'] += 1
+                heapq.heappush(queue, (failures[player], player))
+            else:
+                totals['failed_players'] += 1
+            start_next(worker, done)
+            continue
+        delay = retry_delay(errors, retry_after, backoff_factor)
+        totals['retries'] += 1
+        totals['backoff_wait'] += delay
+        heapq.heappush(events, (done + delay, next(sequence), worker, player, errors))
+    totals['wall_time'] = end
+    totals['players'] = len(player_ids)
+    totals['not_started'] = sum(1 for _, player in queue if failures[player] == 0)
+    return totals, finished
+
+def summarize(totals, finished):
+    """
+    :return: Dictionary with the projected wall time, request rate, retry overhead and the time by which given fractions of the players were available
+    """
+    wall_time = totals['wall_time']
+    summary = {
+        'wall_time_h': wall_time / 3600,
+        'pages': totals['pages'],
+        'failed_players': totals['failed_players'],
+        'requeued': totals['requeued'],
+        'not_started': totals['not_started'],
+        'requests': totals['requests'],
+        'requests_per_min': totals['requests'] / wall_time * 60 if wall_time > 0 else 0,
+        'rate_limited': totals['rate_limited'],
+        'errors': totals['errors'],
+        'retry_overhead': totals['retries'] / totals['requests'] if totals['requests'] > 0 else 0,
+        'backoff_wait_h': totals['backoff_wait'] / 3600,
+    }
+    done_times = np.sort(finished[~np.isnan(finished)])
+    for fraction in (0.1, 0.5, 0.9, 1.0):
+        needed = int(np.ceil(fraction * len(finished)))
+        summary[f'{int(fraction * 100)}pct_h'] = done_times[needed - 1] / 3600 if 0 < needed <= len(done_times) else np.nan
+    return summary
+
+if __name__ == '__main__':
+    defaults = LiveTransport()
+    parser = argparse.ArgumentParser(description = 'Simulates a crawl of the player list against a synthetic server on a virtual clock, to compare rate, concurrency, retry and ordering settings without fetching anything.')
+    parser.add_argument('--player-list', default = PLAYER_LIST_PATH, help = 'Player list to take the work set from')
+    parser.add_argument('--players', type = int, help = 'Only simulate the first this many players in crawl order')
+    parser.add_argument('--rate', type = float, nargs = '+', default = [SCRAPING_RATE], help = f'Pages per minute, 0 for no limit. Several values are each simulated (default {SCRAPING_RATE}).')
+    parser.add_argument('--concurrency', type = int, nargs = '+', default = [1], help = 'Players fetched at once (default 1)')
+    parser.add_argument('--max-retries', type = int, nargs = '+', default = [defaults.max_retries], help = f'Retries per page (default {defaults.max_retries})')
+    parser.add_argument('--backoff-factor', type = float, nargs = '+', default = [defaults.backoff_factor], help = f'Retry backoff factor (default {defaults.backoff_factor})')
+    parser.add_argument('--max-failures', type = int, default = MAX_SCRAPE_FAILURES, help = f'Times a player may fail before it is given up, as in the crawl queue (default {MAX_SCRAPE_FAILURES})')
+    parser.add_argument('--order', choices = ORDERS, nargs = '+', default = ['priority'], help = 'Crawl order (default priority)')
+    parser.add_argument('--latency', type = float, default = 0.8, help = 'Median response time in seconds (default 0.8)')
+    parser.add_argument('--latency-sigma', type = float, default = 0.5, help = 'Spread of the log-normal response time (default 0.5)')
+    parser.add_argument('--timeout', type = float, default = 5, help = 'Seconds before a slow response fails (default 5)')
+    parser.add_argument('--failure-rate', type = float, default = 0.01, help = 'Fraction of requests answered with a server error (default 0.01)')
+    parser.add_argument('--limit', type = int, default = 20, help = "Requests the server allows per window before answering 429, 0 for no limit (default 20)")
+    parser.add_argument('--window', type = float, default = 60, help = 'Seconds of the server rate limit window (default 60)')
+    parser.add_argument('--ban', type = parse_duration, default = 3600, help = 'How long the server answers 429 after the limit is exceeded (default 1h)')
+    parser.add_argument('--no-retry-after', action = 'store_true', help = 'Send 429 responses without a Retry-After header')
+    parser.add_argument('--parse-time', type = float, default = 0.05, help = 'Seconds spent parsing and saving each page (default 0.05)')
+    parser.add_argument('--max-duration', type = parse_duration, help = 'Stop starting new players after this much virtual time, e.g. 7d')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Random seed')
+    parser.add_argument('--availability', metavar = 'CSV', help = 'Write the virtual time each player became available in each simulation to this file')
+    args = parser.parse_args()
+
+    player_list_df = pd.read_csv(args.player_list)
+    orders = {order: crawl_order(player_list_df, order, args.seed)[:args.players] for order in args.order}
+    results = []
+    availability = []
+    for order, rate, concurrency, max_retries, backoff_factor in itertools.product(args.order, args.rate, args.concurrency, args.max_retries, args.backoff_factor):
+        server = ServerModel(args.latency, args.latency_sigma, args.failure_rate, args.limit, args.window, args.ban, not args.no_retry_after, args.seed)
+        totals, finished = simulate_crawl(orders[order], server, rate, concurrency, max_retries, backoff_factor, args.timeout, args.parse_time, args.max_duration, args.max_failures)
+        settings = {'order': order, 'rate': rate, 'concurrency': concurrency, 'max_retries': max_retries, 'backoff_factor': backoff_factor}
+        results.append({**settings, **summarize(totals, finished)})
+        if args.availability:
+            availability.append(pd.DataFrame({**settings, 'player_id': orders[order], 'available_s': finished}))
+    pd.set_option('display.width', 200)
+    print(pd.DataFrame(results).to_string(index = False, float_format = lambda value: f'{value:.2f}'))
+    if args.availability:
+        pd.concat(availability, ignore_index = True).to_csv(args.availability, index = False)
@@ -0,0 +1,198 @@
+import os
+import json
+import struct
+import argparse
+import numpy as np
+import pandas as pd
+
+from pfr_scraper import PLAYER_STATS_PATH, load_player_stats, to_json_value
+
+STATS_STORE_PATH = 'data/player_stats.bin'
+
+MAGIC = b'PFRSTORE'
+VERSION = 1
+# Records and the string side-table start on multiples of this many bytes
+ALIGNMENT = 64
+
+def align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+def section_offsets(header_length, record_size, count, string_count):
+    """
+    :return: Byte offsets of the records, the string offsets and the string bytes, which follow the header in that order
+    """
+    records_offset = align(len(MAGIC) + 4 + header_length)
+    offsets_offset = align(records_offset + record_size * count)
+    return records_offset, offsets_offset, offsets_offset + 8 * (string_count + 1)
+
+def column_type(series):
+    """
+    :return: NumPy type of a column in the store. Strings are stored as uint32 ids into the string side-table, with 0 for missing values.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return '?'
+    if pd.api.types.is_integer_dtype(series):
+        return '<i8'
+    if pd.api.types.is_float_dtype(series):
+        return '<f8'
+    return '<u4'
+
+def build_store(stats_path = PLAYER_STATS_PATH, path = STATS_STORE_PATH):
+    """
+    Writes the stats CSV to a fixed-width binary file that StatsStore memory-maps. The file holds a JSON header with the schema, one record per player_id from 1 to the largest player_id (players without stats have present set to False), and a side-table of the distinct strings.
+
+    :param stats_path: Path to the player stats CSV
+    :param path: Path of the binary store
+    """
+    df = load_player_stats(stats_path)
+    count = int(df['player_id'].max()) if df.shape[0] > 0 else 0
+    fields = [('present', '?')] + [(column, column_type(df[column])) for column in df.columns]
+    records = np.zeros(count, dtype = fields)
+    rows = df['player_id'].to_numpy() - 1
+    records['present'][rows] = True
+
+    strings = ['']
+    string_ids = {}
+    for column, kind in fields[1:]:
+        if kind != '<u4':
+            records[column][rows] = df[column].to_numpy()
+            continue
+        ids = np.zeros(df.shape[0], dtype = np.uint32)
+        for pos, value in enumerate(df[column]):
+            if pd.isna(value):
+                continue
+            value = str(value)
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            ids[pos] = string_ids[value]
+        records[column][rows] = ids
+
+    encoded = [value.encode() for value in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype = np.uint64)
+    string_offsets[1:] = np.cumsum([len(value) for value in encoded])
+
+    header = {
+        'version': VERSION,
+        'fields': fields,
+        'strings': [column for column, kind in fields[1:] if kind == '<u4'],
+        'count': count,
+        'string_count': len(encoded),
+        'source_mtime': os.path.getmtime(stats_path),
+    }
+    header_bytes = json.dumps(header).encode()
+    records_offset, offsets_offset, _ = section_offsets(len(header_bytes), records.dtype.itemsize, count, len(encoded))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes)
+        f.seek(records_offset)
+        f.write(records.tobytes())
+        f.seek(offsets_offset)
+        f.write(string_offsets.tobytes())
+        f.write(b''.join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class StatsStore:
+    """
+    Read-only, memory-mapped view of a store written by build_store. Opening the store only reads its header; records are paged in by the OS when they are read and shared between processes that open the same file.
+
+    :param path: Path of the binary store
+    """
+    def __init__(self, path = STATS_STORE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a player stats store")
+            header_length, = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_length))
+        if self.header['version'] != VERSION:
+            raise ValueError(f"{path} has version {self.header['version']}, expected {VERSION}")
+        self.dtype = np.dtype([tuple(field) for field in self.header['fields']])
+        self.string_columns = frozenset(self.header['strings'])
+        self.columns = [column for column, _ in self.header['fields'][1:]]
+        count = self.header['count']
+        records_offset, offsets_offset, blob_offset = section_offsets(header_length, self.dtype.itemsize, count, self.header['string_count'])
+        self.records = np.memmap(path, dtype = self.dtype, mode = 'r', offset = records_offset, shape = (count,)) if count > 0 else np.zeros(0, dtype = self.dtype)
+        self.string_offsets = np.memmap(path, dtype = np.uint64, mode = 'r', offset = offsets_offset, shape = (self.header['string_count'] + 1,))
+        blob_length = int(self.string_offsets[-1])
+        self.blob = np.memmap(path, dtype = np.uint8, mode = 'r', offset = blob_offset, shape = (blob_length,)) if blob_length > 0 else np.zeros(0, dtype = np.uint8)
+
+    def __len__(self):
+        return len(self.records)
+
+    def string(self, string_id):
+        """
+        :return: The string with this id in the side-table, or None for id 0
+        """
+        if string_id == 0:
+            return None
+        return self.blob[int(self.string_offsets[string_id]):int(self.string_offsets[string_id + 1])].tobytes().decode()
+
+    def get(self, player_id):
+        """
+        Reads one player's record.
+
+        :param player_id: The player's ID
+        :return: Dictionary of the player's stats, or None if the store has no stats for the player
+        """
+        if not 1 <= player_id <= len(self.records):
+            return None
+        record = self.records[player_id - 1]
+        if not record['present']:
+            return None
+        return {column: self.string(record[column]) if column in self.string_columns else to_json_value(record[column].item()) for column in self.columns}
+
+    def column(self, name):
+        """
+        Reads one column for every player_id. Numeric columns are zero-copy views of the mapped file; string columns are decoded into a list.
+
+        :param name: Name of the column
+        :return: Array or list indexed by player_id - 1, with a value for every id, see present
+        """
+        values = self.records[name]
+        if name in self.string_columns:
+            return [self.string(string_id) for string_id in values]
+        return values
+
+    @property
+    def present(self):
+        """
+        :return: Boolean array, True where a player_id has stats in the store
+        """
+        return self.records['present']
+
+    def is_stale(self, stats_path = PLAYER_STATS_PATH):
+        """
+        :return: True if the stats CSV has changed since the store was built
+        """
+        return os.path.getmtime(stats_path) != self.header['source_mtime']
+
+def open_store(path = STATS_STORE_PATH, stats_path = PLAYER_STATS_PATH):
+    """
+    Opens the store, building it first if it is missing or older than the stats CSV.
+
+    :param path: Path of the binary store
+    :param stats_path: Path to the player stats CSV
+    :return: StatsStore
+    """
+    if not os.path.exists(path) or StatsStore(path).is_stale(stats_path):
+        build_store(stats_path, path)
+    return StatsStore(path)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Builds or reads the memory-mapped binary copy of the player stats.')
+    parser.add_argument('player_ids', nargs = '*', type = int, help = 'Players to print, building the store first if it is out of date')
+    parser.add_argument('--build', action = 'store_true', help = 'Rebuild the store from the stats CSV')
+    parser.add_argument('--path', default = STATS_STORE_PATH, help = 'Path of the binary store')
+    parser.add_argument('--stats', default = PLAYER_STATS_PATH, help = 'Path to the player stats CSV')
+    args = parser.parse_args()
+    if args.build:
+        build_store(args.stats, args.path)
+    store = open_store(args.path, args.stats)
+    if args.build:
+        print(f"Built {args.path}: {int(store.present.sum())} players, {len(store.columns)} columns, {os.path.getsize(args.path)} bytes.")
+    for player_id in args.player_ids:
+        print(json.dumps(store.get(player_id)))
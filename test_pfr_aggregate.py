@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pfr_aggregate
+from pfr_aggregate import COUNTING_STATS, check_totals, combined_totals, passer_rating, rollup
+
+def test_passer_rating_known_seasons():
+    # Tom Brady 2007 and a perfect rating
+    assert passer_rating(np.array([398]), np.array([578]), np.array([4806]), np.array([50]), np.array([8]))[0] == pytest.approx(117.2, abs = 0.05)
+    assert passer_rating(np.array([20]), np.array([20]), np.array([400]), np.array([5]), np.array([0]))[0] == pytest.approx(158.3, abs = 0.05)
+    assert np.isnan(passer_rating(np.array([0]), np.array([0]), np.array([0]), np.array([0]), np.array([0]))[0])
+
+@pytest.fixture
+def stats_df():
+    rng = np.random.default_rng(3)
+    count = 200
+    df = pd.DataFrame({'player_id': np.arange(1, count + 1), 'position': rng.choice(['QB', 'RB-WR', 'WR', 'DE', None], count),
+                       'career_begin': rng.integers(1950, 2024, count)})
+    for stat in COUNTING_STATS + pfr_aggregate.LONGEST_STATS:
+        for suffix in pfr_aggregate.SEASON_TYPES:
+            values = rng.integers(0, 500, count).astype(float)
+            values[rng.random(count) < 0.2] = np.nan
+            df[f'{stat}_{suffix}'] = values
+    return df
+
+def test_combined_totals_match_row_by_row(stats_df):
+    totals = combined_totals(stats_df)
+    for (_, row), (_, total) in zip(stats_df.iterrows(), totals.iterrows()):
+        assert total['player_id'] == row['player_id']
+        for stat in ['pass_yds', 'rush_td', 'tackles_solo']:
+            assert total[f'{stat}_total'] == np.nansum([row[f'{stat}_reg'], row[f'{stat}_post']])
+        assert total['rush_long_total'] == np.nanmax([row['rush_long_reg'], row['rush_long_post'], 0])
+        att = np.nansum([row['pass_att_reg'], row['pass_att_post']])
+        if att > 0:
+            assert total['pass_cmp_pct_total'] == pytest.approx(np.nansum([row['pass_cmp_reg'], row['pass_cmp_post']]) / att * 100)
+        else:
+            assert np.isnan(total['pass_cmp_pct_total'])
+
+def test_rollup_matches_pandas_groupby(stats_df):
+    report = rollup(stats_df)
+    df = stats_df.assign(position_group = stats_df['position'].fillna('').str.split('-').str[0], decade = stats_df['career_begin'] // 10 * 10)
+    df['rec_yds_total'] = df['rec_yds_reg'].fillna(0) + df['rec_yds_post'].fillna(0)
+    grouped = df.groupby(['position_group', 'decade'])
+    expected = pd.DataFrame({'players': grouped.size(), 'rec_yds_total': grouped['rec_yds_total'].sum()}).reset_index()
+    pd.testing.assert_frame_equal(report[['position_group', 'decade', 'players', 'rec_yds_total']], expected, check_dtype = False)
+
+def test_check_totals_flags_only_inconsistent_stats():
+    df = pd.DataFrame({'player_id': [1, 2], 'pass_cmp_reg': [398, 10], 'pass_att_reg': [578, 20], 'pass_yds_reg': [4806, 100], 'pass_td_reg': [50, 1],
+                       'pass_int_reg': [8, 0], 'pass_cmp_pct_reg': [68.9, 60.0], 'pass_rating_reg': [117.2, 0], 'rush_att_reg': [37, 5], 'rec_reg': [0, 2],
+                       'touches_reg': [37, 9], 'rush_td_reg': [2, 1], 'rec_td_reg': [0, 0], 'rush_receive_td_reg': [2, 1]})
+    flags = check_totals(df)
+    # Player 2's completion percentage is 50, not 60, and 5 carries and 2 catches are 7 touches, not 9. A blank (zero) rating is not flagged.
+    assert sorted(zip(flags['player_id'], flags['column'])) == [(2, 'pass_cmp_pct_reg'), (2, 'touches_reg')]
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import pfr_scraper
+from pfr_cube import RollupCube, DIMENSIONS, parse_by, parse_where
+
+def query_frame(cube, by, where = None, columns = None):
+    return cube.query(columns, by, where).sort_values(list(by)).reset_index(drop = True) if len(by) > 0 else cube.query(columns, by, where)
+
+@pytest.fixture
+def index_class():
+    return RollupCube
+
+@pytest.mark.parametrize('by', [DIMENSIONS, ('position_group',), ('decade', 'active'), ()])
+def test_deltas_match_rebuild(updated_and_rebuilt, by):
+    cube, rebuilt, _ = updated_and_rebuilt
+    # Cells emptied by players who moved are left out of the report
+    pd.testing.assert_frame_equal(query_frame(cube, by), query_frame(rebuilt, by), check_dtype = False)
+
+def test_deltas_match_rebuild_with_where(updated_and_rebuilt):
+    cube, rebuilt, _ = updated_and_rebuilt
+    where = {'decade': [1980, 1990, 2000], 'active': [False]}
+    pd.testing.assert_frame_equal(query_frame(cube, ['position_group'], where), query_frame(rebuilt, ['position_group'], where), check_dtype = False)
+
+def test_query_matches_pandas_groupby(updated_and_rebuilt):
+    cube, _, runs = updated_and_rebuilt
+    df = pfr_scraper.load_player_stats(runs.stats_path)
+    df['position_group'] = df['position'].str.split('-').str[0]
+    df['decade'] = df['career_begin'] // 10 * 10
+    grouped = df.groupby(['position_group', 'decade'])
+    expected = pd.DataFrame({'players': grouped.size(), 'rec_reg_sum': grouped['rec_reg'].sum(), 'rec_reg_mean': grouped['rec_reg'].mean()}).reset_index()
+    report = query_frame(cube, ['position_group', 'decade'], columns = ['rec_reg'])
+    pd.testing.assert_frame_equal(report, expected, check_dtype = False)
+
+def test_parse_by_and_where_reject_unknown_input():
+    assert parse_by('decade,,active') == ['decade', 'active']
+    assert parse_where(['decade=1990,2000', 'active=TRUE']) == {'decade': [1990, 2000], 'active': [True]}
+    with pytest.raises(ValueError):
+        parse_by('decade,team')
+    for condition in ['team=x', 'decade', 'decade=199x', 'active=yes']:
+        with pytest.raises(ValueError):
+            parse_where([condition])
+
+def test_query_rejects_unknown_dimensions(updated_and_rebuilt):
+    cube, _, _ = updated_and_rebuilt
+    with pytest.raises(ValueError):
+        cube.query(['rec_reg'], ['team'])
+    with pytest.raises(KeyError):
+        cube.query(['name'], ['decade'])
@@ -0,0 +1,97 @@
+import os
+import pandas as pd
+import pytest
+
+import pfr_export
+import pfr_scraper
+
+WHERES = [
+    {},
+    {'position_group': ('QB', 'QB')},
+    {'decade': (1990, None)},
+    {'position_group': ('CB', 'RB'), 'decade': (None, 1979)},
+    {'pass_yds_reg': (500, None)},
+    {'career_begin': (1985, 1994), 'rec_reg': (1, 300)},
+    {'decade': (2030, None)},
+]
+
+def expected_rows(stats_path, where):
+    df = pfr_scraper.load_player_stats(stats_path)
+    keys = pfr_export.partition_columns(df, pfr_export.PARTITION_BY)
+    for column, values in keys.items():
+        df[column] = values
+    for column, (low, high) in where.items():
+        if low is not None:
+            df = df[df[column] >= low]
+        if high is not None:
+            df = df[df[column] <= high]
+    return df
+
+def assert_same_rows(actual, expected):
+    actual = actual.sort_values('player_id').reset_index(drop = True)
+    expected = expected.sort_values('player_id').reset_index(drop = True)[list(actual.columns)]
+    pd.testing.assert_frame_equal(actual, expected, check_dtype = False)
+
+@pytest.fixture(params = ['csv', 'jsonl'])
+def exported(crawl_runs, tmp_path, request):
+    runs, first, second = crawl_runs
+    runs.run(first)
+    runs.run(second)
+    output = str(tmp_path / 'partitioned')
+    manifest = pfr_export.export_partitioned(output, runs.stats_path, str(tmp_path / 'missing_list.csv'), file_format = request.param, max_workers = 2)
+    return output, runs.stats_path, manifest
+
+@pytest.mark.parametrize('where', WHERES)
+def test_pruned_read_matches_pandas_filter(exported, where, monkeypatch):
+    output, stats_path, manifest = exported
+    read = []
+    original = pfr_export.read_shard
+    monkeypatch.setattr(pfr_export, 'read_shard', lambda path, *args: read.append(path) or original(path, *args))
+    df = pfr_export.read_partitioned(output, where = where)
+    expected = expected_rows(stats_path, where)
+    assert_same_rows(df, expected)
+    # Every partition holding a matching row is read, and partitions the manifest rules out are not
+    partitions = manifest['tables']['player_stats']['partitions']
+    needed = {pfr_export.partition_path(pfr_export.PARTITION_BY, values) for values in zip(expected['position_group'], expected['decade'])}
+    read_partitions = {os.path.relpath(os.path.dirname(path), os.path.join(output, 'player_stats')) for path in read}
+    assert needed <= read_partitions
+    assert len(read) == sum(1 for partition in partitions if pfr_export.partition_matches(partition, where))
+    if set(where) <= set(pfr_export.PARTITION_BY):
+        assert read_partitions == needed
+
+def test_manifest_counts_and_statistics(exported):
+    _, stats_path, manifest = exported
+    df = expected_rows(stats_path, {})
+    partitions = manifest['tables']['player_stats']['partitions']
+    assert sum(partition['rows'] for partition in partitions) == df.shape[0]
+    for partition in partitions:
+        rows = df[(df['decade'] == partition['values']['decade'])
+                  & (df['position_group'] == partition['values']['position_group'] if partition['values']['position_group'] is not None else df['position_group'].isna())]
+        assert partition['rows'] == rows.shape[0]
+        assert partition['min']['career_begin'] == rows['career_begin'].min()
+        assert partition['max']['career_begin'] == rows['career_begin'].max()
+        if rows['pass_yds_reg'].notna().any():
+            assert partition['max']['pass_yds_reg'] == rows['pass_yds_reg'].max()
+        else:
+            assert 'pass_yds_reg' not in partition['max']
+
+def test_column_statistics_skips_columns_that_mix_types():
+    df = pd.DataFrame({'player_id': [1, 2, 3], 'mixed': ['a', 1, 'b'], 'key': ['x', 'x', 'y']})
+    minimums, maximums = pfr_export.column_statistics(df.groupby(df['key']))
+    assert 'mixed' not in minimums.columns
+    assert minimums['player_id'].tolist() == [1, 3]
+    assert maximums['player_id'].tolist() == [2, 3]
+
+def test_failed_export_leaves_no_temporary_directory(crawl_runs, tmp_path, monkeypatch):
+    runs, first, _ = crawl_runs
+    runs.run(first)
+    output = str(tmp_path / 'partitioned')
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(pfr_export, 'write_partitioned_table', fail)
+    with pytest.raises(OSError):
+        pfr_export.export_partitioned(output, runs.stats_path, str(tmp_path / 'missing_list.csv'))
+    assert not os.path.exists(output + '.tmp')
+    assert not os.path.exists(output)
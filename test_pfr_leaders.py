@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from pfr_leaders import LeaderboardIndex
+
+def boards(index):
+    """
+    :return: Every non-empty partition of every column as sorted (value, player_id) pairs and the number of zeros, ignoring the order of ties
+    """
+    result = {}
+    for column, partitions in index.boards.items():
+        for partition, (values, player_ids, zeros) in partitions.items():
+            if len(values) > 0 or zeros > 0:
+                assert np.all(np.diff(values) >= 0)
+                result[(column, partition)] = (sorted(zip(values.tolist(), player_ids.tolist())), zeros)
+    return result
+
+@pytest.fixture
+def index_class():
+    return LeaderboardIndex
+
+def test_deltas_match_rebuild(updated_and_rebuilt):
+    index, rebuilt, _ = updated_and_rebuilt
+    assert boards(index) == boards(rebuilt)
+    assert index.partitions == rebuilt.partitions
+
+def test_queries_after_deltas_match_rebuild(updated_and_rebuilt):
+    index, rebuilt, _ = updated_and_rebuilt
+    for column in ['pass_yds_reg', 'rush_yds_reg', 'pass_rating_reg']:
+        for position, era_from, era_to in [(None, None, None), ('QB', None, None), ('WR', 1980, 2000), (None, 2010, None)]:
+            leaders = index.top(column, 500, position, era_from, era_to)
+            assert sorted(leaders) == sorted(rebuilt.top(column, 500, position, era_from, era_to))
+            assert sorted(index.top(column, 500, position, era_from, era_to, ascending = True)) == sorted(rebuilt.top(column, 500, position, era_from, era_to, ascending = True))
+            for player_id in range(1, 341, 17):
+                assert index.percentile(column, player_id, position = position, era_from = era_from, era_to = era_to) == pytest.approx(
+                    rebuilt.percentile(column, player_id, position = position, era_from = era_from, era_to = era_to), nan_ok = True)
+
+def test_applied_deltas_are_not_applied_again(updated_and_rebuilt):
+    index, rebuilt, runs = updated_and_rebuilt
+    assert index.apply_deltas(runs.deltas_dir) == 0
+    assert rebuilt.apply_deltas(runs.deltas_dir) == 0
+
+def test_era_bounds_must_be_decades(updated_and_rebuilt):
+    index, _, _ = updated_and_rebuilt
+    with pytest.raises(ValueError):
+        index.top('pass_yds_reg', era_from = 1985)
+    with pytest.raises(ValueError):
+        index.percentile('pass_yds_reg', value = 100, era_to = 1999)
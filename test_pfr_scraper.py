@@ -0,0 +1,279 @@
+import json
+import time
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import pfr_scraper
+from pfr_scraper import CrawlBudget, EgressPool, EgressRoute
+
+PAGE_URL = 'http://www.pro-football-reference.com/players/B/BradTo00.htm'
+PAGE_HOST = 'www.pro-football-reference.com'
+
+class ScriptedProxy:
+    """
+    Local stand-in for a forward proxy, or for a site. It answers each request with the next (status, headers, body) of its script, or 200 once the script runs out, and keeps the URLs it was asked for.
+    """
+    def __init__(self, script = ()):
+        self.script = list(script)
+        self.requests = []
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                proxy.requests.append(self.path)
+                status, headers, body = proxy.script.pop(0) if proxy.script else (200, {}, b'<html>ok</html>')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target = self.server.serve_forever, daemon = True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def proxies():
+    started = []
+
+    def start(*script):
+        proxy = ScriptedProxy(script)
+        started.append(proxy)
+        return proxy
+
+    yield start
+    for proxy in started:
+        proxy.close()
+
+def make_pool(*proxies, budget = None):
+    routes = [EgressRoute(f"proxy-{number}", proxy.url, rate = 0) for number, proxy in enumerate(proxies, 1)]
+    return EgressPool(routes, budget = budget)
+
+def test_egress_routes_through_proxy(proxies):
+    proxy = proxies()
+    pool = make_pool(proxy)
+    response = pool.get(PAGE_URL, {}, 5)
+    assert response.status_code == 200
+    assert proxy.requests == [PAGE_URL]
+    assert pool.routes[0].counts['ok'] == 1
+
+def test_egress_rate_limited_route_rests_and_request_moves_on(proxies):
+    limited = proxies((429, {'Retry-After': '120'}, b'slow down'))
+    spare = proxies()
+    pool = make_pool(limited, spare)
+    response = pool.get(PAGE_URL, {}, 5)
+    assert response.status_code == 200
+    assert len(limited.requests) == 1 and len(spare.requests) == 1
+    route = pool.routes[0]
+    assert route.cooldown_until[PAGE_HOST] - time.monotonic() == pytest.approx(120, abs = 5)
+    assert route.health < pool.routes[1].health
+    # The rested route is skipped for this host while the other one is free
+    pool.get(PAGE_URL, {}, 5)
+    assert len(limited.requests) == 1 and len(spare.requests) == 2
+
+def test_egress_cooldown_doubles_without_retry_after(proxies):
+    limited = proxies((429, {}, b''), (429, {}, b''))
+    pool = EgressPool([EgressRoute('proxy-1', limited.url, rate = 0)], max_attempts = 1, cooldown = 10)
+    pool.get(PAGE_URL, {}, 5)
+    first = pool.routes[0].cooldown_until[PAGE_HOST] - time.monotonic()
+    pool.routes[0].cooldown_until[PAGE_HOST] = 0
+    pool.get(PAGE_URL, {}, 5)
+    second = pool.routes[0].cooldown_until[PAGE_HOST] - time.monotonic()
+    assert first == pytest.approx(10, abs = 2)
+    assert second == pytest.approx(20, abs = 2)
+
+def test_egress_server_error_rests_route_for_every_host(proxies):
+    failing = proxies((503, {}, b'down'))
+    spare = proxies()
+    pool = EgressPool([EgressRoute('proxy-1', failing.url, rate = 0), EgressRoute('proxy-2', spare.url, rate = 0)], failure_cooldown = 30)
+    assert pool.get(PAGE_URL, {}, 5).status_code == 200
+    route = pool.routes[0]
+    assert route.counts['failed'] == 1
+    assert route.down_until - time.monotonic() == pytest.approx(30, abs = 5)
+    assert route.health == pytest.approx(1 - pfr_scraper.EGRESS_HEALTH_WEIGHT)
+
+def test_egress_charges_retried_attempts_to_budget(proxies):
+    limited = proxies((429, {}, b'slow down'))
+    failing = proxies((500, {}, b'oops'))
+    spare = proxies()
+    budget = CrawlBudget()
+    pool = make_pool(limited, failing, spare, budget = budget)
+    response = pool.get(PAGE_URL, {}, 5)
+    assert response.status_code == 200
+    # The caller charges the response it gets, and the pool charged the two attempts before it
+    assert budget.pages == 2
+    assert budget.bytes == len(b'slow down') + len(b'oops')
+
+def test_egress_returns_last_response_when_every_route_is_limited(proxies):
+    limited = proxies(*[(429, {}, b'')] * 3)
+    budget = CrawlBudget()
+    pool = EgressPool([EgressRoute('proxy-1', limited.url, rate = 0)], max_attempts = 3, cooldown = 0, budget = budget)
+    assert pool.get(PAGE_URL, {}, 5).status_code == 429
+    assert len(limited.requests) == 3
+    assert budget.pages == 2
+
+def unreachable_proxy_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+def test_egress_does_not_charge_the_returned_response_twice(proxies):
+    limited = proxies((429, {}, b'slow down'), (429, {}, b'slow down again'))
+    budget = CrawlBudget()
+    pool = EgressPool([EgressRoute('proxy-1', limited.url, rate = 0), EgressRoute('dead', unreachable_proxy_url(), rate = 0)], max_attempts = 3, cooldown = 0, budget = budget)
+    # The dead route is picked only once the limited one has been rate limited twice
+    pool.routes[1].health = (1 - pfr_scraper.EGRESS_HEALTH_WEIGHT) ** 1.5
+    response = pool.get(PAGE_URL, {}, 5)
+    assert response.content == b'slow down again'
+    assert pool.routes[1].counts['failed'] == 1
+    # The first 429 and the connection failure are charged; the second 429 is left for the caller
+    assert budget.pages == 2
+    assert budget.bytes == len(b'slow down')
+
+def test_egress_closes_streamed_responses_it_drops(proxies, monkeypatch):
+    limited = proxies((429, {}, b'slow down'), (503, {}, b'down'))
+    spare = proxies((200, {}, streamed_page(['passing'], '')))
+    closed = []
+    close = requests.Response.close
+    monkeypatch.setattr(requests.Response, 'close', lambda self: closed.append(self.status_code) or close(self))
+    pool = EgressPool([EgressRoute('proxy-1', limited.url, rate = 0), EgressRoute('proxy-2', limited.url, rate = 0), EgressRoute('proxy-3', spare.url, rate = 0)])
+    response = pool.get(PAGE_URL, {}, 5, pfr_scraper.PageScanner({'passing': (['passing'], [])}))
+    assert response.status_code == 200
+    assert closed == [429, 503, 200]
+
+def test_load_egress_pool_host_rate(tmp_path):
+    path = tmp_path / 'egress.json'
+    path.write_text(json.dumps({'routes': [{'name': 'direct'}, {'name': 'proxy-1', 'proxy': 'http://127.0.0.1:8080', 'rate': 20}]}))
+    assert pfr_scraper.load_egress_pool(str(path)).host_rate == 2 * pfr_scraper.SCRAPING_RATE
+    path.write_text(json.dumps({'routes': [{'name': 'direct'}], 'host_rate': 25}))
+    assert pfr_scraper.load_egress_pool(str(path)).host_rate == 25
+
+def streamed_page(table_ids, tail):
+    tables = ''.join(f'<div id="all_{table_id}"><table id="{table_id}"><tbody><tr><td>1</td></tr></tbody></table></div>' for table_id in table_ids)
+    return f'<html><body><div id="meta"><h1>Player</h1></div>{tables}{tail}</body></html>'.encode()
+
+def test_stream_stops_at_navigation_and_reports_unread_bytes(proxies):
+    stats_tables = {'passing': (['passing'], []), 'rushing': (['rushing_and_receiving'], [])}
+    page = streamed_page(['passing'], '<div id="bottom_nav"></div>' + 'x' * 200000)
+    origin = proxies((200, {}, page))
+    scanner = pfr_scraper.PageScanner(stats_tables)
+    response = pfr_scraper.LiveTransport(max_retries = 0).get(origin.url + '/players/B/BradTo00.htm', {}, 5, scanner)
+    assert scanner.stopped
+    assert len(response.content) < len(page)
+    assert response.skipped_bytes == len(page) - len(response.content)
+
+def test_stream_reads_whole_page_without_stop(proxies):
+    page = streamed_page(['passing'], '')
+    origin = proxies((200, {}, page))
+    response = pfr_scraper.LiveTransport(max_retries = 0).get(origin.url + '/players/B/BradTo00.htm', {}, 5, pfr_scraper.PageScanner({'passing': (['passing'], []), 'rushing': (['rushing'], [])}))
+    assert response.content == page
+    assert response.skipped_bytes == 0
+
+def stats_row(player_id, **stats):
+    row = {'player_id': player_id, 'name': f"Player {player_id}", 'position': 'QB', 'career_begin': 2001, 'career_end': 2010, 'active': False,
+           'pass_yds_reg': 1000, 'pass_td_reg': 10, 'table_hash': 'abc'}
+    row.update(stats)
+    return row
+
+def saved_changelog(tmp_path, rows):
+    stats_path = str(tmp_path / 'player_stats.csv')
+    changes = pfr_scraper.ChangeLog(None, str(tmp_path / 'deltas'), stats_path)
+    for row in rows:
+        changes.record(row)
+    pfr_scraper.save_player_stats(rows, stats_path)
+    return stats_path
+
+def test_row_hash_ignores_row_hash_and_column_order():
+    row = stats_row(1)
+    reordered = dict(reversed(list(row.items())))
+    assert pfr_scraper.stats_row_hash(row) == pfr_scraper.stats_row_hash(reordered)
+    assert pfr_scraper.stats_row_hash(row) == pfr_scraper.stats_row_hash({**row, 'row_hash': 'stale'})
+    assert pfr_scraper.stats_row_hash(row) != pfr_scraper.stats_row_hash(stats_row(1, pass_td_reg = 11))
+
+def test_table_rows_hash_ignores_row_order():
+    rows = [{'table_id': 'passing', 'stat': 'pass_yds', 'value': 1000}, {'table_id': 'rushing', 'stat': 'rush_yds', 'value': 5.0}]
+    assert pfr_scraper.table_rows_hash(rows) == pfr_scraper.table_rows_hash(rows[::-1])
+    # A value read back from the CSV as a string or float hashes like the parsed int
+    assert pfr_scraper.table_rows_hash(rows) == pfr_scraper.table_rows_hash([{**rows[0], 'value': 1000.0}, {**rows[1], 'value': 5}])
+    assert pfr_scraper.table_rows_hash(rows) != pfr_scraper.table_rows_hash(rows[:1])
+
+def test_changelog_records_insert_unchanged_and_update(tmp_path):
+    stats_path = saved_changelog(tmp_path, [stats_row(1), stats_row(2)])
+    changes = pfr_scraper.ChangeLog(pfr_scraper.load_player_stats(stats_path), str(tmp_path / 'deltas'), stats_path)
+    # The saved rows come back from the CSV with other types, which must not count as changes
+    assert changes.record(stats_row(1)) is False
+    assert changes.record(stats_row(2, pass_td_reg = 12)) is True
+    assert changes.record(stats_row(3)) is True
+    changes.finish()
+    with open(changes.delta_path) as f:
+        records = [json.loads(line) for line in f]
+    assert [record['op'] for record in records] == ['unchanged', 'update', 'insert']
+    # Only the changed stat and the row hash are listed in an update
+    assert set(records[1]['changed']) == {'pass_td_reg', 'row_hash'}
+    assert records[1]['changed']['pass_td_reg'] == [10, 12]
+    assert records[2]['new']['row_hash'] == pfr_scraper.stats_row_hash(stats_row(3))
+    with open(changes.manifest_path) as f:
+        assert json.load(f)['counts'] == {'insert': 1, 'update': 1, 'unchanged': 1}
+
+def test_changelog_compares_against_rows_saved_in_the_same_run(tmp_path):
+    changes = pfr_scraper.ChangeLog(None, str(tmp_path / 'deltas'))
+    assert changes.record(stats_row(1)) is True
+    assert changes.record(stats_row(1)) is False
+    assert changes.tables_changed(stats_row(1)) is False
+    assert changes.tables_changed(stats_row(1, table_hash = 'def')) is True
+
+def test_changelog_tables_changed_against_saved_table_hash(tmp_path):
+    stats_path = saved_changelog(tmp_path, [stats_row(1)])
+    changes = pfr_scraper.ChangeLog(pfr_scraper.load_player_stats(stats_path), str(tmp_path / 'deltas'), stats_path)
+    assert changes.tables_changed(stats_row(1)) is False
+    assert changes.tables_changed(stats_row(1, table_hash = 'def')) is True
+    assert changes.tables_changed(stats_row(2)) is True
+
+def test_add_row_hashes_matches_hashes_of_new_rows(tmp_path):
+    stats_path = str(tmp_path / 'player_stats.csv')
+    old_row = stats_row(1)
+    del old_row['table_hash']
+    pfr_scraper.save_player_stats([old_row], stats_path)
+    pfr_scraper.add_row_hashes(stats_path)
+    saved = pfr_scraper.load_player_stats(stats_path)
+    assert list(saved.columns[-2:]) == ['table_hash', 'row_hash']
+    changes = pfr_scraper.ChangeLog(saved, str(tmp_path / 'deltas'), stats_path)
+    # The stats are unchanged, but the player's tables were never saved, so they are saved on the next scrape
+    assert changes.tables_changed(stats_row(1)) is True
+    assert changes.record({**old_row, 'table_hash': None}) is False
+
+def test_truncate_partial_line(tmp_path):
+    path = tmp_path / 'index.jsonl'
+    path.write_bytes(b'{"name": "a"}\n{"name": "b"}\n{"na')
+    assert pfr_scraper.truncate_partial_line(str(path))
+    assert path.read_bytes() == b'{"name": "a"}\n{"name": "b"}\n'
+    assert not pfr_scraper.truncate_partial_line(str(path))
+    assert not pfr_scraper.truncate_partial_line(str(tmp_path / 'missing.jsonl'))
+
+def test_recording_transport_drops_partial_index_line(tmp_path):
+    archive = tmp_path / 'archive'
+    archive.mkdir()
+    (archive / pfr_scraper.ARCHIVE_INDEX_FILE).write_bytes(b'{"name": "a", "url": "u", "status": 200, "recorded": 0}\n{"name": "b", "u')
+    pfr_scraper.RecordingTransport(str(archive), inner = object()).index.close()
+    assert list(pfr_scraper.read_archive_index(str(archive))) == ['a']
+    assert (archive / pfr_scraper.ARCHIVE_INDEX_FILE).read_bytes().endswith(b'}\n')
+
+def test_get_player_stats_rejects_unknown_player_id(monkeypatch):
+    monkeypatch.setattr(pfr_scraper, 'player_links', lambda: {1: '/players/B/BradTo00.htm'})
+    monkeypatch.setattr(pfr_scraper, 'scrape_page', lambda *args, **kwargs: pytest.fail("an unknown player must not be fetched"))
+    with pytest.raises(ValueError, match = '99999'):
+        pfr_scraper.get_player_stats(99999)
+    with pytest.raises(ValueError, match = '99999'):
+        pfr_scraper.get_player_stats('99999')
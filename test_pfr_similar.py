@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from pfr_similar import SimilarityIndex
+
+@pytest.fixture
+def index_class():
+    return SimilarityIndex
+
+def test_deltas_match_rebuild(updated_and_rebuilt):
+    index, rebuilt, _ = updated_and_rebuilt
+    assert index.count == rebuilt.count
+    assert index.columns == rebuilt.columns
+    for player_id, row in rebuilt.rows.items():
+        updated_row = index.rows[player_id]
+        assert index.groups[updated_row] == rebuilt.groups[row]
+        np.testing.assert_array_equal(index.raw[updated_row], rebuilt.raw[row])
+        # Players keep the scaling of the first build until the index is rebuilt
+        expected = (index.scale(rebuilt.raw[row]) - index.mean) / index.std * index.weights.get(rebuilt.groups[row], index.default_weights)
+        np.testing.assert_allclose(index.vectors[updated_row], expected, rtol = 1e-5, atol = 1e-5)
+        assert index.norms[updated_row] == pytest.approx(float(expected @ expected), rel = 1e-4)
+
+def brute_force_similar(index, player_id, k, same_position):
+    row = index.rows[player_id]
+    vectors = index.vectors[:index.count].astype(np.float64)
+    distances = np.sqrt(((vectors - vectors[row]) ** 2).sum(axis = 1))
+    candidates = [other for other in range(index.count) if other != row and (not same_position or index.groups[other] == index.groups[row])]
+    return sorted(candidates, key = lambda other: distances[other])[:k], distances
+
+@pytest.mark.parametrize('same_position', [False, True])
+def test_similar_after_deltas_finds_nearest_players(updated_and_rebuilt, same_position):
+    index, _, _ = updated_and_rebuilt
+    player_ids = list(range(1, 341, 11)) + [9999]
+    results = index.similar(player_ids, k = 5, same_position = same_position)
+    assert results[-1] is None
+    for player_id, result in zip(player_ids, results):
+        if player_id not in index.rows:
+            continue
+        expected, distances = brute_force_similar(index, player_id, 5, same_position)
+        # Ties may come back in either order, so the players are compared by distance
+        assert [distance for _, distance in result] == pytest.approx([distances[other] for other in expected], rel = 1e-3, abs = 1e-3)
+        if same_position:
+            assert all(index.groups[index.rows[other]] == index.groups[index.rows[player_id]] for other, _ in result)
+
+def test_saved_index_drops_spare_capacity(updated_and_rebuilt, tmp_path):
+    index, _, _ = updated_and_rebuilt
+    path = str(tmp_path / 'similarity_index.pkl')
+    before = index.similar([5, 77], k = 3)
+    index.save(path)
+    loaded = SimilarityIndex.load(path)
+    assert len(loaded.vectors) == loaded.count
+    assert loaded.similar([5, 77], k = 3) == before
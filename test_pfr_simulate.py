@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from urllib3.response import HTTPResponse
+from urllib3.util.retry import Retry
+
+from pfr_simulate import ServerModel, retry_delay, simulate_crawl
+
+class ScriptedServer:
+    """
+    Server model answering each request with the next (status, latency, Retry-After) of its script, then 200 with no latency.
+    """
+    def __init__(self, *script):
+        self.script = list(script)
+        self.times = []
+
+    def request(self, now):
+        self.times.append(now)
+        return self.script.pop(0) if self.script else (200, 0, None)
+
+@pytest.mark.parametrize('backoff_factor', [0.5, 10])
+def test_retry_delay_matches_urllib3(backoff_factor):
+    retry = Retry(total = 20, backoff_factor = backoff_factor, status_forcelist = [500])
+    for errors in range(1, 12):
+        retry = retry.increment(method = 'GET', url = '/', response = HTTPResponse(status = 500))
+        assert retry_delay(errors, None, backoff_factor) == retry.get_backoff_time()
+
+def test_retry_after_replaces_backoff():
+    assert retry_delay(5, 42.0, 10) == 42.0
+    assert retry_delay(1, 0.0, 10) == 0.0
+
+def test_pages_are_spaced_by_the_rate_limiter():
+    totals, finished = simulate_crawl(list(range(10)), ScriptedServer(), rate = 60, parse_time = 0)
+    assert totals['pages'] == 10 and totals['requests'] == 10 and totals['retries'] == 0
+    assert list(finished) == pytest.approx(list(range(10)))
+
+def test_failed_requests_back_off_until_retries_run_out():
+    server = ServerModel(latency = 0, failure_rate = 1.0, limit = 0)
+    totals, finished = simulate_crawl([1, 2], server, rate = 0, max_retries = 4, backoff_factor = 1, parse_time = 0, max_failures = 1)
+    # Every player is tried once and retried max_retries times before it is given up
+    assert totals['requests'] == 2 * 5
+    assert totals['errors'] == 2 * 5
+    assert totals['retries'] == 2 * 4
+    assert totals['failed_players'] == 2
+    assert totals['backoff_wait'] == pytest.approx(2 * sum(retry_delay(errors, None, 1) for errors in range(1, 5)))
+    assert totals['pages'] == 0 and np.isnan(finished).all()
+
+def test_failed_players_are_requeued_behind_the_others():
+    # The first player's retries run out, the second player succeeds, then the first is fetched again and fails for good
+    server = ScriptedServer((500, 0, None), (500, 0, None), (200, 0, None), (500, 0, None), (500, 0, None))
+    totals, finished = simulate_crawl([1, 2], server, rate = 0, max_retries = 1, backoff_factor = 1, parse_time = 0, max_failures = 2)
+    assert totals['requests'] == 5
+    assert totals['requeued'] == 1 and totals['failed_players'] == 1
+    assert totals['pages'] == 1 and totals['not_started'] == 0
+    assert np.isnan(finished[0]) and not np.isnan(finished[1])
+
+def test_retries_wait_for_retry_after_not_the_rate_limiter():
+    server = ScriptedServer((429, 0, 30.0), (500, 0, None))
+    totals, finished = simulate_crawl([1], server, rate = 1, backoff_factor = 10, parse_time = 0)
+    # The 429 waits for its Retry-After, the 500 after it is the second error in a row and backs off 10 * 2 seconds
+    assert server.times == pytest.approx([0, 30, 50])
+    assert totals['rate_limited'] == 1 and totals['errors'] == 1 and totals['retries'] == 2
+    assert finished[0] == pytest.approx(50)
+
+def test_slow_responses_time_out():
+    server = ScriptedServer((200, 9.0, None))
+    totals, finished = simulate_crawl([1], server, rate = 0, timeout = 5, parse_time = 0)
+    assert totals['errors'] == 1 and totals['retries'] == 1
+    # The first error in a row is retried at once, after the timeout
+    assert server.times == pytest.approx([0, 5])
+    assert finished[0] == pytest.approx(5)
+
+def test_server_bans_clients_over_its_limit():
+    server = ServerModel(latency = 0, failure_rate = 0, limit = 5, window = 60, ban = 600)
+    totals, _ = simulate_crawl(list(range(20)), server, rate = 0, max_retries = 2, parse_time = 0)
+    assert totals['rate_limited'] > 0
+    assert totals['backoff_wait'] >= 600
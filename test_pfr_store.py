@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import pytest
+
+import pfr_scraper
+from pfr_store import StatsStore, build_store, open_store
+
+@pytest.fixture
+def stored(crawl_runs, tmp_path):
+    runs, first, second = crawl_runs
+    runs.run(first)
+    runs.run(second)
+    path = str(tmp_path / 'player_stats.bin')
+    build_store(runs.stats_path, path)
+    return StatsStore(path), runs
+
+def test_records_match_the_stats_csv(stored):
+    store, runs = stored
+    df = pfr_scraper.load_player_stats(runs.stats_path)
+    assert len(store) == df['player_id'].max()
+    assert store.columns == list(df.columns)
+    assert int(store.present.sum()) == df.shape[0]
+    for row in df.to_dict('records'):
+        assert store.get(row['player_id']) == {column: pfr_scraper.to_json_value(value) for column, value in row.items()}
+
+def test_columns_are_indexed_by_player_id(stored):
+    store, runs = stored
+    df = pfr_scraper.load_player_stats(runs.stats_path)
+    rows = df['player_id'].to_numpy() - 1
+    np.testing.assert_array_equal(store.column('pass_yds_reg')[rows], df['pass_yds_reg'].to_numpy())
+    names = store.column('name')
+    assert [names[row] for row in rows] == [None if pfr_scraper.to_json_value(name) is None else str(name) for name in df['name']]
+
+def test_players_without_stats_are_absent(stored):
+    store, runs = stored
+    df = pfr_scraper.load_player_stats(runs.stats_path)
+    missing = sorted(set(range(1, len(store) + 1)) - set(df['player_id']))
+    for player_id in missing[:5] + [0, -1, len(store) + 1]:
+        assert store.get(player_id) is None
+
+def test_open_store_rebuilds_when_the_csv_changes(stored):
+    store, runs = stored
+    assert not store.is_stale(runs.stats_path)
+    assert open_store(store.path, runs.stats_path).header == store.header
+    mtime = os.path.getmtime(runs.stats_path) + 10
+    os.utime(runs.stats_path, (mtime, mtime))
+    assert store.is_stale(runs.stats_path)
+    reopened = open_store(store.path, runs.stats_path)
+    assert not reopened.is_stale(runs.stats_path)
+    assert reopened.header['source_mtime'] == mtime
+
+def test_rejects_files_that_are_not_stores(tmp_path):
+    path = str(tmp_path / 'player_stats.bin')
+    with open(path, 'wb') as f:
+        f.write(b'player_id,name\n1,x\n')
+    with pytest.raises(ValueError):
+        StatsStore(path)